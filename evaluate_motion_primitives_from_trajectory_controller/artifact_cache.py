@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import hashlib
+import json
+import os
+import pickle
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    import profiling
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller import profiling
+
+# Increase to invalidate all cached artifacts after changes of the evaluation code
+CACHE_VERSION = 1
+
+# Digests of the input files, reused as long as size and modification time are unchanged
+_file_digests = {}
+
+
+def file_digest(filepath):
+    """Content hash of a file."""
+    stat = os.stat(filepath)
+    signature = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    if signature not in _file_digests:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(filepath, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_digests[signature] = digest.hexdigest()
+    return _file_digests[signature]
+
+
+class ArtifactCache:
+    """
+    Results of evaluation stages on disk.
+
+    Entries are keyed by the content of the input files and the stage parameters. Every
+    entry is one pickle file in `cache_dir` with the returned value and the bytes of the
+    files the stage wrote (figures), which are restored on a hit. The least recently used
+    entries are removed when the directory grows beyond `max_bytes`.
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024**2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, stage, filepaths, params):
+        description = json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "stage": stage,
+                "files": [file_digest(f) for f in filepaths],
+                "params": params,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def load(self, key):
+        """Return (True, value) and restore the output files, or (False, None) on a miss."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+        except Exception:
+            # Unreadable entry, e.g. pickled by another version of the code
+            return False, None
+
+        for filepath, content in entry["outputs"].items():
+            if not os.path.exists(filepath) or os.path.getsize(filepath) != len(content):
+                with open(filepath, "wb") as f:
+                    f.write(content)
+        # Mark as recently used for the eviction
+        os.utime(entry_path)
+        return True, entry["value"]
+
+    def store(self, key, value, outputs=()):
+        outputs_content = {}
+        for filepath in outputs:
+            with open(filepath, "rb") as f:
+                outputs_content[filepath] = f.read()
+
+        entry_path = self._entry_path(key)
+        part_path = f"{entry_path}.{os.getpid()}.part"
+        with open(part_path, "wb") as f:
+            pickle.dump({"value": value, "outputs": outputs_content}, f)
+        os.replace(part_path, entry_path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def cached_stage(cache, stage, filepaths, params, compute, outputs=()):
+    """
+    Return the cached result of a stage, or run compute() and store its result.
+
+    The output files compute() wrote are stored with the result and restored on a hit.
+    Without cache (None), compute() is always run.
+    """
+    with profiling.stage(stage):
+        if cache is None:
+            return compute()
+
+        key = cache.key(stage, filepaths, params)
+        hit, value = cache.load(key)
+        if hit and all(os.path.exists(f) for f in outputs):
+            cache.hits += 1
+            profiling.record_cache(1, 0)
+            return value
+
+        cache.misses += 1
+        profiling.record_cache(0, 1)
+        value = compute()
+        cache.store(key, value, outputs)
+        return value
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from artifact_cache import ArtifactCache
+    from compare import add_executed_poses
+    from compare_planned_and_executed_trajectory import (
+        compare_and_plot_joint_trajectories,
+        compare_and_plot_joint_trajectories_dtw,
+        compare_and_plot_joint_trajectories_in_time,
+        compare_and_plot_cartesian_trajectories,
+        compute_path_deviations,
+    )
+    from compare_planned_and_reduced_points import (
+        compute_reduced_path_deviation,
+        plot_cartesian_trajectory,
+        plot_joint_trajectory,
+    )
+    from local_fk import detect_robot
+    import profiling
+    from run_catalog import CATALOG_NAME, RunCatalog
+    from run_data import Run
+    from run_format import RUN_EXTENSION, find_runs
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.artifact_cache import ArtifactCache
+    from evaluate_motion_primitives_from_trajectory_controller.compare import add_executed_poses
+    from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_executed_trajectory import (  # noqa: E501
+        compare_and_plot_joint_trajectories,
+        compare_and_plot_joint_trajectories_dtw,
+        compare_and_plot_joint_trajectories_in_time,
+        compare_and_plot_cartesian_trajectories,
+        compute_path_deviations,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_reduced_points import (  # noqa: E501
+        compute_reduced_path_deviation,
+        plot_cartesian_trajectory,
+        plot_joint_trajectory,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.local_fk import detect_robot
+    from evaluate_motion_primitives_from_trajectory_controller import profiling
+    from evaluate_motion_primitives_from_trajectory_controller.run_catalog import (
+        CATALOG_NAME,
+        RunCatalog,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_data import Run
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+        RUN_EXTENSION,
+        find_runs,
+    )
+
+data_dir = "src/evaluate_motion_primitives_from_trajectory_controller/data"
+
+# Velocity threshold for trimming the standstill of the executed trajectory per robot
+JOINT_VEL_THRESHOLDS = {"ur": 0.001, "kuka": 1.0}
+
+POSE_NAMES = ["pose_x", "pose_y", "pose_z", "pose_qx", "pose_qy", "pose_qz", "pose_qw"]
+
+
+def evaluate_run(
+    directory, timestamp, files, n_points=100, fk_backend="local", plot=True, cache_dir=None,
+    profile=False, cprofile=False, chunk_size=None, float32=False, fk_tolerance=None,
+    save_poses=False,
+):
+    """
+    Evaluate one recorded run headless and return one row of the summary table.
+
+    With a cache_dir, stages whose input files and parameters did not change are loaded
+    from there. With profile/cprofile, the stage profile (JSON) and a cProfile dump are
+    saved next to the figures. With chunk_size, FK and the index and Cartesian comparison
+    read the executed table in chunks, and the time-aligned, DTW and path deviation
+    comparisons, which need the whole table, are skipped. With float32, the loaded
+    positions are kept as float32. With fk_tolerance (rad), FK skips rows where the joint
+    motion is linear within it. The FK poses are only written into the executed file with
+    save_poses.
+    """
+    row = {"timestamp": timestamp}
+    cache = ArtifactCache(cache_dir) if cache_dir else None
+    profiler = profiling.StageProfiler() if profile else None
+    profile_path = os.path.join(directory, f"trajectory_{timestamp}_profile")
+    cprofile_path = profile_path + ".prof" if cprofile else None
+    with profiling.profile(profiler, cprofile_path):
+        try:
+            reduced_kind = next(kind for kind in files if kind.startswith("reduced_"))
+            row["primitive"] = reduced_kind.split("_")[1]
+            mode = "joint" if row["primitive"] == "PTP" else "cartesian"
+
+            filepath_planned = files["planned"]
+            filepath_executed = files["executed"]
+            filepath_reduced = files[reduced_kind]
+            filepath_run = os.path.join(directory, f"trajectory_{timestamp}{RUN_EXTENSION}")
+            if os.path.exists(filepath_run):
+                filepath_planned = filepath_executed = filepath_reduced = filepath_run
+
+            # All stages share the loaded tables
+            run = Run(
+                filepath_planned, filepath_executed, filepath_reduced,
+                dtype=np.float32 if float32 else np.float64,
+            )
+
+            # Robot and joint order from the planned header
+            joint_pos_names = [c for c in run.columns("planned") if c.endswith("_pos")]
+            joint_names = [c[: -len("_pos")] for c in joint_pos_names]
+            row["robot"] = detect_robot(joint_names)
+            vel_threshold = JOINT_VEL_THRESHOLDS[row["robot"]]
+
+            t_start = time.perf_counter()
+            with profiling.stage("executed_poses"):
+                add_executed_poses(
+                    run, joint_names, joint_pos_names, POSE_NAMES, fk_backend,
+                    chunk_size=chunk_size, save=save_poses, fk_tolerance=fk_tolerance,
+                )
+            t_fk = time.perf_counter()
+
+            with profiling.stage("reduced"):
+                if plot and mode == "cartesian":
+                    plot_cartesian_trajectory(run, POSE_NAMES, show=False, cache=cache)
+                elif plot:
+                    plot_joint_trajectory(run, joint_pos_names, show=False, cache=cache)
+            t_reduced = time.perf_counter()
+
+            with profiling.stage("joint"):
+                joint_result = compare_and_plot_joint_trajectories(
+                    run, joint_pos_names, n_points, vel_threshold, show=False, plot=plot,
+                    cache=cache, chunk_size=chunk_size,
+                )
+            t_joint = time.perf_counter()
+
+            # Out-of-core only the stages that read the executed table in chunks run, the
+            # time-aligned, DTW and path deviation comparisons need the whole table
+            time_result = dtw_result = joint_deviation = cartesian_deviation = None
+            if not chunk_size:
+                with profiling.stage("time_aligned"):
+                    time_result = compare_and_plot_joint_trajectories_in_time(
+                        run, joint_pos_names, show=False, plot=plot, cache=cache
+                    )
+            t_time = time.perf_counter()
+
+            if not chunk_size:
+                with profiling.stage("dtw"):
+                    dtw_result = compare_and_plot_joint_trajectories_dtw(
+                        run, joint_pos_names, vel_threshold, show=False, plot=plot, cache=cache
+                    )
+            t_dtw = time.perf_counter()
+
+            with profiling.stage("cartesian"):
+                cartesian_result = compare_and_plot_cartesian_trajectories(
+                    run, POSE_NAMES, n_points, vel_threshold, show=False, plot=plot,
+                    cache=cache, chunk_size=chunk_size,
+                )
+            t_cartesian = time.perf_counter()
+
+            with profiling.stage("deviation"):
+                if mode == "cartesian":
+                    reduced_deviation = compute_reduced_path_deviation(
+                        run, POSE_NAMES[:3], "m", cache
+                    )
+                else:
+                    reduced_deviation = compute_reduced_path_deviation(
+                        run, joint_pos_names, cache=cache
+                    )
+                if not chunk_size:
+                    joint_deviation, cartesian_deviation = compute_path_deviations(
+                        run, joint_pos_names, POSE_NAMES, vel_threshold, cache
+                    )
+            t_deviation = time.perf_counter()
+
+            for joint, rmse in zip(joint_result.joint_names, joint_result.rmse):
+                row[f"rmse_{joint}"] = rmse
+            row["joint_rmse"] = joint_result.total_rmse
+            if time_result is not None:
+                row["time_aligned_rmse"] = time_result.total_rmse
+                row["time_aligned_max_error"] = time_result.max_error
+            if dtw_result is not None:
+                row["dtw_rmse"] = dtw_result.total_rmse
+                row["dtw_max_error"] = dtw_result.max_error
+            row["cartesian_rmse"] = cartesian_result.rmse_3d
+            row["orientation_rms_angle"] = cartesian_result.rms_angle
+            row["orientation_max_angle"] = cartesian_result.max_angle
+            for prefix, deviation in [
+                ("joint", joint_deviation),
+                ("cartesian", cartesian_deviation),
+                ("reduced", reduced_deviation),
+            ]:
+                if deviation is None:
+                    continue
+                row[f"{prefix}_max_cross_track"] = deviation.max_cross_track
+                row[f"{prefix}_hausdorff"] = deviation.hausdorff
+                row[f"{prefix}_frechet"] = deviation.frechet
+            row["planned_arc_length"] = cartesian_result.planned_arc_length
+            row["executed_arc_length"] = cartesian_result.executed_arc_length
+            row["time_fk"] = t_fk - t_start
+            row["time_reduced"] = t_reduced - t_fk
+            row["time_joint"] = t_joint - t_reduced
+            row["time_time_aligned"] = t_time - t_joint
+            row["time_dtw"] = t_dtw - t_time
+            row["time_cartesian"] = t_cartesian - t_dtw
+            row["time_deviation"] = t_deviation - t_cartesian
+            row["time_total"] = t_deviation - t_start
+            if cache is not None:
+                row["cache_hits"] = cache.hits
+                row["cache_misses"] = cache.misses
+        except Exception:
+            row["error"] = traceback.format_exc(limit=1).strip().splitlines()[-1]
+    if profiler is not None:
+        profiler.save(profile_path + ".json")
+    return row
+
+
+def evaluate_all(
+    directory, n_workers=None, n_points=100, fk_backend="local", plot=True, cache_dir=None,
+    profile=False, cprofile=False, chunk_size=None, float32=False, fk_tolerance=None,
+    save_poses=False,
+):
+    """Evaluate every complete planned/executed/reduced triplet of a data directory."""
+    runs = {
+        timestamp: files
+        for timestamp, files in find_runs(directory).items()
+        if "planned" in files and "executed" in files
+        and any(kind.startswith("reduced_") for kind in files)
+    }
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [
+            pool.submit(
+                evaluate_run, directory, timestamp, files, n_points, fk_backend, plot, cache_dir,
+                profile, cprofile, chunk_size, float32, fk_tolerance, save_poses,
+            )
+            for timestamp, files in runs.items()
+        ]
+        rows = [future.result() for future in futures]
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate all recorded runs of a directory.")
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (all cores)")
+    parser.add_argument("--n-points", type=int, default=100)
+    parser.add_argument("--fk-backend", choices=["local", "moveit"], default="local")
+    parser.add_argument("--output", default=None, help="summary CSV (<data-dir>/summary.csv)")
+    parser.add_argument("--no-plots", action="store_true", help="only compute the metrics")
+    parser.add_argument("--cache-dir", default=None, help="stage cache (<data-dir>/cache)")
+    parser.add_argument("--no-cache", action="store_true", help="recompute all stages")
+    parser.add_argument(
+        "--catalog", default=None, help=f"run catalog for the metrics (<data-dir>/{CATALOG_NAME})"
+    )
+    parser.add_argument("--no-catalog", action="store_true", help="do not update the catalog")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="save time, CPU, memory and rows per stage to trajectory_<timestamp>_profile.json",
+    )
+    parser.add_argument(
+        "--cprofile", action="store_true",
+        help="save a cProfile dump per run to trajectory_<timestamp>_profile.prof",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=None,
+        help="read the executed table in chunks of this many rows for FK and the index and "
+        "Cartesian comparison (recordings larger than memory), the time-aligned, DTW and "
+        "path deviation comparisons are skipped",
+    )
+    parser.add_argument(
+        "--float32", action="store_true", help="keep the loaded positions as float32"
+    )
+    parser.add_argument(
+        "--fk-tolerance", type=float, default=None,
+        help="skip FK for rows whose joint positions are linear within this tolerance (rad) "
+        "and interpolate their poses",
+    )
+    parser.add_argument(
+        "--save-poses", action="store_true",
+        help="write the computed FK poses into the executed files (rewrites the CSV files)",
+    )
+    args = parser.parse_args()
+
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(args.data_dir, "cache")
+
+    t_start = time.perf_counter()
+    summary = evaluate_all(
+        args.data_dir, args.jobs, args.n_points, args.fk_backend, not args.no_plots, cache_dir,
+        args.profile, args.cprofile, args.chunk_size, args.float32, args.fk_tolerance,
+        args.save_poses,
+    )
+    output = args.output or os.path.join(args.data_dir, "summary.csv")
+    summary.to_csv(output, index=False)
+
+    if not args.no_catalog:
+        catalog_path = args.catalog or os.path.join(args.data_dir, CATALOG_NAME)
+        catalog = RunCatalog(catalog_path)
+        catalog.scan(args.data_dir)
+        for row in summary.to_dict("records"):
+            catalog.set_metrics(args.data_dir, row["timestamp"], row)
+        catalog.close()
+        print(f"Metrics added to the run catalog {catalog_path}")
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(summary[[c for c in summary.columns if not c.startswith("rmse_")]])
+    if "cache_hits" in summary:
+        hits, misses = summary["cache_hits"].sum(), summary["cache_misses"].sum()
+        print(f"Stage cache: {hits} hits, {misses} misses ({cache_dir})")
+    print(f"Evaluated {len(summary)} runs in {time.perf_counter() - t_start:.1f} s")
+    print(f"Summary saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+"""
+Benchmark of the evaluation stages on synthetic runs.
+
+Synthetic planned/executed/reduced triplets are generated in the CSV schema of the
+recorder (UR joint names, poses from the local FK) and every stage of the evaluation is
+timed. Results are written as JSON and compared against a stored baseline.
+"""
+
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import interp1d
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from compare_planned_and_executed_trajectory import (
+        plot_cartesian_comparison,
+        plot_joint_comparison,
+    )
+    from compare_planned_and_reduced_points import plot_cartesian_trajectory, plot_joint_trajectory
+    from local_fk import ROBOT_CHAINS, forward_kinematics
+    from metrics import (
+        compare_cartesian_trajectories,
+        compare_joint_trajectories,
+        compute_arc_length_parametrization,
+        match_points,
+        moving_range,
+        remove_duplicate_points,
+        resample_by_index,
+        resample_in_time,
+    )
+    from run_data import Run
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_executed_trajectory import (  # noqa: E501
+        plot_cartesian_comparison,
+        plot_joint_comparison,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_reduced_points import (  # noqa: E501
+        plot_cartesian_trajectory,
+        plot_joint_trajectory,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.local_fk import (
+        ROBOT_CHAINS,
+        forward_kinematics,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.metrics import (
+        compare_cartesian_trajectories,
+        compare_joint_trajectories,
+        compute_arc_length_parametrization,
+        match_points,
+        moving_range,
+        remove_duplicate_points,
+        resample_by_index,
+        resample_in_time,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_data import Run
+
+data_dir = "src/evaluate_motion_primitives_from_trajectory_controller/data"
+
+JOINT_NAMES = [joint[0] for joint in ROBOT_CHAINS["ur"]["joints"]]
+JOINT_POS_NAMES = [f"{name}_pos" for name in JOINT_NAMES]
+JOINT_VEL_NAMES = [f"{name}_vel" for name in JOINT_NAMES]
+POSE_NAMES = ["pose_x", "pose_y", "pose_z", "pose_qx", "pose_qy", "pose_qz", "pose_qw"]
+VEL_THRESHOLD = 0.001
+
+# Synthetic motion: duration in s, standstill before/after in s, waypoints and reduced points
+DURATION = 5.0
+STANDSTILL = 0.5
+N_PLANNED = 50
+N_REDUCED = 8
+# Rows per FK call when generating the executed poses (limits the memory)
+FK_CHUNK = 1_000_000
+
+# Relative slowdown against the baseline that is reported as regression, and an absolute
+# floor in s below which differences are considered noise
+REGRESSION_TOLERANCE = 0.2
+REGRESSION_FLOOR = 1e-3
+
+
+def _poses(positions):
+    return np.vstack(
+        [forward_kinematics("ur", positions[i:i + FK_CHUNK])
+         for i in range(0, len(positions), FK_CHUNK)]
+    )
+
+
+def generate_run(directory, n_executed, primitive, seed=0):
+    """
+    Write a synthetic run with n_executed executed samples to directory.
+
+    Returns the paths (planned, executed, reduced). Existing files of the same size are
+    reused.
+    """
+    # Timestamps encode the size, PTP and LIN runs are kept in separate directories
+    digits = f"{n_executed:014d}"
+    name = f"trajectory_{digits[:8]}_{digits[8:]}"
+    directory = os.path.join(directory, primitive)
+    paths = [
+        os.path.join(directory, f"{name}_planned.csv"),
+        os.path.join(directory, f"{name}_executed.csv"),
+        os.path.join(directory, f"{name}_reduced_{primitive}.csv"),
+    ]
+    if all(os.path.exists(path) for path in paths):
+        return paths
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    # Planned: smooth motion between two configurations with a bend in the middle
+    home = np.array([0.0, -1.57, 1.57, -1.57, -1.57, 0.0])
+    start, goal = home + rng.uniform(-0.5, 0.5, (2, 6))
+    planned_time = np.linspace(0.0, DURATION, N_PLANNED)
+    s = (1 - np.cos(np.pi * planned_time / DURATION)) / 2
+    planned = (
+        start + s[:, None] * (goal - start)
+        + 0.1 * np.sin(np.pi * s)[:, None] * rng.uniform(-1, 1, 6)
+    )
+    df_planned = pd.DataFrame(planned, columns=JOINT_POS_NAMES)
+    df_planned.insert(0, "time_from_start", planned_time)
+    df_planned[POSE_NAMES] = forward_kinematics("ur", planned)
+
+    # Executed: the plan delayed by a lag, with standstill before and after and noise
+    timestamp = 1.7e9 + np.linspace(-STANDSTILL, DURATION + STANDSTILL, n_executed)
+    lag = 0.05
+    clean = resample_in_time(planned_time, planned, timestamp - 1.7e9 - lag)
+    executed = clean + rng.normal(0.0, 1e-4, clean.shape)
+    velocities = np.gradient(clean, timestamp, axis=0) if n_executed > 1 else clean * 0
+    df_executed = pd.DataFrame(executed, columns=JOINT_POS_NAMES)
+    df_executed.insert(0, "timestamp", timestamp)
+    df_executed[JOINT_VEL_NAMES] = velocities
+    df_executed[POSE_NAMES] = _poses(executed)
+
+    # Reduced: every few planned points without the start, as the controller sends them
+    reduced_idx = np.unique(np.linspace(0, N_PLANNED - 1, N_REDUCED + 1).astype(int))[1:]
+    if primitive == "PTP":
+        df_reduced = df_planned[JOINT_POS_NAMES].iloc[reduced_idx]
+    else:
+        df_reduced = df_planned[POSE_NAMES].iloc[reduced_idx]
+
+    df_planned.to_csv(paths[0], index=False)
+    df_executed.to_csv(paths[1], index=False)
+    df_reduced.to_csv(paths[2], index=False)
+    return paths
+
+
+def _timed(timings, stage, func, repeat):
+    """Run func repeat times, store the fastest wall time and return the last result."""
+    best = np.inf
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t_start)
+    timings[stage] = best
+    return result
+
+
+def benchmark_run(paths, primitive, n_points=100, repeat=3):
+    """Time every evaluation stage on one run, returns {stage: seconds}."""
+    filepath_planned, filepath_executed, filepath_reduced = paths
+    figure_dir = os.path.dirname(filepath_planned)
+    timings = {}
+
+    df_planned, df_executed, df_reduced = _timed(
+        timings,
+        "csv_load",
+        lambda: tuple(pd.read_csv(path) for path in paths),
+        repeat,
+    )
+    start, end = _timed(
+        timings,
+        "velocity_trimming",
+        lambda: moving_range(df_executed[JOINT_VEL_NAMES].values, VEL_THRESHOLD),
+        repeat,
+    )
+    executed_joints = df_executed[JOINT_POS_NAMES].values[start:end + 1]
+    executed_positions = df_executed[POSE_NAMES[:3]].values[start:end + 1]
+
+    # Single steps of the Cartesian comparison on the full-rate executed path
+    s_executed = _timed(
+        timings,
+        "arc_length_parametrization",
+        lambda: compute_arc_length_parametrization(executed_positions),
+        repeat,
+    )
+    s_unique, unique_positions = _timed(
+        timings,
+        "remove_duplicate_points",
+        lambda: remove_duplicate_points(s_executed, executed_positions),
+        repeat,
+    )
+    resampled = _timed(
+        timings,
+        "interp1d_resampling",
+        lambda: interp1d(s_unique, unique_positions, axis=0)(np.linspace(0, 1, n_points)),
+        repeat,
+    )
+    planned_resampled = resample_by_index(df_planned[POSE_NAMES[:3]].values, n_points)
+    _timed(
+        timings,
+        "rmse",
+        lambda: np.sqrt(np.mean(np.sum((planned_resampled - resampled) ** 2, axis=1))),
+        repeat,
+    )
+
+    # Complete comparisons as used by compare.py
+    joint_result = _timed(
+        timings,
+        "joint_comparison",
+        lambda: compare_joint_trajectories(
+            df_planned[JOINT_POS_NAMES].values, executed_joints, n_points, JOINT_POS_NAMES
+        ),
+        repeat,
+    )
+    cartesian_result = _timed(
+        timings,
+        "cartesian_comparison",
+        lambda: compare_cartesian_trajectories(
+            df_planned[POSE_NAMES[:3]].values,
+            executed_positions,
+            n_points,
+            df_planned[POSE_NAMES[3:]].values,
+            df_executed[POSE_NAMES[3:]].values[start:end + 1],
+        ),
+        repeat,
+    )
+
+    reduced_columns = JOINT_POS_NAMES if primitive == "PTP" else POSE_NAMES
+    _timed(
+        timings,
+        "reduced_matching",
+        lambda: match_points(df_planned[reduced_columns].values, df_reduced.values),
+        repeat,
+    )
+
+    # Figures are rendered with Agg and saved as in batch_evaluate
+    _timed(
+        timings,
+        "figure_joint_comparison",
+        lambda: plot_joint_comparison(
+            joint_result, os.path.join(figure_dir, "benchmark_joint.png"), show=False
+        ),
+        repeat,
+    )
+    _timed(
+        timings,
+        "figure_cartesian_comparison",
+        lambda: plot_cartesian_comparison(
+            cartesian_result, os.path.join(figure_dir, "benchmark_cartesian.png"), show=False
+        ),
+        repeat,
+    )
+    plot_reduced = plot_joint_trajectory if primitive == "PTP" else plot_cartesian_trajectory
+    _timed(
+        timings,
+        "figure_reduced",
+        lambda: plot_reduced(
+            Run(filepath_planned, filepath_reduced=filepath_reduced), reduced_columns, show=False
+        ),
+        repeat,
+    )
+    return timings
+
+
+def compare_to_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Print the stages next to the baseline and return the list of regressions."""
+    regressions = []
+    rows = []
+    for case, timings in results["cases"].items():
+        for stage, seconds in timings.items():
+            reference = baseline["cases"].get(case, {}).get(stage)
+            if reference is None:
+                continue
+            ratio = seconds / reference if reference > 0 else np.inf
+            regression = (
+                ratio > 1 + tolerance and seconds - reference > REGRESSION_FLOOR
+            )
+            if regression:
+                regressions.append((case, stage, ratio))
+            rows.append(
+                {
+                    "case": case,
+                    "stage": stage,
+                    "time": seconds,
+                    "baseline": reference,
+                    "ratio": ratio,
+                    "regression": "REGRESSION" if regression else "",
+                }
+            )
+    if rows:
+        with pd.option_context("display.max_rows", None, "display.width", 200):
+            print(pd.DataFrame(rows).to_string(index=False, float_format="{:.4g}".format))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation on synthetic runs.")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10**2, 10**3, 10**4, 10**5],
+        help="executed samples per run (up to 10**7)",
+    )
+    parser.add_argument("--primitives", nargs="+", choices=["PTP", "LIN"], default=["PTP", "LIN"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, fastest is kept")
+    parser.add_argument("--n-points", type=int, default=100)
+    parser.add_argument(
+        "--work-dir", default=None, help="directory for the synthetic runs (reused, temporary)"
+    )
+    parser.add_argument("--output", default=None, help="results JSON (printed only)")
+    parser.add_argument(
+        "--baseline", default=os.path.join(data_dir, "benchmark_baseline.json"),
+        help="baseline JSON to compare with",
+    )
+    parser.add_argument("--save-baseline", action="store_true", help="store results as baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        results = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "machine": {
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+            },
+            "repeat": args.repeat,
+            "cases": {},
+        }
+        for primitive in args.primitives:
+            for size in args.sizes:
+                t_start = time.perf_counter()
+                paths = generate_run(work_dir, size, primitive)
+                t_generated = time.perf_counter()
+                case = f"{primitive}_{size}"
+                timings = benchmark_run(paths, primitive, args.n_points, args.repeat)
+                results["cases"][case] = timings
+                print(
+                    f"{case}: generated in {t_generated - t_start:.1f} s, stages in "
+                    f"{sum(timings.values()):.3f} s"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Comparison with baseline {args.baseline} ({baseline['created']}):")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        print(f"{len(regressions)} regressions (slower than {1 + args.tolerance:.2f} x baseline)")
+    elif args.save_baseline:
+        if os.path.dirname(args.baseline):
+            os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+    else:
+        print(f"No baseline at {args.baseline}, store one with --save-baseline")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
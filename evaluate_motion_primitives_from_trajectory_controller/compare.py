@@ -16,27 +16,229 @@
 #
 # Authors: Mathias Fuhrer
 
+import argparse
+import numpy as np
 import os
 import pandas as pd
+import tempfile
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from artifact_cache import ArtifactCache
+    from compare_planned_and_executed_trajectory import (
+        compare_and_plot_joint_trajectories,
+        compare_and_plot_joint_trajectories_dtw,
+        compare_and_plot_joint_trajectories_in_time,
+        compare_and_plot_cartesian_trajectories,
+        compute_path_deviations,
+    )
+    from compare_planned_and_reduced_points import (
+        compute_reduced_path_deviation,
+        plot_cartesian_trajectory,
+        plot_joint_trajectory,
+    )
+    from fk_cache import FKCache
+    from fk_sampling import FKSampler
+    from local_fk import LocalFK, detect_robot
+    import profiling
+    from run_format import (
+        RUN_EXTENSION,
+        RunWriter,
+        append_run_chunks,
+        append_run_table,
+        figure_path,
+        iter_table_chunks,
+        read_table,
+        table_columns,
+    )
+    from run_data import Run
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.artifact_cache import ArtifactCache
+    from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_executed_trajectory import (  # noqa: E501
+        compare_and_plot_joint_trajectories,
+        compare_and_plot_joint_trajectories_dtw,
+        compare_and_plot_joint_trajectories_in_time,
+        compare_and_plot_cartesian_trajectories,
+        compute_path_deviations,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_reduced_points import (  # noqa: E501
+        compute_reduced_path_deviation,
+        plot_cartesian_trajectory,
+        plot_joint_trajectory,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.fk_cache import FKCache
+    from evaluate_motion_primitives_from_trajectory_controller.fk_sampling import FKSampler
+    from evaluate_motion_primitives_from_trajectory_controller.local_fk import (
+        LocalFK,
+        detect_robot,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller import profiling
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+        RUN_EXTENSION,
+        RunWriter,
+        append_run_chunks,
+        append_run_table,
+        figure_path,
+        iter_table_chunks,
+        read_table,
+        table_columns,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_data import Run
+
+
+def add_executed_poses(
+    run, joint_names, joint_pos_names, pose_names, fk_backend="local", fk_cache_path=None,
+    chunk_size=None, save=True, fk_tolerance=None,
+):
+    """
+    Compute the missing FK poses of the executed rows and add them to the run.
+
+    With save, they are also written to the executed file, so later evaluations skip FK.
+    Out-of-core (chunk_size) the poses are written chunk by chunk, without save to a
+    temporary run file that the run reads them from. Repeated joint states are sent to FK
+    once; with fk_tolerance (rad) smooth stretches are decimated and interpolated.
+    """
+    filepath_executed = run.filepath_executed
+    # Out-of-core only the header of the executed table is read
+    if chunk_size:
+        executed_columns = table_columns(filepath_executed, "executed")
+    else:
+        executed_columns = run.columns("executed")
+
+    # Check if the pose_names columns are present
+    if not all(col in executed_columns for col in pose_names):
+        print("Pose columns are missing in the executed file, computing them with FK...")
+
+        if fk_backend == "moveit":
+            try:
+                from fk_client import FKClient
+            except ImportError:
+                from evaluate_motion_primitives_from_trajectory_controller.fk_client import (
+                    FKClient,
+                )
+
+            fk = FKClient()
+        else:
+            fk = LocalFK(detect_robot(joint_names))
+
+        if fk_cache_path:
+            fk = FKCache(
+                fk, detect_robot(joint_names), fk_cache_path, backend_name=fk_backend
+            )
+        fk_cache = fk if fk_cache_path else None
+        # Only the kept samples reach the backend (and the FK cache)
+        fk = FKSampler(fk, fk_tolerance)
+
+        if chunk_size:
+            # One batch per chunk, the poses are written while the rows are read
+            with profiling.stage("fk"):
+                if save:
+                    add_executed_poses_chunked(
+                        fk, filepath_executed, joint_names, joint_pos_names, pose_names,
+                        chunk_size,
+                    )
+                else:
+                    run.add_column_file(
+                        "executed", pose_names,
+                        write_executed_poses_file(
+                            fk, filepath_executed, joint_names, joint_pos_names, pose_names,
+                            chunk_size,
+                        ),
+                        source={"fk_backend": fk_backend, "fk_tolerance": fk_tolerance},
+                    )
+        else:
+            # Send all rows as one pipelined batch, failed rows come back as NaN
+            with profiling.stage("fk"):
+                poses = fk.compute_fk_batch(joint_names, run.executed(joint_pos_names))
+                profiling.add_rows(len(poses))
+            # Decimated FK changes the poses, so the tolerance goes into the cache keys
+            run.add_columns(
+                "executed", pose_names, poses,
+                source={"fk_backend": fk_backend, "fk_tolerance": fk_tolerance},
+            )
+
+        print(f"FK samples: {fk.stats()}")
+        if fk_cache is not None:
+            print(f"FK cache: {fk_cache.stats()}")
+            profiling.record_cache(fk_cache.hits, fk_cache.misses, kind="fk")
+        fk.shutdown()
+
+        if not save:
+            print("Pose columns added to the loaded run, the executed file is unchanged.")
+        elif chunk_size:
+            print(f"Pose columns added to {filepath_executed}.")
+        elif filepath_executed.endswith(RUN_EXTENSION):
+            # Store the poses as separate table, the executed table is not rewritten
+            append_run_table(
+                filepath_executed, "executed_poses", pd.DataFrame(poses, columns=pose_names)
+            )
+            print(f"Pose table added to {filepath_executed}.")
+        else:
+            # Add the computed poses as new columns, the loaded run may not have all columns
+            df_executed = read_table(filepath_executed, "executed")
+            for i, col in enumerate(pose_names):
+                df_executed[col] = poses[:, i]
+
+            # Save the CSV with the new columns
+            df_executed.to_csv(filepath_executed, index=False)
+            print(f"Pose columns added to {filepath_executed} and saved.")
+
+    else:
+        print("Pose columns are already present in the executed file.")
+
+
+def _pose_chunks(fk, joint_names, position_chunks):
+    for positions in position_chunks:
+        poses = fk.compute_fk_batch(joint_names, positions)
+        profiling.add_rows(len(poses))
+        yield poses
 
-# to run with ros2 run ...
-# from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_executed_trajectory import (
-#     compare_and_plot_joint_trajectories,
-#     compare_and_plot_cartesian_trajectories,
-# )
-# from evaluate_motion_primitives_from_trajectory_controller.compare_planned_and_reduced_points import (
-#     plot_cartesian_trajectory,
-#     plot_joint_trajectory,
-# )
-# from evaluate_motion_primitives_from_trajectory_controller.fk_client import FKClient
-
-# to run with python3
-from compare_planned_and_executed_trajectory import (
-    compare_and_plot_joint_trajectories,
-    compare_and_plot_cartesian_trajectories,
-)
-from compare_planned_and_reduced_points import plot_cartesian_trajectory, plot_joint_trajectory
-from fk_client import FKClient
+
+def write_executed_poses_file(
+    fk, filepath_executed, joint_names, joint_pos_names, pose_names, chunk_size
+):
+    """
+    Compute the FK poses of the executed table chunk by chunk into a temporary run file.
+
+    The file is hidden next to the executed file (the temporary directory may be too
+    small for recordings larger than memory), its path is returned.
+    """
+    fd, filepath_poses = tempfile.mkstemp(
+        RUN_EXTENSION, ".executed_poses_", os.path.dirname(filepath_executed) or "."
+    )
+    os.close(fd)
+    writer = RunWriter(filepath_poses)
+    for poses in _pose_chunks(
+        fk, joint_names,
+        iter_table_chunks(filepath_executed, "executed", joint_pos_names, chunk_size),
+    ):
+        writer.add_chunk("executed", pose_names, poses)
+    writer.close({})
+    return filepath_poses
+
+
+def add_executed_poses_chunked(
+    fk, filepath_executed, joint_names, joint_pos_names, pose_names, chunk_size
+):
+    """Compute the FK poses of the executed table chunk by chunk into the executed file."""
+    if filepath_executed.endswith(RUN_EXTENSION):
+        append_run_chunks(
+            filepath_executed, "executed_poses", pose_names,
+            _pose_chunks(
+                fk, joint_names,
+                iter_table_chunks(filepath_executed, "executed", joint_pos_names, chunk_size),
+            ),
+        )
+        return
+
+    # The CSV is rewritten to a temporary file that replaces it at the end
+    filepath_part = filepath_executed + ".part"
+    for i, df_chunk in enumerate(pd.read_csv(filepath_executed, chunksize=chunk_size)):
+        poses = next(_pose_chunks(fk, joint_names, [df_chunk[joint_pos_names].to_numpy()]))
+        for j, col in enumerate(pose_names):
+            df_chunk[col] = poses[:, j]
+        df_chunk.to_csv(filepath_part, mode="a" if i else "w", header=i == 0, index=False)
+    os.replace(filepath_part, filepath_executed)
 
 
 def main():
@@ -162,6 +364,12 @@ def main():
     filepath_executed = os.path.join(data_dir, filename_executed)
     filepath_reduced = os.path.join(data_dir, filename_reduced)
 
+    # Use the binary run file instead of the CSVs if the run was converted (convert_runs)
+    filepath_run = filepath_planned.replace("_planned.csv", RUN_EXTENSION)
+    if os.path.exists(filepath_run):
+        print(f"Loading run file {filepath_run}")
+        filepath_planned = filepath_executed = filepath_reduced = filepath_run
+
     ## UR ###
     joint_names = [
         "shoulder_pan_joint",
@@ -202,65 +410,119 @@ def main():
 
     pose_names = ["pose_x", "pose_y", "pose_z", "pose_qx", "pose_qy", "pose_qz", "pose_qw"]
 
-    # Load the executed CSV
-    df_executed = pd.read_csv(filepath_executed)
-
-    # Check if the pose_names columns are present
-    if not all(col in df_executed.columns for col in pose_names):
-        print("Pose columns are missing in the executed file, computing them with FK...")
+    # FK backend for the executed poses:
+    # "local" computes FK offline (no MoveIt needed), "moveit" uses the /compute_fk service
+    fk_backend = "local"
+    # Persistent FK cache (set to None to disable)
+    fk_cache_path = os.path.join(data_dir, "fk_cache.sqlite")
+    # Repeated joint states are always sent to FK once. With a tolerance in rad, rows are also
+    # skipped where the joint motion is linear within it and their poses are interpolated,
+    # e.g. 1e-4 (about 0.1 mm) needs around 10x fewer FK calls. None computes FK for every
+    # distinct joint state.
+    fk_tolerance = None
+    # Additionally compare planned and executed joint positions over time (with lag estimation)
+    compare_in_time = False
+    # Additionally compare with dynamic time warping at full rate, within a band of
+    # DTW_WINDOW_DURATION (1 s), so time and memory grow linearly with the run length
+    compare_dtw = False
+    # Additionally compute cross-track, Hausdorff and Frechet deviation from the planned path
+    compare_path_deviation = False
+    # Cache of the stage results and saved figures, stages are only recomputed if their input
+    # files or parameters changed (set to None to disable). Shown figures are always drawn.
+    artifact_cache_dir = os.path.join(data_dir, "cache")
+    show_figures = True
+    # Write the FK poses into the executed file (the CSV is rewritten once), otherwise they
+    # are only added to the loaded run (recomputed from the FK cache on the next evaluation;
+    # with chunk_size kept in a temporary file next to the executed file)
+    save_executed_poses = False
+    # Keep the loaded positions as float32 (half the memory, times stay float64)
+    float32 = False
+    # Read the executed table in chunks of this many rows instead of loading it (FK, index
+    # and Cartesian comparison), for recordings larger than memory; None loads it at once.
+    # Disable compare_in_time, compare_dtw and compare_path_deviation for such recordings,
+    # they need the whole table.
+    chunk_size = None
+    # Record wall/CPU time, peak memory and rows per stage, FK latencies and cache hits in
+    # <run>_profile.json next to the figures (slower due to the memory tracing)
+    profile_stages = False
+    # Additionally dump a cProfile of the whole evaluation to <run>_profile.prof
+    # (inspect with python3 -m pstats or snakeviz)
+    cprofile = False
+    # Both can also be switched on from the command line, like in batch_evaluate
+    parser = argparse.ArgumentParser(description="Compare planned and executed trajectory.")
+    parser.add_argument("--profile", action="store_true", help="same as profile_stages")
+    parser.add_argument("--cprofile", action="store_true", help="same as cprofile")
+    # ros2 run passes its own arguments (--ros-args ...)
+    args, _ = parser.parse_known_args()
+    profile_stages = profile_stages or args.profile
+    cprofile = cprofile or args.cprofile
+
+    cache = ArtifactCache(artifact_cache_dir) if artifact_cache_dir else None
+    profiler = profiling.StageProfiler() if profile_stages else None
+    cprofile_path = figure_path(filepath_planned, "_profile.prof") if cprofile else None
+
+    # Planned, executed and reduced data are loaded once, with only the needed columns
+    run = Run(
+        filepath_planned,
+        filepath_executed,
+        filepath_reduced,
+        columns=["time_from_start", "timestamp"] + joint_pos_names + pose_names
+        + [name[: -len("_pos")] + "_vel" for name in joint_pos_names],
+        dtype=np.float32 if float32 else np.float64,
+    )
 
-        fk = FKClient()
-
-        # List to store the computed poses
-        poses = []
-
-        # Iterate over each row
-        for idx, row in df_executed.iterrows():
-            joint_positions = [row[joint_pos] for joint_pos in joint_pos_names]
-            pose = fk.compute_fk(joint_names, joint_positions)
-            if pose is None:
-                # If FK fails, e.g. None, fill with NaN
-                poses.append([float("nan")] * 7)
-            else:
-                # Extract pose as list [x, y, z, qx, qy, qz, qw]
-                poses.append(
-                    [
-                        pose.position.x,
-                        pose.position.y,
-                        pose.position.z,
-                        pose.orientation.x,
-                        pose.orientation.y,
-                        pose.orientation.z,
-                        pose.orientation.w,
-                    ]
+    with profiling.profile(profiler, cprofile_path):
+        with profiling.stage("executed_poses"):
+            add_executed_poses(
+                run, joint_names, joint_pos_names, pose_names, fk_backend, fk_cache_path,
+                chunk_size, save_executed_poses, fk_tolerance,
+            )
+
+        # compare planned and reduced trajectory
+        with profiling.stage("reduced"):
+            if mode == "cartesian":
+                plot_cartesian_trajectory(run, pose_names, show_figures, cache=cache)
+            elif mode == "joint":
+                plot_joint_trajectory(run, joint_pos_names, show_figures, cache)
+            if compare_path_deviation and mode == "cartesian":
+                compute_reduced_path_deviation(run, pose_names[:3], "m", cache)
+            elif compare_path_deviation:
+                compute_reduced_path_deviation(run, joint_pos_names, cache=cache)
+
+        # compare planned and executed trajectory
+        with profiling.stage("joint"):
+            compare_and_plot_joint_trajectories(
+                run, joint_pos_names, n_points=100,
+                vel_threshold=joint_vel_threshold, show=show_figures, cache=cache,
+                chunk_size=chunk_size,
+            )
+        if compare_in_time:
+            with profiling.stage("time_aligned"):
+                compare_and_plot_joint_trajectories_in_time(
+                    run, joint_pos_names, show=show_figures, cache=cache
+                )
+        if compare_dtw:
+            with profiling.stage("dtw"):
+                compare_and_plot_joint_trajectories_dtw(
+                    run, joint_pos_names, vel_threshold=joint_vel_threshold, show=show_figures,
+                    cache=cache,
+                )
+        with profiling.stage("cartesian"):
+            compare_and_plot_cartesian_trajectories(
+                run, pose_names, n_points=100,
+                vel_threshold=joint_vel_threshold, show=show_figures, cache=cache,
+                chunk_size=chunk_size,
+            )
+        if compare_path_deviation:
+            with profiling.stage("deviation"):
+                compute_path_deviations(
+                    run, joint_pos_names, pose_names, joint_vel_threshold, cache
                 )
 
-        fk.shutdown()
-
-        # Add the computed poses as new columns
-        for i, col in enumerate(pose_names):
-            df_executed[col] = [pose[i] for pose in poses]
-
-        # Save the CSV with the new columns
-        df_executed.to_csv(filepath_executed, index=False)
-        print(f"Pose columns added to {filepath_executed} and saved.")
-
-    else:
-        print("Pose columns are already present in the executed file.")
-
-    # compare planned and reduced trajectory
-    if mode == "cartesian":
-        plot_cartesian_trajectory(filepath_planned, filepath_reduced, pose_names)
-    elif mode == "joint":
-        plot_joint_trajectory(filepath_planned, filepath_reduced, joint_pos_names)
-
-    # compare planned and executed trajectory
-    compare_and_plot_joint_trajectories(
-        filepath_planned, filepath_executed, joint_pos_names, n_points=100, vel_threshold=joint_vel_threshold
-    )
-    compare_and_plot_cartesian_trajectories(
-        filepath_planned, filepath_executed, pose_names, n_points=100, vel_threshold=joint_vel_threshold
-    )
+    if cache is not None:
+        print(f"Stage cache: {cache.stats()}")
+    if profiler is not None:
+        profiler.save(figure_path(filepath_planned, "_profile.json"))
 
 
 if __name__ == "__main__":
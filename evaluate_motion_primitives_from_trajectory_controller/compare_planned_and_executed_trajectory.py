@@ -16,48 +16,141 @@
 #
 # Authors: Mathias Fuhrer
 
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.interpolate import interp1d
 import os
+import sys
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from artifact_cache import cached_stage
+    from metrics import (
+        compare_cartesian_trajectories,
+        compare_cartesian_trajectories_chunked,
+        compare_joint_trajectories,
+        compare_joint_trajectories_chunked,
+        compare_joint_trajectories_dtw,
+        compare_joint_trajectories_in_time,
+        compare_path_deviation,
+        moving_range_chunked,
+        resample_in_time,
+        slice_chunks,
+    )
+    from plot_utils import finish_figure, new_figure
+    from run_format import figure_path, table_columns
+    from run_data import Run
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.artifact_cache import cached_stage
+    from evaluate_motion_primitives_from_trajectory_controller.metrics import (
+        compare_cartesian_trajectories,
+        compare_joint_trajectories,
+        compare_joint_trajectories_dtw,
+        compare_joint_trajectories_in_time,
+        compare_path_deviation,
+        compare_cartesian_trajectories_chunked,
+        compare_joint_trajectories_chunked,
+        moving_range_chunked,
+        resample_in_time,
+        slice_chunks,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.plot_utils import (
+        finish_figure,
+        new_figure,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+        figure_path,
+        table_columns,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_data import Run
+
+# Default DTW band in seconds: local speed differences up to this are aligned, time and
+# memory grow linearly with the recording
+DTW_WINDOW_DURATION = 1.0
+
+
+def trimmed_chunks(run, columns, vel_threshold, chunk_size):
+    """
+    Return (n_rows, chunks) of the executed rows without the standstill, out-of-core.
+
+    The moving range is found in one pass over the velocity columns (no trimming if
+    vel_threshold is None), chunks() yields the given columns of the kept rows in row
+    chunks (Run.iter_chunks), so the executed table is never loaded as a whole.
+    """
+    start_index, stop_index, n_rows = 0, sys.maxsize, None
+    if vel_threshold is not None:
+        vel_cols = [
+            col for col in table_columns(run.filepath_executed, "executed") if "vel" in col
+        ]
+        # Without velocities nothing is trimmed, the pass only counts the rows
+        start_index, end_index, _ = moving_range_chunked(
+            run.iter_chunks("executed", vel_cols or columns[:1], chunk_size),
+            vel_threshold if vel_cols else np.inf,
+        )
+        stop_index = end_index + 1
+        n_rows = stop_index - start_index
+
+    def chunks():
+        return slice_chunks(
+            run.iter_chunks("executed", columns, chunk_size), start_index, stop_index
+        )
+
+    return n_rows, chunks
 
 
 def compare_and_plot_joint_trajectories(
-    filepath_planned, filepath_executed, joint_pos_names, n_points, vel_threshold=0.0
+    run,
+    joint_pos_names,
+    n_points,
+    vel_threshold=0.0,
+    show=True,
+    plot=True,
+    cache=None,
+    chunk_size=None,
 ):
-    # Load CSV files
-    df_planned = pd.read_csv(filepath_planned)
-    df_executed = pd.read_csv(filepath_executed)
-
-    # Remove leading/trailing rows of executed trajectory where all velocities are below the threshold
-    vel_cols = [col for col in df_executed.columns if "vel" in col]
-    moving_mask = ~(df_executed[vel_cols] <= vel_threshold).all(axis=1)
-    start_index = moving_mask.idxmax()
-    end_index = moving_mask[::-1].idxmax()
-    df_executed_clean = df_executed.loc[start_index:end_index].reset_index(drop=True)
-
-    # Resample planned trajectory
-    planned_positions = df_planned[joint_pos_names].values
-    interp_planned = interp1d(np.linspace(0, 1, len(planned_positions)), planned_positions, axis=0)
-    planned_resampled = interp_planned(np.linspace(0, 1, n_points))
-
-    # Resample executed trajectory
-    executed_positions = df_executed_clean[joint_pos_names].values
-    interp_executed = interp1d(
-        np.linspace(0, 1, len(executed_positions)), executed_positions, axis=0
-    )
-    executed_resampled = interp_executed(np.linspace(0, 1, n_points))
+    files = [run.filepath_planned, run.filepath_executed]
+    params = {
+        "joint_pos_names": joint_pos_names, "n_points": n_points, "vel_threshold": vel_threshold,
+        **run.cache_params(joint_pos_names),
+    }
+
+    def compare():
+        if chunk_size:
+            n_executed, chunks = trimmed_chunks(run, joint_pos_names, vel_threshold, chunk_size)
+            return compare_joint_trajectories_chunked(
+                run.planned(joint_pos_names), chunks(), n_executed, n_points, joint_pos_names
+            )
+
+        # Without the leading/trailing rows of the executed trajectory where all velocities
+        # are below the threshold
+        return compare_joint_trajectories(
+            run.planned(joint_pos_names),
+            run.executed(joint_pos_names, vel_threshold),
+            n_points,
+            joint_pos_names,
+        )
 
-    # Compute RMSE per joint and total
-    rmse = np.sqrt(np.mean((planned_resampled - executed_resampled) ** 2, axis=0))
-    total_rmse = np.sqrt(np.mean((planned_resampled - executed_resampled) ** 2))
-    print(f"Total RMSE of planned and executed trajectory: {total_rmse:.4f} rad")
+    result = cached_stage(cache, "joint_comparison", files, params, compare)
+    print(f"Total RMSE of planned and executed trajectory: {result.total_rmse:.4f} rad")
+
+    if plot:
+        plot_path = figure_path(run.filepath_planned, "_compare_planned_vs_executed.png")
+        # Figures that are shown are always drawn
+        cached_stage(
+            None if show else cache, "joint_comparison_figure", files, params,
+            lambda: plot_joint_comparison(result, plot_path, show), [plot_path],
+        )
+        print(f"Figure with comparison saved to: {plot_path}")
+
+    return result
+
+
+def plot_joint_comparison(result, plot_path, show=True):
+    joint_pos_names = result.joint_names
+    planned_resampled = result.planned_resampled
+    executed_resampled = result.executed_resampled
 
     # Plot in same style as reduced joint trajectory
-    fig, axs = plt.subplots(
-        len(joint_pos_names), 1, figsize=(10, 2.5 * len(joint_pos_names)), sharex=True
-    )
+    fig = new_figure(show, figsize=(10, 2.5 * len(joint_pos_names)))
+    axs = fig.subplots(len(joint_pos_names), 1, sharex=True)
 
     if len(joint_pos_names) == 1:
         axs = [axs]
@@ -97,8 +190,10 @@ def compare_and_plot_joint_trajectories(
     )
 
     # Add RMSE info below the last plot
-    rmse_text = "\n".join([f"{joint}: {r:.4f} rad" for joint, r in zip(joint_pos_names, rmse)])
-    rmse_text += f"\nTotal RMSE: {total_rmse:.4f} rad"
+    rmse_text = "\n".join(
+        [f"{joint}: {r:.4f} rad" for joint, r in zip(joint_pos_names, result.rmse)]
+    )
+    rmse_text += f"\nTotal RMSE: {result.total_rmse:.4f} rad"
 
     fig.text(
         0.5, 0.02, rmse_text,
@@ -106,80 +201,251 @@ def compare_and_plot_joint_trajectories(
         fontsize=8, style="italic"
     )
 
-    plt.tight_layout(rect=[0, 0.08, 1, 0.95])
+    fig.tight_layout(rect=[0, 0.08, 1, 0.95])
 
     # Save figure
-    base_name = os.path.basename(filepath_planned).replace(
-        "_planned.csv", "_compare_planned_vs_executed.png"
+    finish_figure(fig, plot_path, show)
+
+
+def compare_and_plot_joint_trajectories_in_time(
+    run, joint_pos_names, dt=None, show=True, plot=True, cache=None,
+):
+    files = [run.filepath_planned, run.filepath_executed]
+    params = {"joint_pos_names": joint_pos_names, "dt": dt, **run.cache_params(joint_pos_names)}
+
+    def compare():
+        # Compare over time_from_start / timestamp, the start offset is estimated automatically
+        executed_time = run.executed(["timestamp"])[:, 0]
+        result = compare_joint_trajectories_in_time(
+            run.planned(["time_from_start"])[:, 0],
+            run.planned(joint_pos_names),
+            executed_time,
+            run.executed(joint_pos_names),
+            dt=dt,
+            joint_names=joint_pos_names,
+        )
+        return result, result.time_offset - executed_time[0]
+
+    result, time_offset = cached_stage(cache, "time_aligned_comparison", files, params, compare)
+    print(f"Estimated start of execution: {time_offset:.3f} s after start of recording")
+    print(f"Time-aligned RMSE of planned and executed trajectory: {result.total_rmse:.4f} rad")
+    print(f"Maximum tracking error: {result.max_error:.4f} rad")
+
+    if plot:
+        plot_path = figure_path(run.filepath_planned, "_compare_planned_vs_executed_in_time.png")
+        cached_stage(
+            None if show else cache, "time_aligned_comparison_figure", files, params,
+            lambda: plot_time_aligned_comparison(result, plot_path, show), [plot_path],
+        )
+        print(f"Figure with time-aligned comparison saved to: {plot_path}")
+
+    return result
+
+
+def plot_time_aligned_comparison(result, plot_path, show=True):
+    joint_pos_names = result.joint_names
+
+    fig = new_figure(show, figsize=(10, 2.5 * (len(joint_pos_names) + 1)))
+    axs = fig.subplots(len(joint_pos_names) + 1, 1, sharex=True)
+
+    for i, joint in enumerate(joint_pos_names):
+        axs[i].plot(result.time, result.planned[:, i], color="blue", alpha=0.5, label="Planned")
+        axs[i].plot(result.time, result.executed[:, i], color="red", alpha=0.5, label="Executed")
+        axs[i].set_ylabel("Angle in radians")
+        axs[i].set_title(f"{joint}")
+        axs[i].grid(True)
+    axs[0].legend(loc="upper right")
+
+    # Tracking error of all joints
+    for i, joint in enumerate(joint_pos_names):
+        axs[-1].plot(result.time, result.error[:, i], label=joint)
+    axs[-1].set_ylabel("Error in radians")
+    axs[-1].set_title("Tracking error (executed - planned)")
+    axs[-1].set_xlabel("Time from start in s")
+    axs[-1].grid(True)
+    axs[-1].legend(loc="upper center", bbox_to_anchor=(0.5, -0.3), ncol=3, frameon=False)
+
+    fig.text(
+        0.5, 0.01,
+        f"Time-aligned RMSE: {result.total_rmse:.4f} rad, max error: {result.max_error:.4f} rad",
+        ha="center", va="bottom", fontsize=8, style="italic",
+    )
+    fig.tight_layout(rect=[0, 0.04, 1, 0.97])
+
+    # Save figure
+    finish_figure(fig, plot_path, show)
+
+
+def compare_and_plot_joint_trajectories_dtw(
+    run,
+    joint_pos_names,
+    vel_threshold=0.0,
+    window=None,
+    show=True,
+    plot=True,
+    cache=None,
+    window_duration=DTW_WINDOW_DURATION,
+):
+    """
+    Compare planned and executed joint trajectory by DTW at the rate of the executed log.
+
+    The band is `window` samples, by default window_duration seconds, so it does not grow
+    with the length of the recording.
+    """
+    files = [run.filepath_planned, run.filepath_executed]
+    params = {
+        "joint_pos_names": joint_pos_names, "vel_threshold": vel_threshold, "window": window,
+        "window_duration": window_duration, **run.cache_params(joint_pos_names),
+    }
+
+    def compare():
+        # Trim the standstill of the executed trajectory like in the index based comparison
+        executed_positions = run.executed(joint_pos_names, vel_threshold)
+
+        # Sample the sparse planned waypoints with the rate of the executed log, so both
+        # sequences are aligned at full rate and the band follows the diagonal
+        dt = float(np.median(np.diff(run.executed(["timestamp"])[:, 0])))
+        planned_time = run.planned(["time_from_start"])[:, 0]
+        planned_grid = np.arange(planned_time[0], planned_time[-1] + dt / 2, dt)
+        planned_positions = resample_in_time(
+            planned_time, run.planned(joint_pos_names), planned_grid
+        )
+
+        band = window if window is not None else max(int(round(window_duration / dt)), 1)
+        return compare_joint_trajectories_dtw(
+            planned_positions, executed_positions, band, joint_pos_names
+        )
+
+    result = cached_stage(cache, "dtw_comparison", files, params, compare)
+    n_planned, n_executed = result.path[-1] + 1
+    print(
+        f"DTW RMSE of planned and executed trajectory: {result.total_rmse:.4f} rad "
+        f"({n_planned} x {n_executed} samples, band {result.window} samples)"
+    )
+    print(f"Maximum DTW aligned error: {result.max_error:.4f} rad")
+
+    if plot:
+        plot_path = figure_path(run.filepath_planned, "_compare_planned_vs_executed_dtw.png")
+        cached_stage(
+            None if show else cache, "dtw_comparison_figure", files, params,
+            lambda: plot_dtw_comparison(result, plot_path, show), [plot_path],
+        )
+        print(f"Figure with DTW comparison saved to: {plot_path}")
+
+    return result
+
+
+def plot_dtw_comparison(result, plot_path, show=True):
+    joint_pos_names = result.joint_names
+
+    fig = new_figure(show, figsize=(10, 2.5 * (len(joint_pos_names) + 1)))
+    axs = fig.subplots(len(joint_pos_names) + 1, 1)
+
+    for i, joint in enumerate(joint_pos_names):
+        axs[i].plot(result.planned_aligned[:, i], color="blue", alpha=0.5, label="Planned")
+        axs[i].plot(result.executed_aligned[:, i], color="red", alpha=0.5, label="Executed")
+        axs[i].set_ylabel("Angle in radians")
+        axs[i].set_title(f"{joint} (RMSE {result.rmse[i]:.4f} rad)")
+        axs[i].grid(True)
+    axs[0].legend(loc="upper right")
+    axs[-2].set_xlabel("Aligned sample pair")
+
+    # Warping path, a straight diagonal means equal timing
+    axs[-1].plot(result.path[:, 1], result.path[:, 0], color="black")
+    axs[-1].set_xlabel("Executed sample")
+    axs[-1].set_ylabel("Planned sample")
+    axs[-1].set_title(f"Warping path (band {result.window} samples)")
+    axs[-1].grid(True)
+
+    fig.text(
+        0.5, 0.01,
+        f"DTW RMSE: {result.total_rmse:.4f} rad, max error: {result.max_error:.4f} rad",
+        ha="center", va="bottom", fontsize=8, style="italic",
     )
-    plot_path = os.path.join(os.path.dirname(filepath_planned), base_name)
-    plt.savefig(plot_path)
-    plt.show()
-    print(f"Figure with comparison saved to: {plot_path}")
+    fig.tight_layout(rect=[0, 0.03, 1, 0.97])
+
+    # Save figure
+    finish_figure(fig, plot_path, show)
 
 
 def compare_and_plot_cartesian_trajectories(
-    filepath_planned, filepath_executed, cart_pos_names, n_points, vel_threshold=0.0
+    run,
+    cart_pos_names,
+    n_points,
+    vel_threshold=0.0,
+    show=True,
+    plot=True,
+    cache=None,
+    chunk_size=None,
 ):
-    # Load CSV files
-    df_planned = pd.read_csv(filepath_planned)
-    df_executed = pd.read_csv(filepath_executed)
-
-    # Remove leading/trailing rows where all velocities are below the threshold
-    vel_cols = [col for col in df_executed.columns if "vel" in col]
-    if vel_cols and vel_threshold > 0.0:
-        moving_mask = ~(df_executed[vel_cols] <= vel_threshold).all(axis=1)
-        start_index = moving_mask.idxmax()
-        end_index = moving_mask[::-1].idxmax()
-        df_executed = df_executed.loc[start_index:end_index].reset_index(drop=True)
-
-    # Use only the first three values (x, y, z)
-    pos_names = cart_pos_names[:3]
-
-    # Extract position values
-    planned_positions = df_planned[pos_names].values
-    executed_positions = df_executed[pos_names].values
-
-    # Resample both trajectories (linear interpolation)
-    # interp_planned = interp1d(np.linspace(0, 1, len(planned_positions)), planned_positions, axis=0)
-    # interp_executed = interp1d(np.linspace(0, 1, len(executed_positions)), executed_positions, axis=0)
-    # planned_resampled = interp_planned(np.linspace(0, 1, n_points))
-    # executed_resampled = interp_executed(np.linspace(0, 1, n_points))
-    
-    # Compute arc-length-parametrized distances
-    s_planned = compute_arc_length_parametrization(planned_positions)
-    s_executed = compute_arc_length_parametrization(executed_positions)
-
-    # remove duplicate points
-    s_planned, planned_positions = remove_duplicate_points(s_planned, planned_positions)
-    s_executed, executed_positions = remove_duplicate_points(s_executed, executed_positions)
-
-    if len(s_planned) < 2 or len(s_executed) < 2:
-        raise ValueError("Too few unique points after removing duplicates.")
-
-    # Interpolators with cartesian (not temporal) parametrization
-    interp_planned = interp1d(s_planned, planned_positions, axis=0, kind='linear')
-    interp_executed = interp1d(s_executed, executed_positions, axis=0, kind='linear')
-
-    # Uniform sampling along the path (e.g. 100 points)
-    arc_points = np.linspace(0, 1, n_points)
-    planned_resampled = interp_planned(arc_points)
-    executed_resampled = interp_executed(arc_points)
-
-    print(f"Planned trajectory length: {len(planned_positions)}")
-    print(f"Executed trajectory length: {len(executed_positions)}")
-    print(f"Planned arc total length: {np.linalg.norm(planned_positions[-1] - planned_positions[0]):.4f} m")
-    print(f"Executed arc total length: {np.linalg.norm(executed_positions[-1] - executed_positions[0]):.4f} m")
-
-
-    # Calculate 3D RMSE
-    diffs = planned_resampled - executed_resampled
-    squared_distances = np.sum(diffs**2, axis=1)
-    rmse_3d = np.sqrt(np.mean(squared_distances))
-    print(f"RMSE of Cartesian distance (x, y, z): {rmse_3d:.4f} m")
-    
+    files = [run.filepath_planned, run.filepath_executed]
+    # Poses computed with FK in memory are not covered by the file digests
+    params = {
+        "cart_pos_names": cart_pos_names, "n_points": n_points, "vel_threshold": vel_threshold,
+        **run.cache_params(cart_pos_names),
+    }
+
+    def compare():
+        # Remove leading/trailing rows where all velocities are below the threshold
+        trim_threshold = vel_threshold if vel_threshold > 0.0 else None
+
+        # Positions (x, y, z) and, if given, the quaternions (qx, qy, qz, qw)
+        pos_names = cart_pos_names[:3]
+        quat_names = cart_pos_names[3:7]
+        planned_quats = executed_quats = None
+        if len(quat_names) == 4:
+            planned_quats = run.planned(quat_names)
+
+        if chunk_size:
+            _, chunks = trimmed_chunks(run, cart_pos_names, trim_threshold, chunk_size)
+            return compare_cartesian_trajectories_chunked(
+                run.planned(pos_names), chunks, n_points, planned_quats
+            )
+
+        if len(quat_names) == 4:
+            executed_quats = run.executed(quat_names, trim_threshold)
+        return compare_cartesian_trajectories(
+            run.planned(pos_names),
+            run.executed(pos_names, trim_threshold),
+            n_points,
+            planned_quats,
+            executed_quats,
+            run.arc_length("planned", pos_names),
+            run.arc_length("executed", pos_names, trim_threshold),
+        )
+
+    result = cached_stage(cache, "cartesian_comparison", files, params, compare)
+
+    print(f"Planned trajectory length: {result.n_planned}")
+    print(f"Executed trajectory length: {result.n_executed}")
+    print(f"Planned arc total length: {result.planned_arc_length:.4f} m")
+    print(f"Executed arc total length: {result.executed_arc_length:.4f} m")
+    print(f"RMSE of Cartesian distance (x, y, z): {result.rmse_3d:.4f} m")
+    if result.angle_error is not None:
+        print(
+            f"RMS / max orientation error: {np.degrees(result.rms_angle):.3f} / "
+            f"{np.degrees(result.max_angle):.3f} deg"
+        )
+
+    if plot:
+        plot_path = figure_path(
+            run.filepath_planned, "_compare_cartesian_planned_vs_executed.png"
+        )
+        cached_stage(
+            None if show else cache, "cartesian_comparison_figure", files, params,
+            lambda: plot_cartesian_comparison(result, plot_path, show), [plot_path],
+        )
+        print(f"3D figure with cartesian trajectory comparison saved to: {plot_path}")
+
+    return result
+
+
+def plot_cartesian_comparison(result, plot_path, show=True):
+    planned_resampled = result.planned_resampled
+    executed_resampled = result.executed_resampled
+
     # 3D Plot
-    fig = plt.figure(figsize=(10, 8))
+    fig = new_figure(show, figsize=(10, 8))
     ax = fig.add_subplot(111, projection="3d")
     ax.plot(planned_resampled[:, 0], planned_resampled[:, 1], planned_resampled[:, 2],
             "o-", color="blue", alpha=0.6, label="Planned", markersize=4)
@@ -190,65 +456,69 @@ def compare_and_plot_cartesian_trajectories(
     ax.set_ylabel("Y in m")
     ax.set_zlabel("Z in m")
 
-    x_limits = [
-        np.min(np.concatenate([planned_resampled[:, 0], executed_resampled[:, 0]])),
-        np.max(np.concatenate([planned_resampled[:, 0], executed_resampled[:, 0]])),
-    ]
-    y_limits = [
-        np.min(np.concatenate([planned_resampled[:, 1], executed_resampled[:, 1]])),
-        np.max(np.concatenate([planned_resampled[:, 1], executed_resampled[:, 1]])),
-    ]
-    z_limits = [
-        np.min(np.concatenate([planned_resampled[:, 2], executed_resampled[:, 2]])),
-        np.max(np.concatenate([planned_resampled[:, 2], executed_resampled[:, 2]])),
-    ]
-
     # Determine common limit (min and max over all axes)
-    min_limit = min(x_limits[0], y_limits[0], z_limits[0])
-    max_limit = max(x_limits[1], y_limits[1], z_limits[1])
+    all_points = np.vstack([planned_resampled, executed_resampled])
+    min_limit = all_points.min()
+    max_limit = all_points.max()
 
     ax.set_xlim(min_limit, max_limit)
     ax.set_ylim(min_limit, max_limit)
     ax.set_zlim(min_limit, max_limit)
 
     # ax.set_title('Cartesian Trajectories Comparison')
-    fig.text(0.5, 0.01, f"RMSE: {rmse_3d:.4f} m", ha="center", fontsize=14, style="italic")
+    error_text = f"RMSE: {result.rmse_3d:.4f} m"
+    if result.angle_error is not None:
+        error_text += (
+            f", orientation RMS: {np.degrees(result.rms_angle):.3f} deg, "
+            f"max: {np.degrees(result.max_angle):.3f} deg"
+        )
+    fig.text(0.5, 0.01, error_text, ha="center", fontsize=14, style="italic")
     ax.legend()
     ax.grid(True)
 
     # Save figure
-    base_name = os.path.basename(filepath_planned).replace(
-        "_planned.csv", "_compare_cartesian_planned_vs_executed.png"
+    finish_figure(fig, plot_path, show)
+
+
+def compute_path_deviations(
+    run, joint_pos_names, cart_pos_names, vel_threshold=0.0, cache=None,
+):
+    """Cross-track, Hausdorff and Frechet deviation of the full-rate execution in both spaces."""
+
+    def compare():
+        deviations = []
+        for names in (joint_pos_names, cart_pos_names[:3]):
+            # Arc lengths of the Cartesian paths are shared with the Cartesian comparison
+            arc_lengths = (
+                float(run.arc_length("planned", names)[-1]),
+                float(run.arc_length("executed", names, vel_threshold)[-1]),
+            )
+            deviations.append(
+                compare_path_deviation(
+                    run.planned(names), run.executed(names, vel_threshold),
+                    arc_lengths=arc_lengths,
+                )
+            )
+        return tuple(deviations)
+
+    params = {
+        "joint_pos_names": joint_pos_names,
+        "cart_pos_names": cart_pos_names,
+        "vel_threshold": vel_threshold,
+        **run.cache_params(joint_pos_names + cart_pos_names),
+    }
+    joint_deviation, cartesian_deviation = cached_stage(
+        cache, "path_deviation", [run.filepath_planned, run.filepath_executed], params, compare
     )
-    plot_path = os.path.join(os.path.dirname(filepath_planned), base_name)
-    plt.savefig(plot_path)
-    plt.show()
-    print(f"3D figure with cartesian trajectory comparison saved to: {plot_path}")
-
-# def compute_arc_length_parametrization(positions):
-#     """Compute cumulative arc length and normalize to [0, 1]."""
-#     diffs = np.diff(positions, axis=0)
-#     dists = np.linalg.norm(diffs, axis=1)
-#     arc_lengths = np.concatenate([[0], np.cumsum(dists)])
-#     normalized_arc = arc_lengths / arc_lengths[-1]
-#     return normalized_arc
-
-def compute_arc_length_parametrization(positions):
-    if len(positions) < 2:
-        raise ValueError("Need at least two points for arc-length parametrization.")
-    diffs = np.diff(positions, axis=0)
-    dists = np.linalg.norm(diffs, axis=1)
-    total_length = np.sum(dists)
-    if total_length == 0:
-        raise ValueError("Arc length is zero. All positions are identical.")
-    arc_lengths = np.concatenate([[0], np.cumsum(dists)])
-    normalized_arc = arc_lengths / arc_lengths[-1]
-    return normalized_arc
-
-def remove_duplicate_points(s, positions):
-    """Remove points with duplicate s values (required for interp1d)."""
-    _, unique_indices = np.unique(s, return_index=True)
-    return s[unique_indices], positions[unique_indices]
+    for space, deviation, unit in [
+        ("Joint", joint_deviation, "rad"), ("Cartesian", cartesian_deviation, "m")
+    ]:
+        print(
+            f"{space} deviation from planned path: max cross-track "
+            f"{deviation.max_cross_track:.4f} {unit}, Hausdorff {deviation.hausdorff:.4f} "
+            f"{unit}, Frechet {deviation.frechet:.4f} {unit}"
+        )
+    return joint_deviation, cartesian_deviation
 
 
 def main():
@@ -270,7 +540,7 @@ def main():
     vel_threshold=0.1
 
     compare_and_plot_joint_trajectories(
-        filepath_planned, filepath_executed, joint_pos_names, n_points, vel_threshold
+        Run(filepath_planned, filepath_executed), joint_pos_names, n_points, vel_threshold
     )
 
 
@@ -18,30 +18,68 @@
 
 import os
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 from scipy.spatial.transform import Rotation as R
 
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from artifact_cache import cached_stage
+    from metrics import compare_path_deviation, match_points
+    from plot_utils import finish_figure, new_figure
+    from run_data import Run
+    from run_format import figure_path
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.artifact_cache import cached_stage
+    from evaluate_motion_primitives_from_trajectory_controller.metrics import (
+        compare_path_deviation,
+        match_points,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.plot_utils import (
+        finish_figure,
+        new_figure,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_data import Run
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import figure_path
+
+
+def plot_cartesian_trajectory(run, pose_names, show=True, planned_frame_stride=None, cache=None):
+    if cache is not None and not show:
+        # Only redraw the saved figure if the inputs changed
+        plot_path = figure_path(
+            run.filepath_planned, "_compare_planned_vs_reduced_LIN_cartesian.png"
+        )
+        cached_stage(
+            cache,
+            "reduced_cartesian_figure",
+            [run.filepath_planned, run.filepath_reduced],
+            {
+                "pose_names": pose_names, "planned_frame_stride": planned_frame_stride,
+                **run.cache_params(pose_names),
+            },
+            lambda: plot_cartesian_trajectory(run, pose_names, False, planned_frame_stride),
+            [plot_path],
+        )
+        return
 
-def plot_cartesian_trajectory(filepath_planned, filepath_reduced, pose_names):
     # Unpack column names from pose_names list
     px, py, pz, qx, qy, qz, qw = pose_names
 
-    # Load data from CSV files
-    df_planned = pd.read_csv(filepath_planned)
-    df_reduced = pd.read_csv(filepath_reduced)
+    # Positions and orientations of the planned and reduced points
+    planned_positions = run.planned([px, py, pz])
+    planned_quats = run.planned([qx, qy, qz, qw])
+    reduced_positions = run.reduced([px, py, pz])
+    reduced_quats = run.reduced([qx, qy, qz, qw])
 
     # Extract position coordinates
-    x, y, z = df_planned[px], df_planned[py], df_planned[pz]
-    xr, yr, zr = df_reduced[px], df_reduced[py], df_reduced[pz]
+    x, y, z = planned_positions.T
+    xr, yr, zr = reduced_positions.T
 
     # Add the first point of the planned trajectory to the reduced trajectory (start point)
-    xr_full = np.insert(xr.values, 0, x.iloc[0])
-    yr_full = np.insert(yr.values, 0, y.iloc[0])
-    zr_full = np.insert(zr.values, 0, z.iloc[0])
+    xr_full = np.insert(xr, 0, x[0])
+    yr_full = np.insert(yr, 0, y[0])
+    zr_full = np.insert(zr, 0, z[0])
 
     # Prepare 3D plot
-    fig = plt.figure(figsize=(10, 8))
+    fig = new_figure(show, figsize=(10, 8))
     ax = fig.add_subplot(111, projection="3d")
 
     # Plot planned and reduced paths
@@ -49,57 +87,34 @@ def plot_cartesian_trajectory(filepath_planned, filepath_reduced, pose_names):
     ax.plot(xr_full, yr_full, zr_full, marker="o", markersize=5, label="Reduced Path", color="orange")
 
     # Mark start and end of the planned path
-    ax.scatter(x.iloc[0], y.iloc[0], z.iloc[0], color="red", s=50, label="Start")
-    ax.scatter(x.iloc[-1], y.iloc[-1], z.iloc[-1], color="green", s=50, label="End")
+    ax.scatter(x[0], y[0], z[0], color="red", s=50, label="Start")
+    ax.scatter(x[-1], y[-1], z[-1], color="green", s=50, label="End")
 
     arrow_len = 0.05  # Length of coordinate axis arrows
 
     # Draw coordinate systems for all reduced points
-    for _, row in df_reduced.iterrows():
-        quat = [row[qx], row[qy], row[qz], row[qw]]
-        rot = R.from_quat(quat)
-        pt = [row[px], row[py], row[pz]]
-
-        ax.quiver(*pt, *rot.apply([1, 0, 0]), length=arrow_len, color="r", normalize=True)
-        ax.quiver(*pt, *rot.apply([0, 1, 0]), length=arrow_len, color="g", normalize=True)
-        ax.quiver(*pt, *rot.apply([0, 0, 1]), length=arrow_len, color="b", normalize=True)
+    draw_frames(ax, reduced_positions, reduced_quats, arrow_len)
 
     # Draw coordinate system at the first point of the planned path,
     # using the orientation from the first reduced point
-    first_quat = [
-        df_reduced.iloc[0][qx],
-        df_reduced.iloc[0][qy],
-        df_reduced.iloc[0][qz],
-        df_reduced.iloc[0][qw],
-    ]
-    first_rot = R.from_quat(first_quat)
-    first_pt = [x.iloc[0], y.iloc[0], z.iloc[0]]
-
-    ax.quiver(
-        *first_pt,
-        *first_rot.apply([1, 0, 0]),
-        length=arrow_len,
-        color="r",
-        linestyle="dashed",
-        normalize=True,
-    )
-    ax.quiver(
-        *first_pt,
-        *first_rot.apply([0, 1, 0]),
-        length=arrow_len,
-        color="g",
+    draw_frames(
+        ax,
+        planned_positions[:1],
+        reduced_quats[:1],
+        arrow_len,
         linestyle="dashed",
-        normalize=True,
-    )
-    ax.quiver(
-        *first_pt,
-        *first_rot.apply([0, 0, 1]),
-        length=arrow_len,
-        color="b",
-        linestyle="dashed",
-        normalize=True,
     )
 
+    # Optionally draw the orientation along the planned path (every n-th point)
+    if planned_frame_stride:
+        draw_frames(
+            ax,
+            planned_positions[::planned_frame_stride],
+            planned_quats[::planned_frame_stride],
+            arrow_len / 2,
+            alpha=0.4,
+        )
+
     # Axis labels and title
     ax.set_xlabel("X in m")
     ax.set_ylabel("Y in m")
@@ -115,43 +130,62 @@ def plot_cartesian_trajectory(filepath_planned, filepath_reduced, pose_names):
     ax.set_ylim(mid[1] - max_range, mid[1] + max_range)
     ax.set_zlim(mid[2] - max_range, mid[2] + max_range)
 
-    plt.tight_layout()
+    fig.tight_layout()
 
     # Save figure
-    base_name = os.path.basename(filepath_planned).replace(
-        "_planned.csv", "_compare_planned_vs_reduced_LIN_cartesian.png"
+    plot_path = figure_path(
+        run.filepath_planned, "_compare_planned_vs_reduced_LIN_cartesian.png"
     )
-    plot_path = os.path.join(os.path.dirname(filepath_planned), base_name)
-    plt.savefig(plot_path)
-    plt.show()
+    finish_figure(fig, plot_path, show)
     print(f"Figure with planned and reduced points comparison saved to: {plot_path}")
 
 
-def plot_joint_trajectory(filepath_planned, filepath_reduced, joint_names):
-    df_planned = pd.read_csv(filepath_planned)
-    df_reduced = pd.read_csv(filepath_reduced)
+def draw_frames(ax, points, quats, arrow_len, **kwargs):
+    """Draw the x/y/z axes (red/green/blue) of all poses with one quiver call per axis."""
+    if len(points) == 0:
+        return
+    rot = R.from_quat(quats)
+    for axis, color in zip(np.eye(3), ["r", "g", "b"]):
+        directions = rot.apply(axis)
+        ax.quiver(
+            points[:, 0], points[:, 1], points[:, 2],
+            directions[:, 0], directions[:, 1], directions[:, 2],
+            length=arrow_len, color=color, normalize=True, **kwargs,
+        )
+
 
-    joint_columns_planned = [name for name in joint_names]
-    joint_columns_reduced = df_reduced.columns.tolist()
+def plot_joint_trajectory(run, joint_names, show=True, cache=None):
+    if cache is not None and not show:
+        # Only redraw the saved figure if the inputs changed
+        plot_path = figure_path(run.filepath_planned, "_compare_planned_vs_reduced_PTP_joint.png")
+        cached_stage(
+            cache,
+            "reduced_joint_figure",
+            [run.filepath_planned, run.filepath_reduced],
+            {"joint_names": joint_names, **run.cache_params(joint_names)},
+            lambda: plot_joint_trajectory(run, joint_names, False),
+            [plot_path],
+        )
+        return
 
-    planned = df_planned[joint_columns_planned].to_numpy()
-    reduced = df_reduced[joint_columns_reduced].to_numpy()
+    planned = run.planned(joint_names)
+    reduced = run.reduced()
 
     # Insert the first planned point at the beginning of reduced
     reduced = np.vstack([planned[0], reduced])
 
     # Find indices in planned trajectory where reduced points occur
-    reduced_indices = []
-    for red_point in reduced:
-        for idx, plan_point in enumerate(planned):
-            if np.allclose(red_point, plan_point, atol=1e-6):  # match with tolerance
-                reduced_indices.append(idx)
-                break
-        else:
-            reduced_indices.append(None)  # no match found
+    matches = match_points(planned, reduced)
+    if not matches.exact.all():
+        print(
+            f"{np.count_nonzero(~matches.exact)} reduced points have no exact match in the "
+            f"planned trajectory (max distance {matches.distances[~matches.exact].max():.2e}), "
+            "they are not plotted."
+        )
 
     # Prepare subplots
-    fig, axs = plt.subplots(len(joint_names), 1, figsize=(10, 2.5 * len(joint_names)), sharex=True)
+    fig = new_figure(show, figsize=(10, 2.5 * len(joint_names)))
+    axs = fig.subplots(len(joint_names), 1, sharex=True)
 
     if len(joint_names) == 1:
         axs = [axs]
@@ -161,12 +195,10 @@ def plot_joint_trajectory(filepath_planned, filepath_reduced, joint_names):
             planned[:, i], marker="o", markersize=5, label="Planned", color="blue", alpha=0.5
         )
 
-        # Filter valid matches for plotting
-        valid_reduced = [
-            (idx, reduced[j, i]) for j, idx in enumerate(reduced_indices) if idx is not None
-        ]
-        if valid_reduced:
-            x_vals, y_vals = zip(*valid_reduced)
+        # Plot only exact matches
+        x_vals = matches.indices[matches.exact]
+        y_vals = reduced[matches.exact, i]
+        if len(x_vals):
             axs[i].plot(x_vals, y_vals, marker="o", markersize=5, label="Reduced", color="orange")
 
         axs[i].set_ylabel("Angle in radians")
@@ -179,7 +211,7 @@ def plot_joint_trajectory(filepath_planned, filepath_reduced, joint_names):
     # axs[-1].set_ylim(-7, 0)
 
     # fig.suptitle("Joint Trajectory: Planned vs. Reduced", fontsize=14)
-    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
+    fig.tight_layout(rect=[0, 0.03, 1, 0.95])
  
     axs[-1].legend(
         loc="upper center",
@@ -189,15 +221,38 @@ def plot_joint_trajectory(filepath_planned, filepath_reduced, joint_names):
     )
 
     # Save figure
-    base_name = os.path.basename(filepath_planned).replace(
-        "_planned.csv", "_compare_planned_vs_reduced_PTP_joint.png"
-    )
-    plot_path = os.path.join(os.path.dirname(filepath_planned), base_name)
-    plt.savefig(plot_path)
-    plt.show()
+    plot_path = figure_path(run.filepath_planned, "_compare_planned_vs_reduced_PTP_joint.png")
+    finish_figure(fig, plot_path, show)
     print(f"Figure with planned and reduced points comparison saved to: {plot_path}")
 
 
+def compute_reduced_path_deviation(run, column_names, unit="rad", cache=None):
+    """
+    Compute the deviation of the path through the reduced points from the planned path.
+
+    Use the joint names for PTP and the position names for LIN.
+    """
+
+    def compare():
+        planned = run.planned(column_names)
+        # The reduced points start after the first planned point
+        reduced = np.vstack([planned[0], run.reduced(column_names)])
+        return compare_path_deviation(planned, reduced)
+
+    deviation = cached_stage(
+        cache,
+        "reduced_path_deviation",
+        [run.filepath_planned, run.filepath_reduced],
+        {"column_names": column_names, **run.cache_params(column_names)},
+        compare,
+    )
+    print(
+        f"Reduced path deviation from planned path: Hausdorff {deviation.hausdorff:.4f} "
+        f"{unit}, Frechet {deviation.frechet:.4f} {unit}"
+    )
+    return deviation
+
+
 def main():
     data_dir = "src/evaluate_motion_primitives_from_trajectory_controller/data"
 
@@ -222,10 +277,11 @@ def main():
     ]
     pose_names = ["pose_x", "pose_y", "pose_z", "pose_qx", "pose_qy", "pose_qz", "pose_qw"]
 
+    run = Run(filepath_planned, filepath_reduced=filepath_reduced)
     if mode == "cartesian":
-        plot_cartesian_trajectory(filepath_planned, filepath_reduced, pose_names)
+        plot_cartesian_trajectory(run, pose_names)
     elif mode == "joint":
-        plot_joint_trajectory(filepath_planned, filepath_reduced, joint_names)
+        plot_joint_trajectory(run, joint_names)
 
 
 if __name__ == "__main__":
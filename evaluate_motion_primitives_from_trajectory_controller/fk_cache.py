@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# SQLite limits the number of host parameters per statement
+_SQL_CHUNK = 500
+
+
+class FKCache:
+    """
+    Persistent FK cache in front of an FK backend (FKClient or LocalFK).
+
+    Entries are keyed by (backend, robot, base frame, tip link, joint vector quantized to
+    `resolution` rad) and stored in an SQLite file, so poses of different backends (e.g.
+    MoveIt and the local FK) are never mixed. The backend name defaults to the class name.
+    When more than `max_entries` are stored, the least recently used entries are evicted.
+    """
+
+    def __init__(
+        self, backend, robot, cache_path, resolution=1e-6, max_entries=1_000_000,
+        backend_name=None,
+    ):
+        self.backend = backend
+        self.backend_name = backend_name or type(backend).__name__
+        self.robot = robot
+        self.resolution = resolution
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        folder = os.path.dirname(cache_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.db = sqlite3.connect(cache_path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS fk_cache "
+            "(key BLOB PRIMARY KEY, pose BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS fk_cache_lru ON fk_cache (last_used)")
+        self.db.commit()
+
+    def _keys(self, joint_names, positions, from_frame, to_link):
+        # Sort the joints by name so the key does not depend on the column order
+        order = np.argsort(joint_names)
+        quantized = np.round(positions[:, order] / self.resolution).astype(np.int64)
+        prefix = "|".join(
+            [
+                self.backend_name, self.robot, from_frame, to_link,
+                ",".join(np.asarray(joint_names)[order]),
+            ]
+        ).encode() + b"|"
+        return quantized, prefix
+
+    def compute_fk_batch(self, joint_names, positions, from_frame="base", to_link="tool0"):
+        positions = np.asarray(positions, dtype=float)
+        poses = np.full((len(positions), 7), np.nan)
+        if len(positions) == 0:
+            return poses
+
+        quantized, prefix = self._keys(joint_names, positions, from_frame, to_link)
+
+        # Look up every distinct configuration only once
+        _, first_rows, inverse = np.unique(
+            quantized, axis=0, return_index=True, return_inverse=True
+        )
+        inverse = inverse.reshape(-1)
+        keys = [prefix + quantized[row].tobytes() for row in first_rows]
+
+        unique_poses = np.full((len(keys), 7), np.nan)
+        key_index = {key: i for i, key in enumerate(keys)}
+        for start in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[start:start + _SQL_CHUNK]
+            rows = self.db.execute(
+                f"SELECT key, pose FROM fk_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for key, pose in rows:
+                unique_poses[key_index[key]] = np.frombuffer(pose, dtype=np.float64)
+
+        missing = np.flatnonzero(np.isnan(unique_poses[:, 0]))
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        now = time.time()
+        if len(missing):
+            unique_poses[missing] = self.backend.compute_fk_batch(
+                joint_names, positions[first_rows[missing]], from_frame, to_link
+            )
+            # Failed FK rows (NaN) are not cached so they are retried next time
+            self.db.executemany(
+                "INSERT OR REPLACE INTO fk_cache (key, pose, last_used) VALUES (?, ?, ?)",
+                [
+                    (keys[i], unique_poses[i].tobytes(), now)
+                    for i in missing
+                    if not np.isnan(unique_poses[i]).any()
+                ],
+            )
+        self.db.executemany(
+            "UPDATE fk_cache SET last_used = ? WHERE key = ?", [(now, key) for key in keys]
+        )
+        self._evict()
+        self.db.commit()
+
+        poses[:] = unique_poses[inverse]
+        return poses
+
+    def _evict(self):
+        (n_entries,) = self.db.execute("SELECT COUNT(*) FROM fk_cache").fetchone()
+        if n_entries > self.max_entries:
+            self.db.execute(
+                "DELETE FROM fk_cache WHERE key IN "
+                "(SELECT key FROM fk_cache ORDER BY last_used ASC LIMIT ?)",
+                (n_entries - self.max_entries,),
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def shutdown(self):
+        self.db.close()
+        self.backend.shutdown()
@@ -16,10 +16,20 @@
 #
 # Authors: Mathias Fuhrer
 
+from collections import deque
+import time
+
+import numpy as np
 import rclpy
 from rclpy.node import Node
 from moveit_msgs.srv import GetPositionFK
 
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    import profiling
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller import profiling
+
 
 class FKClient(Node):
     def __init__(self):
@@ -30,17 +40,23 @@ class FKClient(Node):
         while not self.client.wait_for_service(timeout_sec=1.0):
             self.get_logger().info("Waiting for /compute_fk service...")
 
-    def compute_fk(self, joint_names, joint_positions, from_frame="base", to_link="tool0"):
+    def _build_request(self, joint_names, joint_positions, from_frame, to_link):
         request = GetPositionFK.Request()
         request.header.frame_id = from_frame
         request.fk_link_names = [to_link]
-        request.robot_state.joint_state.name = joint_names
-        request.robot_state.joint_state.position = joint_positions
+        request.robot_state.joint_state.name = list(joint_names)
+        request.robot_state.joint_state.position = [float(p) for p in joint_positions]
+        return request
+
+    def compute_fk(self, joint_names, joint_positions, from_frame="base", to_link="tool0"):
+        request = self._build_request(joint_names, joint_positions, from_frame, to_link)
 
+        t_start = time.monotonic()
         future = self.client.call_async(request)
         rclpy.spin_until_future_complete(self, future, timeout_sec=3.0)
 
         if future.done():
+            profiling.record_fk_call(time.monotonic() - t_start)
             result = future.result()
             if result and result.error_code.val == 1:
                 return result.pose_stamped[0].pose
@@ -51,11 +67,90 @@ class FKClient(Node):
 
         return None
 
+    def compute_fk_batch(
+        self,
+        joint_names,
+        positions,
+        from_frame="base",
+        to_link="tool0",
+        max_in_flight=32,
+        timeout_sec=3.0,
+        max_retries=2,
+    ):
+        """
+        Compute FK for every row of an (N, n_joints) position array.
+
+        Up to max_in_flight requests are kept pending at the service at the same time,
+        results are written back in input order. Rows that fail or time out are retried
+        up to max_retries times and are filled with NaN afterwards.
+        Returns an (N, 7) array with [x, y, z, qx, qy, qz, qw] per row.
+        """
+        positions = np.asarray(positions, dtype=float)
+        poses = np.full((len(positions), 7), np.nan)
+        attempts = np.zeros(len(positions), dtype=int)
+
+        pending = deque(range(len(positions)))
+        in_flight = {}  # future -> (row index, send time, deadline)
+        n_failed = 0
+
+        while pending or in_flight:
+            # Fill the window of outstanding requests
+            while pending and len(in_flight) < max_in_flight:
+                idx = pending.popleft()
+                request = self._build_request(joint_names, positions[idx], from_frame, to_link)
+                future = self.client.call_async(request)
+                sent = time.monotonic()
+                in_flight[future] = (idx, sent, sent + timeout_sec)
+
+            rclpy.spin_once(self, timeout_sec=0.01)
+
+            now = time.monotonic()
+            for future, (idx, sent, deadline) in list(in_flight.items()):
+                if future.done():
+                    del in_flight[future]
+                    profiling.record_fk_call(now - sent)
+                    result = future.result()
+                    if result and result.error_code.val == 1:
+                        poses[idx] = pose_to_list(result.pose_stamped[0].pose)
+                        continue
+                elif now > deadline:
+                    del in_flight[future]
+                    self.client.remove_pending_request(future)
+                    future.cancel()
+                else:
+                    continue
+
+                # Failed or timed out -> retry or give up with NaN
+                attempts[idx] += 1
+                if attempts[idx] <= max_retries:
+                    pending.append(idx)
+                else:
+                    n_failed += 1
+
+        if n_failed:
+            self.get_logger().warn(
+                f"FK failed for {n_failed} of {len(positions)} rows, filled with NaN"
+            )
+        return poses
+
     def shutdown(self):
         self.destroy_node()
         rclpy.shutdown()
 
 
+def pose_to_list(pose):
+    """Convert a geometry_msgs/Pose to [x, y, z, qx, qy, qz, qw]."""
+    return [
+        pose.position.x,
+        pose.position.y,
+        pose.position.z,
+        pose.orientation.x,
+        pose.orientation.y,
+        pose.orientation.z,
+        pose.orientation.w,
+    ]
+
+
 if __name__ == "__main__":
     fk = FKClient()
     joint_names = [
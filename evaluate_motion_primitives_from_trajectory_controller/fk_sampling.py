@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+
+def collapse_duplicates(positions):
+    """
+    Find the runs of consecutive identical rows.
+
+    Returns (first_rows, run_of_row): the first row of every run and, for every row, the
+    index of its run.
+    """
+    positions = np.asarray(positions)
+    changed = np.ones(len(positions), dtype=bool)
+    changed[1:] = np.any(positions[1:] != positions[:-1], axis=1)
+    return np.flatnonzero(changed), np.cumsum(changed) - 1
+
+
+def _segment_fits(positions, start, end, tolerance, max_span):
+    """Check if the rows between start and end are within tolerance of the line between them."""
+    if np.abs(positions[end] - positions[start]).sum() > max_span:
+        return False
+    if end - start < 2:
+        return True
+    t = (np.arange(1, end - start) / (end - start))[:, None]
+    chord = positions[start] + t * (positions[end] - positions[start])
+    return np.abs(positions[start + 1:end] - chord).max() <= tolerance
+
+
+def decimate_joint_path(positions, tolerance):
+    """
+    Return the indices of the rows to keep for a joint path tolerance.
+
+    Linear interpolation (over the row index) between the kept rows reproduces every
+    dropped row within `tolerance` in every joint.
+
+    Joint motion that is linear is still curved in Cartesian space, so the summed joint
+    motion of a segment is also limited to sqrt(8 * tolerance) rad: a point 1 m from the
+    joint axes then deviates at most `tolerance` m from the chord between the kept poses.
+    Greedy: every segment is grown exponentially from its start while it fits, then the
+    end is bisected. The first and last rows are always kept.
+    """
+    positions = np.asarray(positions, dtype=float)
+    max_span = np.sqrt(8.0 * tolerance)
+    n_rows = len(positions)
+    keep = [0]
+    start = 0
+    while start < n_rows - 1:
+        good, bad = start + 1, None
+        while good < n_rows - 1:
+            candidate = min(start + 2 * (good - start), n_rows - 1)
+            if not _segment_fits(positions, start, candidate, tolerance, max_span):
+                bad = candidate
+                break
+            good = candidate
+        if bad is not None:
+            while bad - good > 1:
+                middle = (good + bad) // 2
+                if _segment_fits(positions, start, middle, tolerance, max_span):
+                    good = middle
+                else:
+                    bad = middle
+        keep.append(good)
+        start = good
+    return np.array(keep[: n_rows])
+
+
+def interpolate_poses(kept_rows, kept_poses, n_rows):
+    """
+    Interpolate the poses (x, y, z, qx, qy, qz, qw) of all n_rows rows from the kept rows.
+
+    Positions are interpolated linearly and orientations with slerp over the row index.
+    Rows next to a failed (NaN) pose stay NaN.
+    """
+    kept_poses = np.asarray(kept_poses, dtype=float)
+    if len(kept_rows) == 1:
+        return np.repeat(kept_poses, n_rows, axis=0)
+
+    rows = np.arange(n_rows)
+    segment = np.clip(np.searchsorted(kept_rows, rows, side="right") - 1, 0, len(kept_rows) - 2)
+    start, end = kept_poses[segment], kept_poses[segment + 1]
+    t = (rows - kept_rows[segment]) / (kept_rows[segment + 1] - kept_rows[segment])
+
+    poses = np.full((n_rows, 7), np.nan)
+    poses[:, :3] = start[:, :3] + t[:, None] * (end[:, :3] - start[:, :3])
+    between = np.isfinite(start).all(axis=1) & np.isfinite(end).all(axis=1)
+    if between.any():
+        start_rotations = Rotation.from_quat(start[between, 3:])
+        relative = start_rotations.inv() * Rotation.from_quat(end[between, 3:])
+        quats = (
+            start_rotations * Rotation.from_rotvec(relative.as_rotvec() * t[between, None])
+        ).as_quat()
+        # Same hemisphere as the FK quaternions
+        flip = np.einsum("ij,ij->i", quats, start[between, 3:]) < 0
+        quats[flip] *= -1.0
+        poses[between, 3:] = quats
+    poses[kept_rows] = kept_poses
+    return poses
+
+
+class FKSampler:
+    """
+    Run FK only on a subset of the rows, in front of an FK backend.
+
+    The backend is an FKClient, LocalFK or FKCache.
+
+    Consecutive identical joint states (standstill before and after the motion, repeated
+    joint_states between encoder updates) are collapsed into one FK call whose pose is
+    broadcast back, which is exact. With a `tolerance` in rad, the remaining rows are also
+    decimated where the motion is smooth (decimate_joint_path) and their poses are
+    interpolated between the computed ones.
+    """
+
+    def __init__(self, backend, tolerance=None):
+        self.backend = backend
+        self.tolerance = tolerance
+        self.n_rows = 0
+        self.n_unique = 0
+        self.n_computed = 0
+
+    def compute_fk_batch(self, joint_names, positions, from_frame="base", to_link="tool0"):
+        positions = np.asarray(positions, dtype=float)
+        if len(positions) == 0:
+            return np.full((0, 7), np.nan)
+
+        first_rows, run_of_row = collapse_duplicates(positions)
+        unique_positions = positions[first_rows]
+        kept = np.arange(len(unique_positions))
+        if self.tolerance:
+            kept = decimate_joint_path(unique_positions, self.tolerance)
+
+        kept_poses = self.backend.compute_fk_batch(
+            joint_names, unique_positions[kept], from_frame, to_link
+        )
+        self.n_rows += len(positions)
+        self.n_unique += len(unique_positions)
+        self.n_computed += len(kept)
+
+        if len(kept) < len(unique_positions):
+            unique_poses = interpolate_poses(kept, kept_poses, len(unique_positions))
+        else:
+            unique_poses = np.asarray(kept_poses, dtype=float)
+        return unique_poses[run_of_row]
+
+    def stats(self):
+        return {
+            "rows": self.n_rows,
+            "unique": self.n_unique,
+            "computed": self.n_computed,
+            "reduction": self.n_rows / self.n_computed if self.n_computed else 0.0,
+        }
+
+    def shutdown(self):
+        self.backend.shutdown()
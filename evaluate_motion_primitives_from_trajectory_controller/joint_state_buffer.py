@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import threading
+
+import numpy as np
+
+OVERFLOW_POLICIES = ("grow", "overwrite_oldest", "drop_newest")
+
+
+class JointStateBuffer:
+    """
+    Preallocated buffer for recorded joint states.
+
+    Every sample is stored as one row [timestamp, positions..., velocities...] in a
+    float64 array, no message objects are kept. The overflow policy decides what
+    happens when the buffer is full:
+    - "grow": double the capacity (amortized O(1) per sample)
+    - "overwrite_oldest": fixed-size ring buffer, the oldest sample is overwritten
+    - "drop_newest": fixed-size buffer, new samples are dropped
+    Messages with the joints in another order (or with additional joints) are remapped to
+    the order of the first sample by name, messages missing a recorded joint are skipped
+    and counted in n_mismatched. All methods are thread-safe, so callbacks and the thread
+    stopping the recording can use the buffer at the same time.
+    """
+
+    def __init__(self, capacity=60_000, overflow="grow"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy '{overflow}', use one of {OVERFLOW_POLICIES}"
+            )
+        self.capacity = capacity
+        self.overflow = overflow
+        self.joint_names = None
+        self.n_dropped = 0
+        self.n_mismatched = 0
+        self._orders = {}  # joint order of other messages -> indices of the recorded joints
+        self._data = None
+        self._start = 0  # index of the oldest sample (ring buffer mode)
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, joint_names, positions, velocities):
+        with self._lock:
+            if self._closed:
+                return False
+            if self._data is None:
+                # The first sample defines the joint order and the row layout
+                self.joint_names = list(joint_names)
+                self._data = np.empty((self.capacity, 1 + 2 * len(self.joint_names)))
+
+            order = self._order(joint_names)
+            if order is None or len(positions) != len(joint_names):
+                self.n_mismatched += 1
+                return False
+
+            if self._size == len(self._data):
+                if self.overflow == "grow":
+                    self._data = np.concatenate([self._data, np.empty_like(self._data)])
+                elif self.overflow == "drop_newest":
+                    self.n_dropped += 1
+                    return False
+                else:
+                    self._start = (self._start + 1) % len(self._data)
+                    self._size -= 1
+                    self.n_dropped += 1
+
+            n = len(self.joint_names)
+            row = self._data[(self._start + self._size) % len(self._data)]
+            row[0] = timestamp
+            # Some drivers publish no velocities
+            if order is True:
+                row[1:1 + n] = positions
+                row[1 + n:] = velocities if len(velocities) == n else np.nan
+            else:
+                row[1:1 + n] = np.asarray(positions)[order]
+                if len(velocities) == len(joint_names):
+                    row[1 + n:] = np.asarray(velocities)[order]
+                else:
+                    row[1 + n:] = np.nan
+            self._size += 1
+            return True
+
+    def _order(self, joint_names):
+        """
+        Return the order of the recorded joints in a message with the given joint names.
+
+        True if the joints are in the recorded order, otherwise the indices of the recorded
+        joints in the message, None if one of them is missing.
+        """
+        joint_names = tuple(joint_names)
+        if joint_names not in self._orders:
+            if list(joint_names) == self.joint_names:
+                self._orders[joint_names] = True
+            elif set(self.joint_names) <= set(joint_names):
+                self._orders[joint_names] = np.array(
+                    [joint_names.index(name) for name in self.joint_names]
+                )
+            else:
+                self._orders[joint_names] = None
+        return self._orders[joint_names]
+
+    def close(self):
+        """Stop accepting samples, callbacks still in flight are ignored afterwards."""
+        with self._lock:
+            self._closed = True
+
+    def to_array(self):
+        """Return a copy of all stored samples in chronological order."""
+        with self._lock:
+            if self._data is None:
+                return np.empty((0, 0))
+            idx = (self._start + np.arange(self._size)) % len(self._data)
+            return self._data[idx]
+
+    def drain(self):
+        """Return all stored samples in chronological order and empty the buffer."""
+        with self._lock:
+            if self._data is None:
+                return np.empty((0, 0))
+            idx = (self._start + np.arange(self._size)) % len(self._data)
+            samples = self._data[idx]
+            self._start = 0
+            self._size = 0
+            return samples
+
+    def header(self):
+        return (
+            ["timestamp"]
+            + [f"{name}_pos" for name in self.joint_names]
+            + [f"{name}_vel" for name in self.joint_names]
+        )
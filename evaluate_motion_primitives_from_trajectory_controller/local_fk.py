@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    import profiling
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller import profiling
+
+# Kinematic chains from "base" to "tool0" in URDF notation:
+# (joint name, origin xyz, origin rpy, axis) followed by the fixed tool0 transform (xyz, rpy).
+# The values reproduce the /compute_fk results stored in the recorded data.
+ROBOT_CHAINS = {
+    # UR10e (ur_description default calibration)
+    "ur": {
+        "joints": [
+            ("shoulder_pan_joint", (0.0, 0.0, 0.1807), (0.0, 0.0, 0.0), (0, 0, 1)),
+            ("shoulder_lift_joint", (0.0, 0.0, 0.0), (np.pi / 2, 0.0, 0.0), (0, 0, 1)),
+            ("elbow_joint", (-0.6127, 0.0, 0.0), (0.0, 0.0, 0.0), (0, 0, 1)),
+            ("wrist_1_joint", (-0.57155, 0.0, 0.17415), (0.0, 0.0, 0.0), (0, 0, 1)),
+            ("wrist_2_joint", (0.0, -0.11985, 0.0), (np.pi / 2, 0.0, 0.0), (0, 0, 1)),
+            ("wrist_3_joint", (0.0, 0.11655, 0.0), (-np.pi / 2, 0.0, 0.0), (0, 0, 1)),
+        ],
+        "tool": ((0.0, 0.0, 0.0), (0.0, 0.0, 0.0)),
+    },
+    # KUKA KR3 R540 (kuka_experimental)
+    "kuka": {
+        "joints": [
+            ("joint_a1", (0.0, 0.0, 0.345), (0.0, 0.0, 0.0), (0, 0, -1)),
+            ("joint_a2", (0.020, 0.0, 0.0), (0.0, 0.0, 0.0), (0, 1, 0)),
+            ("joint_a3", (0.260, 0.0, 0.0), (0.0, 0.0, 0.0), (0, 1, 0)),
+            ("joint_a4", (0.0, 0.0, 0.020), (0.0, 0.0, 0.0), (-1, 0, 0)),
+            ("joint_a5", (0.260, 0.0, 0.0), (0.0, 0.0, 0.0), (0, 1, 0)),
+            ("joint_a6", (0.075, 0.0, 0.0), (0.0, 0.0, 0.0), (-1, 0, 0)),
+        ],
+        "tool": ((0.0, 0.0, 0.0), (0.0, np.pi / 2, 0.0)),
+    },
+}
+
+
+def detect_robot(joint_names):
+    """Return the ROBOT_CHAINS key whose joint names match the given names."""
+    for robot, chain in ROBOT_CHAINS.items():
+        if set(name for name, *_ in chain["joints"]) <= set(joint_names):
+            return robot
+    raise ValueError(f"No kinematic chain known for joints: {list(joint_names)}")
+
+
+def _axis_rotations(axis, angles):
+    """Rodrigues formula for a fixed unit axis and an array of angles -> (N, 3, 3)."""
+    x, y, z = axis
+    c = np.cos(angles)
+    s = np.sin(angles)
+    C = 1.0 - c
+    rot = np.empty((len(angles), 3, 3))
+    rot[:, 0, 0] = c + x * x * C
+    rot[:, 0, 1] = x * y * C - z * s
+    rot[:, 0, 2] = x * z * C + y * s
+    rot[:, 1, 0] = y * x * C + z * s
+    rot[:, 1, 1] = c + y * y * C
+    rot[:, 1, 2] = y * z * C - x * s
+    rot[:, 2, 0] = z * x * C - y * s
+    rot[:, 2, 1] = z * y * C + x * s
+    rot[:, 2, 2] = c + z * z * C
+    return rot
+
+
+def forward_kinematics(robot, positions):
+    """
+    Compute tool0 poses for an (N, n_joints) array of joint positions.
+
+    Positions have to be ordered like the joints in ROBOT_CHAINS[robot].
+    Returns an (N, 7) array with [x, y, z, qx, qy, qz, qw] per row.
+    """
+    chain = ROBOT_CHAINS[robot]
+    positions = np.atleast_2d(np.asarray(positions, dtype=float))
+    n = len(positions)
+
+    rot = np.broadcast_to(np.eye(3), (n, 3, 3)).copy()
+    pos = np.zeros((n, 3))
+    for i, (_, xyz, rpy, axis) in enumerate(chain["joints"]):
+        pos += rot @ np.asarray(xyz)
+        rot = (rot @ R.from_euler("xyz", rpy).as_matrix()) @ _axis_rotations(
+            np.asarray(axis, dtype=float), positions[:, i]
+        )
+
+    tool_xyz, tool_rpy = chain["tool"]
+    pos += rot @ np.asarray(tool_xyz)
+    rot = rot @ R.from_euler("xyz", tool_rpy).as_matrix()
+
+    return np.hstack([pos, R.from_matrix(rot).as_quat()])
+
+
+class LocalFK:
+    """Drop-in replacement for FKClient that computes FK locally without MoveIt."""
+
+    def __init__(self, robot, n_workers=None, chunk_size=200_000):
+        if robot not in ROBOT_CHAINS:
+            raise ValueError(f"Unknown robot '{robot}', known: {list(ROBOT_CHAINS)}")
+        self.robot = robot
+        self.n_workers = n_workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.chain_joint_names = [name for name, *_ in ROBOT_CHAINS[robot]["joints"]]
+
+    def compute_fk_batch(self, joint_names, positions, from_frame="base", to_link="tool0"):
+        if from_frame != "base" or to_link != "tool0":
+            raise ValueError("LocalFK only supports FK from 'base' to 'tool0'.")
+
+        # Reorder the columns into the joint order of the chain
+        positions = np.asarray(positions, dtype=float)
+        order = [list(joint_names).index(name) for name in self.chain_joint_names]
+        positions = positions[:, order]
+
+        # Split very long logs into chunks and spread them over a process pool
+        t_start = time.perf_counter()
+        if len(positions) <= self.chunk_size or self.n_workers == 1:
+            poses = forward_kinematics(self.robot, positions)
+        else:
+            chunks = np.array_split(positions, int(np.ceil(len(positions) / self.chunk_size)))
+            with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+                results = pool.map(forward_kinematics, [self.robot] * len(chunks), chunks)
+            poses = np.vstack(list(results))
+        profiling.record_fk_call(time.perf_counter() - t_start, len(positions))
+        return poses
+
+    def shutdown(self):
+        pass
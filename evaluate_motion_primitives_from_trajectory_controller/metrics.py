@@ -0,0 +1,784 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.interpolate import interp1d
+from scipy.spatial import cKDTree
+from scipy.spatial.transform import Rotation, Slerp
+
+# Pure metric functions on arrays, no file access and no matplotlib.
+
+# Upper limit of the default DTW band in samples, so time and memory of the DTW grow
+# linearly with the trajectory length (O(N * window))
+MAX_DTW_WINDOW = 1000
+
+
+@dataclass
+class JointComparison:
+    joint_names: list
+    planned_resampled: np.ndarray  # (n_points, n_joints)
+    executed_resampled: np.ndarray  # (n_points, n_joints)
+    rmse: np.ndarray  # per joint
+    total_rmse: float
+
+
+@dataclass
+class CartesianComparison:
+    planned_resampled: np.ndarray  # (n_points, 3)
+    executed_resampled: np.ndarray  # (n_points, 3)
+    rmse_3d: float
+    n_planned: int  # unique points used for the resampling
+    n_executed: int
+    planned_arc_length: float  # path length in m
+    executed_arc_length: float
+    # Orientation along the path, only if quaternions were given
+    planned_quat_resampled: np.ndarray = None  # (n_points, 4) x, y, z, w
+    executed_quat_resampled: np.ndarray = None
+    angle_error: np.ndarray = None  # geodesic angle per resampled point in rad
+    rms_angle: float = None
+    max_angle: float = None
+
+
+@dataclass
+class TimeAlignedComparison:
+    joint_names: list
+    time: np.ndarray  # common time grid, time_from_start of the plan in s
+    planned: np.ndarray  # (n_samples, n_joints) on the time grid
+    executed: np.ndarray  # (n_samples, n_joints) at time + time_offset
+    error: np.ndarray  # executed - planned
+    rmse: np.ndarray  # per joint
+    total_rmse: float
+    max_error: float
+    time_offset: float  # executed timestamp at which the plan starts
+
+
+@dataclass
+class DTWComparison:
+    joint_names: list
+    path: np.ndarray  # (n_pairs, 2) aligned (planned, executed) sample indices
+    planned_aligned: np.ndarray  # (n_pairs, n_joints)
+    executed_aligned: np.ndarray  # (n_pairs, n_joints)
+    rmse: np.ndarray  # per joint over the aligned pairs
+    total_rmse: float
+    max_error: float
+    window: int  # Sakoe-Chiba band half width in samples
+
+
+@dataclass
+class PathDeviation:
+    cross_track: np.ndarray  # distance of every compared point to the planned polyline
+    max_cross_track: float
+    mean_cross_track: float
+    hausdorff: float  # symmetric
+    frechet: float  # discrete, on both paths densified to the same step
+
+
+@dataclass
+class PointMatches:
+    indices: np.ndarray  # nearest reference index per point
+    distances: np.ndarray  # euclidean distance to that reference point
+    exact: np.ndarray  # bool, equal within the tolerance (like np.allclose)
+
+
+def moving_range(velocities, vel_threshold):
+    """
+    Return (start, end) of the rows where the trajectory moves (end inclusive).
+
+    These are the rows between the first and the last row where any velocity is above the
+    threshold. Returns the full range if nothing moves.
+    """
+    moving = ~(np.asarray(velocities) <= vel_threshold).all(axis=1)
+    if not moving.any():
+        return 0, len(moving) - 1
+    return int(np.argmax(moving)), len(moving) - 1 - int(np.argmax(moving[::-1]))
+
+
+def resample_by_index(positions, n_points):
+    """Resample positions linearly on a normalized index to n_points samples."""
+    interp = interp1d(np.linspace(0, 1, len(positions)), positions, axis=0)
+    return interp(np.linspace(0, 1, n_points))
+
+
+def compute_arc_length(positions):
+    """Total path length of a polyline."""
+    return float(np.sum(np.linalg.norm(np.diff(positions, axis=0), axis=1)))
+
+
+def cumulative_arc_length(positions):
+    """Path length from the start to every point of a polyline."""
+    return np.concatenate([[0], np.cumsum(np.linalg.norm(np.diff(positions, axis=0), axis=1))])
+
+
+def compute_arc_length_parametrization(positions, arc_lengths=None):
+    """Normalize the arc length of every point, from the cumulative arc lengths if given."""
+    if len(positions) < 2:
+        raise ValueError("Need at least two points for arc-length parametrization.")
+    if arc_lengths is None:
+        arc_lengths = cumulative_arc_length(positions)
+    if arc_lengths[-1] == 0:
+        raise ValueError("Arc length is zero. All positions are identical.")
+    normalized_arc = arc_lengths / arc_lengths[-1]
+    return normalized_arc
+
+
+def remove_duplicate_points(s, positions):
+    """Remove points with duplicate s values (required for interp1d)."""
+    _, unique_indices = np.unique(s, return_index=True)
+    return s[unique_indices], positions[unique_indices]
+
+
+def compare_joint_trajectories(planned_positions, executed_positions, n_points, joint_names=None):
+    """Resample both joint trajectories on a normalized index and compute the RMSE."""
+    planned_resampled = resample_by_index(planned_positions, n_points)
+    executed_resampled = resample_by_index(executed_positions, n_points)
+
+    # Compute RMSE per joint and total
+    rmse = np.sqrt(np.mean((planned_resampled - executed_resampled) ** 2, axis=0))
+    total_rmse = float(np.sqrt(np.mean((planned_resampled - executed_resampled) ** 2)))
+
+    if joint_names is None:
+        joint_names = [f"joint_{i}" for i in range(planned_resampled.shape[1])]
+    return JointComparison(
+        list(joint_names), planned_resampled, executed_resampled, rmse, total_rmse
+    )
+
+
+def make_quaternions_continuous(quats):
+    """Flip the sign of quaternions (N, 4) so that consecutive ones are in the same hemisphere."""
+    quats = np.asarray(quats, dtype=float)
+    flips = np.einsum("ij,ij->i", quats[1:], quats[:-1]) < 0
+    signs = np.where(np.concatenate([[0], np.cumsum(flips)]) % 2, -1.0, 1.0)
+    return quats * signs[:, None]
+
+
+def compare_cartesian_trajectories(
+    planned_positions, executed_positions, n_points, planned_quats=None, executed_quats=None,
+    planned_arc=None, executed_arc=None,
+):
+    """
+    Resample both (N, 3) paths uniformly along their arc length and compute the 3D RMSE.
+
+    If the quaternions (N, 4) are given, the orientations are resampled at the same arc length
+    with slerp and the geodesic angle between planned and executed orientation is computed.
+    The cumulative arc lengths of the paths are computed unless given (cached by Run).
+    """
+    if planned_arc is None:
+        planned_arc = cumulative_arc_length(planned_positions)
+    if executed_arc is None:
+        executed_arc = cumulative_arc_length(executed_positions)
+    planned_arc_length = float(planned_arc[-1])
+    executed_arc_length = float(executed_arc[-1])
+    with_orientation = planned_quats is not None and executed_quats is not None
+    if with_orientation:
+        # Keep the quaternions next to the positions for the duplicate removal
+        planned_positions = np.hstack([planned_positions, planned_quats])
+        executed_positions = np.hstack([executed_positions, executed_quats])
+
+    # Compute arc-length-parametrized distances
+    s_planned = compute_arc_length_parametrization(planned_positions[:, :3], planned_arc)
+    s_executed = compute_arc_length_parametrization(executed_positions[:, :3], executed_arc)
+
+    # remove duplicate points
+    s_planned, planned_positions = remove_duplicate_points(s_planned, planned_positions)
+    s_executed, executed_positions = remove_duplicate_points(s_executed, executed_positions)
+
+    if len(s_planned) < 2 or len(s_executed) < 2:
+        raise ValueError("Too few unique points after removing duplicates.")
+
+    # Interpolators with cartesian (not temporal) parametrization
+    interp_planned = interp1d(s_planned, planned_positions[:, :3], axis=0, kind="linear")
+    interp_executed = interp1d(s_executed, executed_positions[:, :3], axis=0, kind="linear")
+
+    # Uniform sampling along the path (e.g. 100 points)
+    arc_points = np.linspace(0, 1, n_points)
+    planned_resampled = interp_planned(arc_points)
+    executed_resampled = interp_executed(arc_points)
+
+    # Calculate 3D RMSE
+    diffs = planned_resampled - executed_resampled
+    squared_distances = np.sum(diffs**2, axis=1)
+    rmse_3d = float(np.sqrt(np.mean(squared_distances)))
+
+    result = CartesianComparison(
+        planned_resampled,
+        executed_resampled,
+        rmse_3d,
+        len(planned_positions),
+        len(executed_positions),
+        planned_arc_length,
+        executed_arc_length,
+    )
+    if not with_orientation:
+        return result
+
+    planned_rotations = Slerp(
+        s_planned, Rotation.from_quat(make_quaternions_continuous(planned_positions[:, 3:]))
+    )(arc_points)
+    executed_rotations = Slerp(
+        s_executed, Rotation.from_quat(make_quaternions_continuous(executed_positions[:, 3:]))
+    )(arc_points)
+    return _add_orientation_error(result, planned_rotations, executed_rotations)
+
+
+def _add_orientation_error(result, planned_rotations, executed_rotations):
+    """Store the resampled orientations and their geodesic angle error in the result."""
+    # Geodesic angle of the relative rotation, one batch call for all points
+    angle_error = (planned_rotations.inv() * executed_rotations).magnitude()
+
+    # Report the executed quaternions in the hemisphere of the planned ones
+    planned_quat_resampled = make_quaternions_continuous(planned_rotations.as_quat())
+    executed_quat_resampled = executed_rotations.as_quat()
+    executed_quat_resampled *= np.where(
+        np.einsum("ij,ij->i", planned_quat_resampled, executed_quat_resampled) < 0, -1.0, 1.0
+    )[:, None]
+
+    result.planned_quat_resampled = planned_quat_resampled
+    result.executed_quat_resampled = executed_quat_resampled
+    result.angle_error = angle_error
+    result.rms_angle = float(np.sqrt(np.mean(angle_error**2)))
+    result.max_angle = float(angle_error.max())
+    return result
+
+
+def moving_range_chunked(velocity_chunks, vel_threshold):
+    """
+    Find the moving range of an iterable of row chunks in a single pass.
+
+    Like moving_range, without a mask over all rows. Returns (start, end, n_rows).
+    """
+    start = end = None
+    n_rows = 0
+    for chunk in velocity_chunks:
+        moving = np.flatnonzero(~(np.asarray(chunk) <= vel_threshold).all(axis=1))
+        if len(moving):
+            if start is None:
+                start = n_rows + int(moving[0])
+            end = n_rows + int(moving[-1])
+        n_rows += len(chunk)
+    if start is None:
+        return 0, n_rows - 1, n_rows
+    return start, end, n_rows
+
+
+def slice_chunks(chunks, start, stop):
+    """Yield the rows start..stop - 1 of an iterable of row chunks."""
+    offset = 0
+    for chunk in chunks:
+        if offset >= stop:
+            break
+        if offset + len(chunk) > start:
+            yield chunk[max(start - offset, 0):stop - offset]
+        offset += len(chunk)
+
+
+def resample_by_index_chunked(chunks, n_rows, n_points):
+    """
+    Resample an iterable of row chunks with n_rows rows in total by index.
+
+    Like resample_by_index, but only the two rows around every sample are kept, so memory
+    does not depend on n_rows.
+    """
+    if n_rows < 2:
+        raise ValueError("Need at least two rows for the resampling.")
+    position = np.linspace(0, n_rows - 1, n_points)
+    lower = np.minimum(np.floor(position).astype(int), n_rows - 2)
+    fraction = (position - lower)[:, None]
+
+    resampled = None
+    offset = 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=float)
+        if resampled is None:
+            resampled = np.zeros((n_points, chunk.shape[1]))
+        # Samples whose lower or upper row is in this chunk
+        for rows, weight in ((lower, 1.0 - fraction), (lower + 1, fraction)):
+            inside = (rows >= offset) & (rows < offset + len(chunk))
+            resampled[inside] += weight[inside] * chunk[rows[inside] - offset]
+        offset += len(chunk)
+    return resampled
+
+
+def arc_length_chunked(chunks):
+    """
+    Compute the arc length of the (x, y, z) path of an iterable of row chunks in one pass.
+
+    Returns (arc_length, n_unique) with the number of points with distinct arc length.
+    """
+    arc_length = 0.0
+    n_unique = 0
+    previous = None
+    for chunk in chunks:
+        points = np.asarray(chunk, dtype=float)[:, :3]
+        if previous is not None:
+            points = np.vstack([previous, points])
+        elif len(points):
+            n_unique = 1
+        steps = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        arc_length += float(steps.sum())
+        n_unique += int(np.count_nonzero(steps))
+        if len(points):
+            previous = points[-1:]
+    return arc_length, n_unique
+
+
+def resample_by_arc_length_chunked(chunks, arc_length, n_points):
+    """
+    Sample the path of an iterable of row chunks uniformly along its arc length.
+
+    The chunks hold x, y, z and optionally qx, qy, qz, qw, sampled like in
+    compare_cartesian_trajectories. Repeated points are skipped like remove_duplicate_points
+    does. Returns the (n_points, 3) positions and the rotations (or None).
+    """
+    if arc_length == 0:
+        raise ValueError("Arc length is zero. All positions are identical.")
+    targets = np.linspace(0, 1, n_points) * arc_length
+    starts = ends = fraction = None
+    found = np.zeros(n_points, dtype=bool)
+    covered = 0.0
+    anchor = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=float)
+        if not len(chunk):
+            continue
+        if starts is None:
+            starts = np.zeros((n_points, chunk.shape[1]))
+            ends = np.zeros((n_points, chunk.shape[1]))
+            fraction = np.zeros(n_points)
+            # The first target (s = 0) is the first point
+            starts[0] = ends[0] = chunk[0]
+            found[0] = True
+        rows = chunk if anchor is None else np.vstack([anchor, chunk])
+        steps = np.linalg.norm(np.diff(rows[:, :3], axis=0), axis=1)
+        moved = np.flatnonzero(steps > 0)
+        if len(moved):
+            # Segments between distinct points, starting at the first of repeated points
+            upper = covered + np.cumsum(steps)[moved]
+            lower = np.concatenate([[covered], upper[:-1]])
+            first = np.concatenate([[0], moved[:-1] + 1])
+            segment = np.searchsorted(upper, targets, side="left")
+            inside = ~found & (targets > covered) & (segment < len(moved))
+            segment = segment[inside]
+            starts[inside] = rows[first[segment]]
+            ends[inside] = rows[moved[segment] + 1]
+            fraction[inside] = (targets[inside] - lower[segment]) / (
+                upper[segment] - lower[segment]
+            )
+            found |= inside
+            covered = float(upper[-1])
+            anchor = rows[moved[-1] + 1:moved[-1] + 2]
+        elif anchor is None:
+            anchor = rows[:1]
+    # Rounding of the summed steps can leave the last target just behind the path
+    starts[~found] = ends[~found] = anchor[0]
+
+    positions = starts[:, :3] + fraction[:, None] * (ends[:, :3] - starts[:, :3])
+    if starts.shape[1] < 7:
+        return positions, None
+    # Slerp between the two orientations of every segment
+    start_rotations = Rotation.from_quat(starts[:, 3:7])
+    relative = start_rotations.inv() * Rotation.from_quat(ends[:, 3:7])
+    return positions, start_rotations * Rotation.from_rotvec(
+        relative.as_rotvec() * fraction[:, None]
+    )
+
+
+def compare_joint_trajectories_chunked(
+    planned_positions, executed_chunks, n_executed, n_points, joint_names=None
+):
+    """compare_joint_trajectories with the executed positions as iterable of row chunks."""
+    planned_resampled = resample_by_index(planned_positions, n_points)
+    executed_resampled = resample_by_index_chunked(executed_chunks, n_executed, n_points)
+
+    error = planned_resampled - executed_resampled
+    if joint_names is None:
+        joint_names = [f"joint_{i}" for i in range(planned_resampled.shape[1])]
+    return JointComparison(
+        list(joint_names),
+        planned_resampled,
+        executed_resampled,
+        np.sqrt(np.mean(error**2, axis=0)),
+        float(np.sqrt(np.mean(error**2))),
+    )
+
+
+def compare_cartesian_trajectories_chunked(
+    planned_positions, executed_chunks, n_points, planned_quats=None
+):
+    """
+    compare_cartesian_trajectories with the executed poses read in chunks.
+
+    `executed_chunks` is called twice and has to return a new iterable of row chunks with
+    (x, y, z) or (x, y, z, qx, qy, qz, qw) each time: the first pass sums the arc length,
+    the second one samples the path. The orientation is compared if both have quaternions.
+    """
+    executed_arc_length, n_executed = arc_length_chunked(executed_chunks())
+    executed_resampled, executed_rotations = resample_by_arc_length_chunked(
+        executed_chunks(), executed_arc_length, n_points
+    )
+
+    with_orientation = planned_quats is not None and executed_rotations is not None
+    planned = np.hstack([planned_positions, planned_quats]) if with_orientation else (
+        np.asarray(planned_positions, dtype=float)
+    )
+    planned_arc_length, n_planned = arc_length_chunked([planned])
+    planned_resampled, planned_rotations = resample_by_arc_length_chunked(
+        [planned], planned_arc_length, n_points
+    )
+
+    squared_distances = np.sum((planned_resampled - executed_resampled) ** 2, axis=1)
+    result = CartesianComparison(
+        planned_resampled,
+        executed_resampled,
+        float(np.sqrt(np.mean(squared_distances))),
+        n_planned,
+        n_executed,
+        planned_arc_length,
+        executed_arc_length,
+    )
+    if not with_orientation:
+        return result
+    return _add_orientation_error(result, planned_rotations, executed_rotations)
+
+
+def match_points(reference, points, atol=1e-6, rtol=1e-5):
+    """
+    Find the nearest reference point for every point with a KD-tree.
+
+    The reference points (e.g. planned trajectory) and the points (e.g. reduced points)
+    are given in joint or Cartesian space.
+
+    Identical reference points map to their first occurrence. A match is exact if all
+    coordinates are equal within atol + rtol * |reference| (same test as np.allclose).
+    """
+    reference = np.asarray(reference, dtype=float)
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+
+    # Drop repeated reference points (e.g. standstill) so ties resolve to the first index
+    unique_reference, first_indices = np.unique(reference, axis=0, return_index=True)
+    distances, nearest = cKDTree(unique_reference).query(points)
+    indices = first_indices[nearest]
+
+    matched = reference[indices]
+    exact = np.all(np.abs(points - matched) <= atol + rtol * np.abs(matched), axis=1)
+    return PointMatches(indices, distances, exact)
+
+
+def resample_in_time(time, positions, grid):
+    """Linear interpolation of every column onto the time grid (held constant outside)."""
+    positions = np.asarray(positions, dtype=float)
+    return np.column_stack(
+        [np.interp(grid, time, positions[:, j]) for j in range(positions.shape[1])]
+    )
+
+
+def estimate_time_offset(planned_time, planned_positions, executed_time, executed_positions, dt):
+    """
+    Estimate the executed timestamp at which the planned trajectory starts.
+
+    Both trajectories are resampled with dt and the joint velocities are cross-correlated
+    with an FFT (O(N log N)); the lag with the highest correlation summed over all
+    joints gives the offset.
+    """
+    planned_grid = np.arange(planned_time[0], planned_time[-1] + dt, dt)
+    executed_grid = np.arange(executed_time[0], executed_time[-1] + dt, dt)
+    planned_vel = np.diff(resample_in_time(planned_time, planned_positions, planned_grid), axis=0)
+    executed_vel = np.diff(
+        resample_in_time(executed_time, executed_positions, executed_grid), axis=0
+    )
+
+    # corr[lag] = sum_k planned_vel[k] * executed_vel[k + lag], negative lags wrap around
+    n = len(planned_vel) + len(executed_vel)
+    n_fft = 1 << (n - 1).bit_length()
+    spectrum = np.conj(np.fft.rfft(planned_vel, n_fft, axis=0)) * np.fft.rfft(
+        executed_vel, n_fft, axis=0
+    )
+    corr = np.fft.irfft(spectrum.sum(axis=1), n_fft)
+    lags = np.arange(n_fft)
+    lags[lags >= n_fft - len(planned_vel)] -= n_fft
+    valid = (lags > -len(planned_vel)) & (lags < len(executed_vel))
+    lag = lags[valid][np.argmax(corr[valid])]
+    return executed_grid[0] + lag * dt - planned_grid[0]
+
+
+def compare_joint_trajectories_in_time(
+    planned_time, planned_positions, executed_time, executed_positions, dt=None,
+    time_offset=None, joint_names=None,
+):
+    """
+    Compare planned and executed joint positions over time instead of over the index.
+
+    The start offset of the execution is estimated by cross-correlation unless given.
+    Both trajectories are interpolated onto a common grid over the planned duration
+    (default dt: median sampling interval of the executed data).
+    """
+    planned_time = np.asarray(planned_time, dtype=float)
+    executed_time = np.asarray(executed_time, dtype=float)
+    if dt is None:
+        dt = float(np.median(np.diff(executed_time)))
+    if time_offset is None:
+        time_offset = estimate_time_offset(
+            planned_time, planned_positions, executed_time, executed_positions, dt
+        )
+
+    grid = np.arange(planned_time[0], planned_time[-1] + dt / 2, dt)
+    planned = resample_in_time(planned_time, planned_positions, grid)
+    executed = resample_in_time(executed_time, executed_positions, grid + time_offset)
+    error = executed - planned
+
+    if joint_names is None:
+        joint_names = [f"joint_{i}" for i in range(planned.shape[1])]
+    return TimeAlignedComparison(
+        list(joint_names),
+        grid,
+        planned,
+        executed,
+        error,
+        np.sqrt(np.mean(error**2, axis=0)),
+        float(np.sqrt(np.mean(error**2))),
+        float(np.abs(error).max()),
+        float(time_offset),
+    )
+
+
+def dtw_path(a, b, window):
+    """
+    Dynamic time warping of the sequences a (N, d) and b (M, d) with a Sakoe-Chiba band.
+
+    Only the cells within `window` samples of the (scaled) diagonal are evaluated, so time
+    and memory are O(N * window) instead of O(N * M). Returns the warping path as (n_pairs,
+    2) index array from (0, 0) to (N - 1, M - 1) and the accumulated euclidean cost.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    n, m = len(a), len(b)
+    # The band has to be at least as wide as the slope, otherwise rows are not connected
+    window = max(int(window), int(np.ceil((m - 1) / max(n - 1, 1))))
+    centers = np.round(np.arange(n) * (m - 1) / max(n - 1, 1)).astype(int)
+    lows = np.maximum(centers - window, 0)
+    highs = np.minimum(centers + window, m - 1)
+
+    # Step per cell for the backtracking: 0 diagonal, 1 from the row above, 2 from the left
+    steps = np.zeros((n, 2 * window + 1), dtype=np.int8)
+    prev_cost, prev_low = None, 0
+    for i in range(n):
+        cols = np.arange(lows[i], highs[i] + 1)
+        dist = np.linalg.norm(b[cols] - a[i], axis=1)
+
+        # Best predecessor from the previous row (diagonal or above)
+        if prev_cost is None:
+            from_prev = np.full(len(cols), np.inf)
+            from_prev[0] = 0.0 if cols[0] == 0 else np.inf
+            step = np.zeros(len(cols), dtype=np.int8)
+        else:
+            padded = np.concatenate([[np.inf], prev_cost, [np.inf]])
+            up = padded[np.clip(cols - prev_low + 1, 0, len(padded) - 1)]
+            diag = padded[np.clip(cols - prev_low, 0, len(padded) - 1)]
+            step = (up < diag).astype(np.int8)
+            from_prev = np.minimum(up, diag)
+        entry = from_prev + dist
+
+        # Horizontal moves within the row: cost[j] = min(entry[j], cost[j - 1] + dist[j]),
+        # solved without a python loop as a running minimum of entry - cumsum(dist)
+        cumulative = np.cumsum(dist)
+        shifted = entry - cumulative
+        running_min = np.minimum.accumulate(shifted)
+        from_left = running_min < shifted
+        cost = np.where(from_left, running_min + cumulative, entry)
+        step[from_left] = 2
+
+        steps[i, : len(cols)] = step
+        prev_cost, prev_low = cost, lows[i]
+
+    # Backtrack from the end to the start
+    path = []
+    i, j = n - 1, m - 1
+    while True:
+        path.append((i, j))
+        if i == 0 and j == 0:
+            break
+        step = steps[i, j - lows[i]]
+        if step == 0:
+            i, j = i - 1, j - 1
+        elif step == 1:
+            i -= 1
+        else:
+            j -= 1
+    return np.array(path[::-1]), float(prev_cost[-1])
+
+
+def compare_joint_trajectories_dtw(
+    planned_positions, executed_positions, window=None, joint_names=None
+):
+    """
+    Pair planned and executed samples by dynamic time warping instead of by index.
+
+    Local speed differences then do not count as position error. Only pairs within `window`
+    samples of the diagonal are aligned; compare_and_plot_joint_trajectories_dtw passes a
+    band of DTW_WINDOW_DURATION (1 s) at the executed sample rate. Without a window, the
+    band is 10 % of the longer trajectory, at most MAX_DTW_WINDOW samples.
+    """
+    planned_positions = np.asarray(planned_positions, dtype=float)
+    executed_positions = np.asarray(executed_positions, dtype=float)
+    if window is None:
+        window = min(max(len(planned_positions), len(executed_positions)) // 10, MAX_DTW_WINDOW)
+    path, _ = dtw_path(planned_positions, executed_positions, window)
+
+    planned_aligned = planned_positions[path[:, 0]]
+    executed_aligned = executed_positions[path[:, 1]]
+    error = executed_aligned - planned_aligned
+
+    if joint_names is None:
+        joint_names = [f"joint_{i}" for i in range(planned_positions.shape[1])]
+    return DTWComparison(
+        list(joint_names),
+        path,
+        planned_aligned,
+        executed_aligned,
+        np.sqrt(np.mean(error**2, axis=0)),
+        float(np.sqrt(np.mean(error**2))),
+        float(np.abs(error).max()),
+        int(window),
+    )
+
+
+def densify_polyline(points, max_step):
+    """Insert points on the segments of a polyline so that no segment is longer than max_step."""
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2 or max_step <= 0:
+        return points
+    segments = np.diff(points, axis=0)
+    counts = np.maximum(np.ceil(np.linalg.norm(segments, axis=1) / max_step), 1).astype(int)
+    segment_idx = np.repeat(np.arange(len(segments)), counts)
+    fraction = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) / (
+        np.repeat(counts, counts)
+    )
+    dense = points[segment_idx] + fraction[:, None] * segments[segment_idx]
+    return np.vstack([dense, points[-1:]])
+
+
+def polyline_distance(polyline, points):
+    """
+    Cross-track distance of every point to a polyline (projection onto the closest segment).
+
+    The distance to the nearest vertex (KD-tree) bounds the result, so only segments whose
+    midpoint lies within that bound plus half the longest segment are projected.
+    """
+    polyline = np.asarray(polyline, dtype=float)
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    if len(polyline) == 1:
+        polyline = np.vstack([polyline, polyline])
+
+    # Split long segments, so the candidate radius stays small for unevenly sampled paths
+    lengths = np.linalg.norm(np.diff(polyline, axis=0), axis=1)
+    polyline = densify_polyline(polyline, lengths.mean())
+    starts = polyline[:-1]
+    segments = np.diff(polyline, axis=0)
+    squared_lengths = np.einsum("ij,ij->i", segments, segments)
+
+    upper_bound, _ = cKDTree(polyline).query(points)
+    radius = upper_bound + np.sqrt(squared_lengths.max()) / 2 + 1e-12
+    candidates = cKDTree(starts + segments / 2).query_ball_point(
+        points, radius, return_sorted=False
+    )
+    counts = np.fromiter(map(len, candidates), dtype=int, count=len(points))
+    point_idx = np.repeat(np.arange(len(points)), counts)
+    segment_idx = np.fromiter(
+        (s for c in candidates for s in c), dtype=int, count=int(counts.sum())
+    )
+
+    # Project every point onto its candidate segments and keep the smallest distance
+    relative = points[point_idx] - starts[segment_idx]
+    t = np.einsum("ij,ij->i", relative, segments[segment_idx]) / np.maximum(
+        squared_lengths[segment_idx], np.finfo(float).tiny
+    )
+    t = np.clip(t, 0.0, 1.0)
+    distances = np.linalg.norm(relative - t[:, None] * segments[segment_idx], axis=1)
+    return np.minimum.reduceat(distances, np.cumsum(counts) - counts)
+
+
+def hausdorff_distance(a, b):
+    """Symmetric Hausdorff distance between the vertices of two polylines and the other path."""
+    return float(max(polyline_distance(a, b).max(), polyline_distance(b, a).max()))
+
+
+def discrete_frechet_distance(a, b):
+    """
+    Discrete Frechet distance of two point sequences.
+
+    The recurrence is evaluated along anti-diagonals, whose cells only depend on the two
+    previous anti-diagonals, so every anti-diagonal is one vectorized step. Memory is
+    O(min(N, M)).
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if len(a) > len(b):
+        a, b = b, a
+    n, m = len(a), len(b)
+    b_reversed = b[::-1]
+
+    # Three rotating buffers over the rows of a, shifted by one. The cells next to the valid
+    # range of an anti-diagonal are kept infinite, so they act as border. Squared distances
+    # are used, the root is taken once at the end.
+    buffers = [np.full(n + 2, np.inf) for _ in range(3)]
+    buffers[1][1] = np.sum((a[0] - b[0]) ** 2)
+    for k in range(1, n + m - 1):
+        prev2, prev1, current = buffers[(k - 1) % 3], buffers[k % 3], buffers[(k + 1) % 3]
+        low, high = max(0, k - m + 1), min(k, n - 1)
+        # Rows low..high pair with the columns k - low down to k - high
+        diff = a[low:high + 1] - b_reversed[m - 1 - k + low:m - k + high]
+        dist = np.einsum("ij,ij->i", diff, diff)
+        # Predecessors: (i - 1, j), (i, j - 1) on the last and (i - 1, j - 1) on the one before
+        best = np.minimum(prev1[low:high + 1], prev1[low + 1:high + 2])
+        np.minimum(best, prev2[low:high + 1], out=best)
+        np.maximum(dist, best, out=current[low + 1:high + 2])
+        current[low] = np.inf
+        current[high + 2] = np.inf
+    return float(np.sqrt(buffers[(n + m - 1) % 3][n]))
+
+
+def compare_path_deviation(planned, other, resolution=1000, arc_lengths=None):
+    """
+    Compute the geometric deviation of a path from the planned path.
+
+    The path (executed samples or reduced points) is given in joint or Cartesian space.
+
+    The cross-track distance is evaluated for every point of `other`. For the Hausdorff and
+    Frechet distances both paths are densified to a common step (the longer arc length
+    divided by max(resolution, number of points)), which bounds the discretization error.
+    `arc_lengths` are the total arc lengths of both paths, if already known.
+    """
+    planned = np.asarray(planned, dtype=float)
+    other = np.asarray(other, dtype=float)
+
+    cross_track = polyline_distance(planned, other)
+
+    if arc_lengths is None:
+        arc_lengths = (compute_arc_length(planned), compute_arc_length(other))
+    step = max(arc_lengths) / max(resolution, len(planned), len(other))
+    planned_dense = densify_polyline(planned, step)
+    other_dense = densify_polyline(other, step)
+
+    return PathDeviation(
+        cross_track,
+        float(cross_track.max()),
+        float(cross_track.mean()),
+        hausdorff_distance(planned_dense, other_dense),
+        discrete_frechet_distance(planned_dense, other_dense),
+    )
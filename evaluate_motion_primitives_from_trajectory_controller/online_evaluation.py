@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import rclpy
+from rclpy.node import Node
+from trajectory_msgs.msg import JointTrajectory
+from sensor_msgs.msg import JointState
+from std_msgs.msg import Float64MultiArray, MultiArrayDimension
+
+import numpy as np
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from online_tracking import OnlineTrackingError
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.online_tracking import (
+        OnlineTrackingError,
+    )
+
+# Rate in Hz at which the running statistics are published
+PUBLISH_RATE = 10.0
+# Number of planned segments searched ahead of the last match per joint_states message
+SEARCH_WINDOW = 10
+# Samples where all joint velocities are below this threshold (standstill) are not counted
+VEL_THRESHOLD = 0.001
+
+# Entries of the published Float64MultiArray
+TRACKING_ERROR_LABELS = ["rmse", "max_deviation", "deviation", "nearest_index", "n_samples"]
+
+
+class OnlineEvaluator(Node):
+    """Evaluate the execution while it runs instead of recording it for compare.py."""
+
+    def __init__(self):
+        super().__init__("online_evaluator")
+        self.declare_parameter("publish_rate", PUBLISH_RATE)
+        self.declare_parameter("search_window", SEARCH_WINDOW)
+        self.declare_parameter("vel_threshold", VEL_THRESHOLD)
+        self.search_window = self.get_parameter("search_window").value
+        self.vel_threshold = self.get_parameter("vel_threshold").value
+
+        self.tracker = None
+        self.joint_names = None
+        # Order of /joint_states differs from the planned order, the mapping is cached per
+        # name layout (None for layouts without all planned joints, e.g. of a gripper)
+        self._state_orders = {}
+
+        self.trajectory_sub = self.create_subscription(
+            JointTrajectory,
+            "/motion_primitive_from_trajectory_controller/planned_trajectory",
+            self.trajectory_callback,
+            1,
+        )
+        self.joint_state_sub = self.create_subscription(
+            JointState, "/joint_states", self.joint_states_callback, 100
+        )
+        self.tracking_error_pub = self.create_publisher(
+            Float64MultiArray, "~/tracking_error", 10
+        )
+        self.publish_timer = self.create_timer(
+            1.0 / self.get_parameter("publish_rate").value, self.publish_tracking_error
+        )
+
+        self.get_logger().info("Waiting for planned trajectory...")
+
+    def trajectory_callback(self, msg):
+        # Every new trajectory restarts the statistics
+        self.joint_names = list(msg.joint_names)
+        self._state_orders = {}
+        self.tracker = OnlineTrackingError(
+            [point.positions for point in msg.points], self.search_window
+        )
+        self.get_logger().info(
+            f"Received planned_trajectory with {len(msg.points)} points, tracking started."
+        )
+
+    def joint_states_callback(self, msg):
+        if self.tracker is None:
+            return
+        names = tuple(msg.name)
+        if names not in self._state_orders:
+            try:
+                self._state_orders[names] = np.array([names.index(n) for n in self.joint_names])
+            except ValueError:
+                self._state_orders[names] = None
+        state_order = self._state_orders[names]
+        if state_order is None:
+            # Other publishers on /joint_states, only the message is skipped
+            self.get_logger().warn(
+                f"Skipping joint_states with joints {list(msg.name)}, tracking "
+                f"{self.joint_names}.",
+                throttle_duration_sec=5.0,
+            )
+            return
+        if len(msg.velocity) and np.all(np.abs(msg.velocity) <= self.vel_threshold):
+            return
+        self.tracker.update(np.asarray(msg.position)[state_order])
+
+    def publish_tracking_error(self):
+        if self.tracker is None or self.tracker.n_samples == 0:
+            return
+        msg = Float64MultiArray()
+        msg.layout.dim = [
+            MultiArrayDimension(label=label, size=1, stride=1) for label in TRACKING_ERROR_LABELS
+        ]
+        msg.data = [
+            self.tracker.rmse,
+            self.tracker.max_deviation,
+            self.tracker.deviation,
+            float(self.tracker.nearest_index),
+            float(self.tracker.n_samples),
+        ]
+        self.tracking_error_pub.publish(msg)
+
+    def log_summary(self):
+        if self.tracker is None or self.tracker.n_samples == 0:
+            self.get_logger().info("No joint_states evaluated.")
+            return
+        self.get_logger().info(
+            f"Tracking error over {self.tracker.n_samples} samples: RMSE "
+            f"{self.tracker.rmse:.4f} rad, max deviation {self.tracker.max_deviation:.4f} rad, "
+            f"{self.tracker.progress:.0%} of the planned trajectory passed"
+        )
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = OnlineEvaluator()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        node.get_logger().info("Node interrupted by user.")
+    finally:
+        node.log_summary()
+        if rclpy.ok():
+            node.destroy_node()
+            rclpy.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import numpy as np
+
+
+class OnlineTrackingError:
+    """
+    Running tracking error of joint positions against a planned joint trajectory.
+
+    Every update projects the position onto the planned segments in a window of
+    `search_window` segments from the segment before the last matched one. The matched
+    segment moves back by at most one segment per update, so an update costs
+    O(search_window) independent of the trajectory length and the stream length. The
+    deviation is the distance to the planned path (cross-track).
+    """
+
+    def __init__(self, planned_positions, search_window=10):
+        planned = np.atleast_2d(np.asarray(planned_positions, dtype=float))
+        if len(planned) == 1:
+            planned = np.vstack([planned, planned])
+        self.planned = planned
+        self.search_window = max(int(search_window), 1)
+        self._starts = planned[:-1]
+        self._segments = np.diff(planned, axis=0)
+        self._squared_lengths = np.maximum(
+            np.einsum("ij,ij->i", self._segments, self._segments), np.finfo(float).tiny
+        )
+        self.reset()
+
+    def reset(self):
+        self.segment_index = 0
+        self.nearest_index = 0
+        self.deviation = np.nan
+        self.max_deviation = 0.0
+        self.n_samples = 0
+        self._sum_squared = 0.0
+
+    def update(self, position):
+        """Match one joint position (planned joint order) and update the statistics."""
+        # Near a vertex noisy samples alternate between the segments before and after it,
+        # so the window starts one segment before the last match
+        low = max(self.segment_index - 1, 0)
+        high = min(self.segment_index + self.search_window, len(self._segments))
+        segments = self._segments[low:high]
+        relative = np.asarray(position, dtype=float) - self._starts[low:high]
+        t = np.einsum("ij,ij->i", relative, segments) / self._squared_lengths[low:high]
+        np.clip(t, 0.0, 1.0, out=t)
+        distances = np.linalg.norm(relative - t[:, None] * segments, axis=1)
+
+        k = int(np.argmin(distances))
+        self.segment_index = low + k
+        self.nearest_index = low + k + int(t[k] > 0.5)
+        self.deviation = float(distances[k])
+        self.max_deviation = max(self.max_deviation, self.deviation)
+        self.n_samples += 1
+        self._sum_squared += self.deviation**2
+        return self.deviation
+
+    @property
+    def rmse(self):
+        return float(np.sqrt(self._sum_squared / self.n_samples)) if self.n_samples else np.nan
+
+    @property
+    def progress(self):
+        """Fraction of the planned points passed."""
+        return self.nearest_index / (len(self.planned) - 1)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    import profiling
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller import profiling
+
+
+def new_figure(show, **kwargs):
+    """
+    Create a figure.
+
+    Figures that are only saved use the Agg canvas directly, so no GUI backend and no
+    pyplot state is involved.
+    """
+    if show:
+        import matplotlib.pyplot as plt
+
+        return plt.figure(**kwargs)
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def finish_figure(fig, plot_path, show):
+    """Save the figure and show it (blocking) if requested."""
+    with profiling.stage("savefig"):
+        fig.savefig(plot_path)
+    if show:
+        import matplotlib.pyplot as plt
+
+        plt.show()
+        plt.close(fig)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+"""
+Opt-in instrumentation of the evaluation stages.
+
+The evaluation code marks its stages with `stage(name)` and reports loaded rows, FK calls
+and cache lookups with the functions below. These are no-ops unless a StageProfiler is
+activated with `profile(profiler)`, so the instrumentation costs nothing by default.
+"""
+
+import cProfile
+from contextlib import contextmanager, nullcontext
+import json
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+
+# Bin edges in s of the FK call latency histogram (1 us ... 10 s, open-ended last bin)
+FK_LATENCY_BINS = [0.0] + [10.0**e for e in range(-6, 2)] + [np.inf]
+
+# Profiler of the running evaluation, set by profile()
+_profiler = None
+
+
+class StageProfiler:
+    """
+    Wall time, CPU time, peak memory and row counts per stage.
+
+    Stages can be nested, they are reported by their path ("joint/joint_comparison") and
+    summed over repeated calls. Times and rows of a stage include its nested stages. The
+    peak memory is the maximum of the traced allocations (tracemalloc, includes numpy
+    arrays) above the allocations at the start of the stage.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.fk_latencies = []
+        self.fk_rows = 0
+        self.cache = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        path = f"{self._stack[-1]['name']}/{name}" if self._stack else name
+        record = self.stages.setdefault(
+            path,
+            {
+                "name": path,
+                "calls": 0,
+                "wall": 0.0,
+                "cpu": 0.0,
+                "peak_memory": 0,
+                "rows": 0,
+                "cache_hits": 0,
+                "cache_misses": 0,
+            },
+        )
+        record["calls"] += 1
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # Keep the peak of the enclosing stage before the peak is reset for this one
+            if self._stack:
+                self._stack[-1]["_peak"] = max(self._stack[-1].get("_peak", 0), peak)
+            tracemalloc.reset_peak()
+            record["_start_memory"] = current
+            record["_peak"] = current
+        self._stack.append(record)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall"] += time.perf_counter() - wall_start
+            record["cpu"] += time.process_time() - cpu_start
+            self._stack.pop()
+            if tracing:
+                peak = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1])
+                record["peak_memory"] = max(
+                    record["peak_memory"], peak - record.pop("_start_memory")
+                )
+                if self._stack:
+                    self._stack[-1]["_peak"] = max(self._stack[-1].get("_peak", 0), peak)
+
+    def add_rows(self, n_rows):
+        for record in self._stack:
+            record["rows"] += int(n_rows)
+
+    def record_fk_call(self, seconds, n_rows=1):
+        self.fk_latencies.append(seconds)
+        self.fk_rows += int(n_rows)
+
+    def record_cache(self, hits, misses, kind="stage"):
+        counts = self.cache.setdefault(kind, {"hits": 0, "misses": 0})
+        counts["hits"] += int(hits)
+        counts["misses"] += int(misses)
+        for record in self._stack:
+            record["cache_hits"] += int(hits)
+            record["cache_misses"] += int(misses)
+
+    def report(self):
+        latencies = np.asarray(self.fk_latencies)
+        counts, _ = np.histogram(latencies, FK_LATENCY_BINS)
+        fk = {
+            "calls": len(latencies),
+            "rows": self.fk_rows,
+            "total": float(latencies.sum()),
+            "histogram": {
+                "bin_edges": [float(edge) for edge in FK_LATENCY_BINS[1:-1]],
+                "counts": counts.tolist(),
+            },
+        }
+        if len(latencies):
+            fk.update(
+                {
+                    "mean": float(latencies.mean()),
+                    "p50": float(np.percentile(latencies, 50)),
+                    "p95": float(np.percentile(latencies, 95)),
+                    "max": float(latencies.max()),
+                }
+            )
+
+        cache = {}
+        for kind, counts in self.cache.items():
+            lookups = counts["hits"] + counts["misses"]
+            cache[kind] = dict(counts, hit_rate=counts["hits"] / lookups if lookups else 0.0)
+
+        return {
+            "stages": [
+                {key: value for key, value in record.items() if not key.startswith("_")}
+                for record in self.stages.values()
+            ],
+            "fk": fk,
+            "cache": cache,
+            "memory_traced": self.trace_memory,
+            # Peak resident set size of the process in kB (Linux)
+            "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+    def save(self, filepath):
+        with open(filepath, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Stage profile saved to: {filepath}")
+
+
+@contextmanager
+def profile(profiler, cprofile_path=None):
+    """
+    Activate the profiler for the block and run cProfile if a dump path is given.
+
+    Without profiler (None) and dump path the block runs uninstrumented.
+    """
+    global _profiler
+    previous = _profiler
+    _profiler = profiler
+    started_tracing = (
+        profiler is not None and profiler.trace_memory and not tracemalloc.is_tracing()
+    )
+    if started_tracing:
+        tracemalloc.start()
+    cprofiler = cProfile.Profile() if cprofile_path else None
+    if cprofiler is not None:
+        cprofiler.enable()
+    try:
+        yield profiler
+    finally:
+        if cprofiler is not None:
+            cprofiler.disable()
+            cprofiler.dump_stats(cprofile_path)
+            print(f"cProfile dump saved to: {cprofile_path}")
+        if started_tracing:
+            tracemalloc.stop()
+        _profiler = previous
+
+
+def stage(name):
+    return _profiler.stage(name) if _profiler is not None else nullcontext()
+
+
+def add_rows(n_rows):
+    if _profiler is not None:
+        _profiler.add_rows(n_rows)
+
+
+def record_fk_call(seconds, n_rows=1):
+    if _profiler is not None:
+        _profiler.record_fk_call(seconds, n_rows)
+
+
+def record_cache(hits, misses, kind="stage"):
+    if _profiler is not None:
+        _profiler.record_cache(hits, misses, kind)
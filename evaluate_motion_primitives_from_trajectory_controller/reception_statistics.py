@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from array import array
+
+import numpy as np
+
+# Entries of the report that indicate dropped or late messages
+DROP_KEYS = ("lost", "sequence_missing", "out_of_order", "stamp_missing", "late")
+
+
+class ReceptionStatistics:
+    """
+    Drop and timing statistics of a subscription.
+
+    Every received message is reported with its arrival time, its header stamp and, if the
+    RMW provides it, the publication sequence number of the (single) publisher, so only
+    messages of the recorded publisher are reported. Dropped messages are detected from
+    gaps in the sequence numbers, from gaps in the header stamps (more than `gap_factor`
+    nominal periods) and from message_lost events of the middleware. Messages arriving
+    more than `late_factor` nominal periods after the previous one are counted as late.
+    Arrival times and stamps are kept in compact arrays (16 bytes per message) and
+    evaluated only in report().
+    """
+
+    def __init__(self, gap_factor=1.5, late_factor=3.0):
+        self.gap_factor = gap_factor
+        self.late_factor = late_factor
+        self.reset()
+
+    def reset(self):
+        self.n_received = 0
+        self.sequence_gaps = 0
+        self.sequence_missing = 0
+        self.out_of_order = 0
+        self.n_lost = 0
+        self._last_sequence = None
+        self._arrivals = array("d")
+        self._stamps = array("d")
+
+    def update(self, arrival, stamp, sequence=None):
+        self.n_received += 1
+        self._arrivals.append(arrival)
+        self._stamps.append(stamp)
+        # Sequence number 0 means the RMW does not provide it
+        if not sequence:
+            return
+        if self._last_sequence is not None:
+            if sequence > self._last_sequence + 1:
+                self.sequence_gaps += 1
+                self.sequence_missing += sequence - self._last_sequence - 1
+            elif sequence <= self._last_sequence:
+                self.out_of_order += 1
+                return
+        self._last_sequence = sequence
+
+    def message_lost(self, event):
+        """Count the messages reported by the message_lost QoS event."""
+        self.n_lost += event.total_count_change
+
+    def report(self):
+        report = {
+            "received": self.n_received,
+            "sequence_gaps": self.sequence_gaps,
+            "sequence_missing": self.sequence_missing,
+            "out_of_order": self.out_of_order,
+            "lost": self.n_lost,
+        }
+        if self.n_received < 2:
+            return report
+
+        stamp_steps = np.diff(np.frombuffer(self._stamps))
+        inter_arrival = np.diff(np.frombuffer(self._arrivals))
+        # Nominal period of the publisher from the header stamps
+        period = float(np.median(stamp_steps))
+        if period > 0:
+            gaps = stamp_steps[stamp_steps > self.gap_factor * period]
+            report["stamp_gaps"] = len(gaps)
+            report["stamp_missing"] = int(np.sum(np.round(gaps / period) - 1))
+            report["late"] = int(np.count_nonzero(inter_arrival > self.late_factor * period))
+        report.update(
+            {
+                "period": period,
+                "inter_arrival_mean": float(inter_arrival.mean()),
+                "inter_arrival_p50": float(np.percentile(inter_arrival, 50)),
+                "inter_arrival_p99": float(np.percentile(inter_arrival, 99)),
+                "inter_arrival_max": float(inter_arrival.max()),
+            }
+        )
+        return report
+
+    def summary(self, report=None):
+        report = report or self.report()
+        text = (
+            f"{report['received']} messages received, {report['lost']} lost (QoS event), "
+            f"{report['sequence_missing']} missing in {report['sequence_gaps']} sequence gaps, "
+            f"{report['out_of_order']} out of order"
+        )
+        if "stamp_gaps" in report:
+            text += (
+                f", {report['stamp_missing']} missing in {report['stamp_gaps']} stamp gaps, "
+                f"{report['late']} late (period {report['period'] * 1e3:.2f} ms, "
+                f"inter-arrival p99 {report['inter_arrival_p99'] * 1e3:.2f} ms, "
+                f"max {report['inter_arrival_max'] * 1e3:.2f} ms)"
+            )
+        return text
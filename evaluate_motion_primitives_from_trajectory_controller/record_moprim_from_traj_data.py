@@ -17,11 +17,20 @@
 # Authors: Mathias Fuhrer
 
 import rclpy
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from rclpy.executors import MultiThreadedExecutor, SingleThreadedExecutor
 from rclpy.node import Node
+from rclpy.qos import HistoryPolicy, QoSProfile, ReliabilityPolicy
+from rclpy.subscription import Subscription
+try:
+    from rclpy.event_handler import SubscriptionEventCallbacks, UnsupportedEventTypeError
+except ImportError:  # Humble
+    from rclpy.qos_event import SubscriptionEventCallbacks, UnsupportedEventTypeError
 from trajectory_msgs.msg import JointTrajectory
 from geometry_msgs.msg import PoseArray
 from control_msgs.msg import MotionPrimitiveSequence
 from sensor_msgs.msg import JointState
+from rosidl_runtime_py.convert import message_to_ordereddict
 
 import csv
 from datetime import datetime
@@ -30,6 +39,30 @@ import os
 import sys
 import time
 
+import pandas as pd
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from joint_state_buffer import JointStateBuffer
+    from reception_statistics import DROP_KEYS, ReceptionStatistics
+    from run_catalog import RunCatalog
+    from run_format import RUN_EXTENSION
+    from streaming_writer import ExecutedJointStatesRunWriter, ExecutedJointStatesWriter
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.joint_state_buffer import (
+        JointStateBuffer,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.reception_statistics import (
+        DROP_KEYS,
+        ReceptionStatistics,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_catalog import RunCatalog
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import RUN_EXTENSION
+    from evaluate_motion_primitives_from_trajectory_controller.streaming_writer import (
+        ExecutedJointStatesRunWriter,
+        ExecutedJointStatesWriter,
+    )
+
 # Constants for motion primitive types --> defined in control_msg and moprim_controller
 # Would be better to import these from the actual message definition
 PRIMITIVE_TYPE_SEQUENCE_START = 100
@@ -39,6 +72,30 @@ PRIMITIVE_TYPE_LINEAR_CARTESIAN = 50
 
 data_dir = "src/evaluate_motion_primitives_from_trajectory_controller/data"
 
+POSE_NAMES = ["pose_x", "pose_y", "pose_z", "pose_qx", "pose_qy", "pose_qz", "pose_qw"]
+
+# Write one run file (trajectory_<timestamp>.npz) per recording instead of the CSV files:
+# planned trajectory and poses, motion primitives (table and all message fields), executed
+# joint states in compressed chunks and recorder metadata, moved into place atomically
+RECORD_RUN_FILE = False
+# Run catalog that gets an entry for every recording (set to None to disable)
+CATALOG_PATH = f"{data_dir}/catalog.sqlite"
+
+# Joint state buffer: initial capacity in samples (60 s at 1 kHz) and what to do when it is full:
+# "grow" doubles the buffer, "overwrite_oldest" / "drop_newest" keep a fixed-size buffer
+JOINT_STATES_CAPACITY = 60_000
+JOINT_STATES_OVERFLOW = "grow"
+# Interval in seconds in which recorded joint states are flushed to disk
+JOINT_STATES_FLUSH_INTERVAL = 0.5
+# High-rate mode: /joint_states is handled in its own callback group of a multi-threaded
+# executor, so the other subscriptions and timers cannot delay it
+HIGH_RATE_MODE = False
+EXECUTOR_THREADS = 4
+# QoS of the /joint_states subscription: queue depth and reliability ("reliable" or
+# "best_effort"); a deep queue absorbs bursts at high controller rates
+JOINT_STATES_QOS_DEPTH = 1000 if HIGH_RATE_MODE else 10
+JOINT_STATES_RELIABILITY = "reliable"
+
 
 class MotionPrimitiveCollector(Node):
     def __init__(self):
@@ -47,8 +104,12 @@ class MotionPrimitiveCollector(Node):
         self.trajectory_msg = None
         self.poses_msg = None
         self.motion_primitives_msg = None
-        self.executed_joint_states = []
+        self.executed_joint_states = JointStateBuffer(
+            JOINT_STATES_CAPACITY, JOINT_STATES_OVERFLOW
+        )
         self.recording_joint_states = False
+        self.executed_writer = None
+        self.run_contents_added = False
 
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
@@ -70,16 +131,61 @@ class MotionPrimitiveCollector(Node):
             self.motion_primitive_callback,
             1,
         )
-        self.joint_state_sub = self.create_subscription(
-            JointState, "/joint_states", self.joint_states_callback, 10
-        )
+        self.joint_states_statistics = ReceptionStatistics()
+        self.joint_state_sub = self.create_joint_state_subscription()
 
         self.get_logger().info("Waiting for trajectory, poses, and motion primitives...")
 
+    def create_joint_state_subscription(self):
+        qos = QoSProfile(
+            history=HistoryPolicy.KEEP_LAST,
+            depth=JOINT_STATES_QOS_DEPTH,
+            reliability=(
+                ReliabilityPolicy.BEST_EFFORT
+                if JOINT_STATES_RELIABILITY == "best_effort"
+                else ReliabilityPolicy.RELIABLE
+            ),
+        )
+        # Newer rclpy versions pass the message info (with the publication sequence number)
+        # to callbacks with two arguments
+        if hasattr(Subscription, "CallbackType"):
+            callback = self.joint_states_info_callback
+        else:
+            callback = self.joint_states_callback
+        callback_group = MutuallyExclusiveCallbackGroup() if HIGH_RATE_MODE else None
+        try:
+            return self.create_subscription(
+                JointState,
+                "/joint_states",
+                callback,
+                qos,
+                callback_group=callback_group,
+                event_callbacks=SubscriptionEventCallbacks(
+                    message_lost=self.joint_states_statistics.message_lost
+                ),
+            )
+        except UnsupportedEventTypeError:
+            self.get_logger().warn("RMW does not report lost messages, using gaps only.")
+            return self.create_subscription(
+                JointState, "/joint_states", callback, qos, callback_group=callback_group
+            )
+
     def trajectory_callback(self, msg):
         if self.trajectory_msg is None:
             self.trajectory_msg = msg
             self.get_logger().info("Received planned_trajectory.")
+            if RECORD_RUN_FILE:
+                self.executed_writer = ExecutedJointStatesRunWriter(
+                    self.executed_joint_states,
+                    f"{data_dir}/trajectory_{self.timestamp}{RUN_EXTENSION}",
+                    JOINT_STATES_FLUSH_INTERVAL,
+                ).start()
+            else:
+                self.executed_writer = ExecutedJointStatesWriter(
+                    self.executed_joint_states,
+                    f"{data_dir}/trajectory_{self.timestamp}_executed.csv",
+                    JOINT_STATES_FLUSH_INTERVAL,
+                ).start()
             self.recording_joint_states = True
             self.get_logger().info("Recording of /joint_states started. Press ENTER to stop.")
             threading.Thread(target=self._wait_for_enter_and_stop_recording, daemon=True).start()
@@ -108,10 +214,24 @@ class MotionPrimitiveCollector(Node):
             self.get_logger().info("Received motion primitives.")
             self.check_and_export_motion_primitives()
 
-    def joint_states_callback(self, msg):
+    def joint_states_callback(self, msg, sequence=None):
         if self.recording_joint_states:
-            t = self.get_clock().now().seconds_nanoseconds()
-            self.executed_joint_states.append((t, msg))
+            t = self.get_clock().now().nanoseconds * 1e-9
+            n_mismatched = self.executed_joint_states.n_mismatched
+            self.executed_joint_states.append(t, msg.name, msg.position, msg.velocity)
+            if self.executed_joint_states.n_mismatched > n_mismatched:
+                self.get_logger().warn(
+                    f"Skipping joint_states with joints {list(msg.name)}, recording "
+                    f"{self.executed_joint_states.joint_names}.",
+                    throttle_duration_sec=5.0,
+                )
+                # Other publishers (e.g. a gripper) would show up as gaps in the statistics
+                return
+            stamp = msg.header.stamp.sec + msg.header.stamp.nanosec * 1e-9
+            self.joint_states_statistics.update(t, stamp, sequence)
+
+    def joint_states_info_callback(self, msg, msg_info):
+        self.joint_states_callback(msg, msg_info.get("publication_sequence_number"))
 
     def check_and_export_motion_primitives(self):
         sequence = self.motion_primitives_msg.motions
@@ -128,6 +248,12 @@ class MotionPrimitiveCollector(Node):
             return
 
         primitive_type = sequence[0].type
+        if RECORD_RUN_FILE and primitive_type in (
+            PRIMITIVE_TYPE_LINEAR_JOINT,
+            PRIMITIVE_TYPE_LINEAR_CARTESIAN,
+        ):
+            # Written to the run file when the recording stops
+            return
         if primitive_type == PRIMITIVE_TYPE_LINEAR_JOINT:
             filename = f"{data_dir}/trajectory_{self.timestamp}_reduced_PTP.csv"
             self.save_joint_primitives(sequence, filename)
@@ -147,8 +273,14 @@ class MotionPrimitiveCollector(Node):
                     "Waiting for joint_states recording to finish before exporting."
                 )
                 return
-            self.save_trajectory_and_poses()
+            if not RECORD_RUN_FILE:
+                self.save_trajectory_and_poses()
             self.save_executed_joint_states()
+            if CATALOG_PATH:
+                catalog = RunCatalog(CATALOG_PATH)
+                catalog.scan(data_dir)
+                catalog.close()
+                self.get_logger().info(f"Run added to the catalog {CATALOG_PATH}")
             self.get_logger().info("All data saved. Exiting.")
             self.destroy_node()
             rclpy.shutdown()
@@ -233,37 +365,137 @@ class MotionPrimitiveCollector(Node):
                 writer.writerow(row)
         self.get_logger().info(f"Saved planned trajectory and poses to {filename}")
 
-    def save_executed_joint_states(self):
-        filename = f"{data_dir}/trajectory_{self.timestamp}_executed.csv"
-        with open(filename, mode="w", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            if not self.executed_joint_states:
-                self.get_logger().warn("No joint_states recorded.")
-                return
-            first_msg = self.executed_joint_states[0][1]
-            joint_names = list(first_msg.name)
-            header = (
-                ["timestamp"]
-                + [f"{name}_pos" for name in joint_names]
-                + [f"{name}_vel" for name in joint_names]
+    def planned_table(self):
+        traj_points = self.trajectory_msg.points
+        poses = self.poses_msg.poses
+        if len(traj_points) != len(poses):
+            self.get_logger().error(
+                f"Mismatch: {len(traj_points)} trajectory points vs {len(poses)} poses"
             )
-            writer.writerow(header)
+            return None
+        rows = [
+            [point.time_from_start.sec + point.time_from_start.nanosec * 1e-9]
+            + list(point.positions)
+            + [
+                pose.position.x,
+                pose.position.y,
+                pose.position.z,
+                pose.orientation.x,
+                pose.orientation.y,
+                pose.orientation.z,
+                pose.orientation.w,
+            ]
+            for point, pose in zip(traj_points, poses)
+        ]
+        columns = (
+            ["time_from_start"]
+            + [f"{name}_pos" for name in self.trajectory_msg.joint_names]
+            + POSE_NAMES
+        )
+        return pd.DataFrame(rows, columns=columns)
 
-            for (sec, nsec), msg in self.executed_joint_states:
-                t = sec + nsec * 1e-9
-                row = [t] + list(msg.position) + list(msg.velocity)
-                writer.writerow(row)
-        self.get_logger().info(f"Saved executed joint_states to {filename}")
+    def reduced_table(self):
+        """Return (mode, table) of the motion primitives as in the reduced CSV files."""
+        sequence = self.motion_primitives_msg.motions
+        if sequence[0].type == PRIMITIVE_TYPE_LINEAR_JOINT:
+            joint_names = (
+                self.trajectory_msg.joint_names
+                if self.trajectory_msg
+                else [f"joint_{i}" for i in range(len(sequence[0].joint_positions))]
+            )
+            rows = [list(p.joint_positions) for p in sequence]
+            return "PTP", pd.DataFrame(rows, columns=[f"{name}_pos" for name in joint_names])
+        rows = []
+        for p in sequence:
+            if p.poses:
+                pose = p.poses[0].pose
+                rows.append(
+                    [
+                        pose.position.x,
+                        pose.position.y,
+                        pose.position.z,
+                        pose.orientation.x,
+                        pose.orientation.y,
+                        pose.orientation.z,
+                        pose.orientation.w,
+                    ]
+                )
+        return "LIN", pd.DataFrame(rows, columns=POSE_NAMES)
+
+    def add_run_contents(self, report):
+        """Add the planned and reduced tables and the metadata to the run file."""
+        self.run_contents_added = True
+        metadata = {
+            "timestamp": self.timestamp,
+            "recorder": {
+                "node": self.get_name(),
+                "high_rate_mode": HIGH_RATE_MODE,
+                "qos_depth": JOINT_STATES_QOS_DEPTH,
+                "reliability": JOINT_STATES_RELIABILITY,
+                "flush_interval": JOINT_STATES_FLUSH_INTERVAL,
+                "buffer_overflow": JOINT_STATES_OVERFLOW,
+                "buffer_dropped": self.executed_joint_states.n_dropped,
+                "joint_mismatched": self.executed_joint_states.n_mismatched,
+                "joint_states": report,
+            },
+        }
+        if self.trajectory_msg is not None:
+            metadata["joint_names"] = list(self.trajectory_msg.joint_names)
+        if self.trajectory_msg is not None and self.poses_msg is not None:
+            df_planned = self.planned_table()
+            if df_planned is not None:
+                self.executed_writer.add_table("planned", df_planned)
+        if self.motion_primitives_msg is not None and self.motion_primitives_msg.motions:
+            metadata["mode"], df_reduced = self.reduced_table()
+            self.executed_writer.add_table("reduced", df_reduced)
+            # All fields of every primitive, not only the ones in the reduced table
+            metadata["motion_primitives"] = [
+                message_to_ordereddict(p) for p in self.motion_primitives_msg.motions
+            ]
+        self.executed_writer.metadata.update(metadata)
+
+    def save_executed_joint_states(self):
+        if self.executed_writer is None:
+            self.get_logger().warn("No joint_states recorded.")
+            return
+        report = self.joint_states_statistics.report()
+        if RECORD_RUN_FILE and not self.run_contents_added:
+            self.add_run_contents(report)
+        # Flushes the remaining samples and moves the streamed file into place
+        n_written = self.executed_writer.close()
+        if n_written == 0:
+            self.get_logger().warn("No joint_states recorded.")
+        n_dropped = self.executed_joint_states.n_dropped
+        if n_dropped:
+            self.get_logger().warn(f"Joint state buffer overflow: {n_dropped} samples dropped")
+        n_mismatched = self.executed_joint_states.n_mismatched
+        if n_mismatched:
+            self.get_logger().warn(
+                f"{n_mismatched} joint_states skipped, they did not contain all recorded joints"
+            )
+        if any(report.get(key, 0) for key in DROP_KEYS):
+            self.get_logger().warn(f"joint_states: {self.joint_states_statistics.summary(report)}")
+        else:
+            self.get_logger().info(f"joint_states: {self.joint_states_statistics.summary(report)}")
+        self.get_logger().info(f"Saved executed joint_states to {self.executed_writer.filename}")
 
 
 def main(args=None):
     rclpy.init(args=args)
     node = MotionPrimitiveCollector()
+    if HIGH_RATE_MODE:
+        executor = MultiThreadedExecutor(num_threads=EXECUTOR_THREADS)
+    else:
+        executor = SingleThreadedExecutor()
+    executor.add_node(node)
     try:
-        rclpy.spin(node)
+        executor.spin()
     except KeyboardInterrupt:
         node.get_logger().info("Node interrupted by user.")
+        # Keep the joint states streamed so far
+        node.save_executed_joint_states()
     finally:
+        executor.shutdown()
         if rclpy.ok():
             node.destroy_node()
             rclpy.shutdown()
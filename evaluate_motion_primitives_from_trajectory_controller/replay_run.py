@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import rclpy
+from rclpy.node import Node
+from builtin_interfaces.msg import Duration
+from trajectory_msgs.msg import JointTrajectory, JointTrajectoryPoint
+from geometry_msgs.msg import Pose, PoseArray, PoseStamped
+from control_msgs.msg import MotionPrimitive, MotionPrimitiveSequence
+from sensor_msgs.msg import JointState
+
+import os
+import threading
+import time
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from record_moprim_from_traj_data import (
+        PRIMITIVE_TYPE_LINEAR_CARTESIAN,
+        PRIMITIVE_TYPE_LINEAR_JOINT,
+    )
+    from run_format import RUN_EXTENSION, find_runs, load_run_metadata, read_table
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.record_moprim_from_traj_data import (  # noqa: E501
+        PRIMITIVE_TYPE_LINEAR_CARTESIAN,
+        PRIMITIVE_TYPE_LINEAR_JOINT,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+        RUN_EXTENSION,
+        find_runs,
+        load_run_metadata,
+        read_table,
+    )
+
+data_dir = "src/evaluate_motion_primitives_from_trajectory_controller/data"
+
+POSE_NAMES = ["pose_x", "pose_y", "pose_z", "pose_qx", "pose_qy", "pose_qz", "pose_qw"]
+
+# Replay speed relative to the recording (10.0 = 10x faster), 0.0 publishes as fast as possible
+SPEED = 1.0
+# Seconds to wait for the recorder to subscribe before the planned messages are published
+SUBSCRIBER_TIMEOUT = 10.0
+# Pause between the planned messages and the first joint state, so the recorder has started
+START_DELAY = 0.5
+
+
+def to_pose(values):
+    pose = Pose()
+    pose.position.x, pose.position.y, pose.position.z = (float(v) for v in values[:3])
+    (
+        pose.orientation.x,
+        pose.orientation.y,
+        pose.orientation.z,
+        pose.orientation.w,
+    ) = (float(v) for v in values[3:7])
+    return pose
+
+
+def load_run(directory, timestamp=""):
+    """
+    Load the tables of a recorded run (CSV files or run file) of a data directory.
+
+    The newest run is loaded if no timestamp is given. Returns (timestamp, planned,
+    executed, reduced, primitive) with primitive "PTP" or "LIN".
+    """
+    runs = {
+        ts: files
+        for ts, files in find_runs(directory).items()
+        if "planned" in files and "executed" in files
+        and any(kind.startswith("reduced_") for kind in files)
+    }
+    # Converted runs (convert_runs) are used instead of the CSV files
+    for name in os.listdir(directory):
+        if name.startswith("trajectory_") and name.endswith(RUN_EXTENSION):
+            runs[name[len("trajectory_"):-len(RUN_EXTENSION)]] = {
+                "run": os.path.join(directory, name)
+            }
+    if not runs:
+        raise FileNotFoundError(f"No complete run found in {directory}")
+    timestamp = timestamp or max(runs)
+    if timestamp not in runs:
+        raise FileNotFoundError(f"Run {timestamp} not found in {directory}")
+
+    files = runs[timestamp]
+    if "run" in files:
+        filepath_run = files["run"]
+        return (
+            timestamp,
+            read_table(filepath_run, "planned"),
+            read_table(filepath_run, "executed"),
+            read_table(filepath_run, "reduced"),
+            load_run_metadata(filepath_run)["mode"],
+        )
+    reduced_kind = next(kind for kind in files if kind.startswith("reduced_"))
+    return (
+        timestamp,
+        read_table(files["planned"], "planned"),
+        read_table(files["executed"], "executed"),
+        read_table(files[reduced_kind], "reduced"),
+        reduced_kind.split("_")[1],
+    )
+
+
+class RunReplayer(Node):
+    """Publish a recorded run on the topics of the controller, as a stand-in for the robot."""
+
+    def __init__(self):
+        super().__init__("run_replayer")
+        self.declare_parameter("data_dir", data_dir)
+        self.declare_parameter("timestamp", "")
+        self.declare_parameter("speed", SPEED)
+        self.speed = self.get_parameter("speed").value
+
+        (
+            self.timestamp,
+            df_planned,
+            df_executed,
+            df_reduced,
+            self.primitive,
+        ) = load_run(
+            self.get_parameter("data_dir").value, self.get_parameter("timestamp").value
+        )
+
+        self.trajectory_msg, self.poses_msg = self.planned_messages(df_planned)
+        self.motion_primitives_msg = self.motion_primitive_message(df_reduced)
+
+        # Joint states in the recorded order, converted once instead of per message
+        pos_names = [c for c in df_executed.columns if c.endswith("_pos")]
+        self.joint_names = [c[: -len("_pos")] for c in pos_names]
+        vel_names = [f"{name}_vel" for name in self.joint_names]
+        self.timestamps = df_executed["timestamp"].to_numpy()
+        self.positions = df_executed[pos_names].to_numpy().tolist()
+        if all(c in df_executed.columns for c in vel_names):
+            self.velocities = df_executed[vel_names].to_numpy().tolist()
+        else:
+            self.velocities = [[] for _ in self.positions]
+
+        self.trajectory_pub = self.create_publisher(
+            JointTrajectory, "/motion_primitive_from_trajectory_controller/planned_trajectory", 1
+        )
+        self.poses_pub = self.create_publisher(
+            PoseArray, "/motion_primitive_from_trajectory_controller/planned_poses", 1
+        )
+        self.motion_primitive_pub = self.create_publisher(
+            MotionPrimitiveSequence,
+            "/motion_primitive_from_trajectory_controller/approximated_motion_primitives",
+            1,
+        )
+        self.joint_state_pub = self.create_publisher(JointState, "/joint_states", 10)
+
+        self.done = threading.Event()
+        self.get_logger().info(
+            f"Replaying run {self.timestamp} ({self.primitive}, {len(self.positions)} joint "
+            f"states) at {'maximum' if self.speed <= 0 else f'{self.speed:g}x'} speed."
+        )
+
+    def planned_messages(self, df_planned):
+        trajectory_msg = JointTrajectory()
+        pos_names = [c for c in df_planned.columns if c.endswith("_pos")]
+        trajectory_msg.joint_names = [c[: -len("_pos")] for c in pos_names]
+        poses_msg = PoseArray()
+        poses_msg.header.frame_id = "base"
+        for t, positions, pose in zip(
+            df_planned["time_from_start"].to_numpy(),
+            df_planned[pos_names].to_numpy(),
+            df_planned[POSE_NAMES].to_numpy(),
+        ):
+            point = JointTrajectoryPoint()
+            point.positions = positions.tolist()
+            sec, nanosec = divmod(int(round(t * 1e9)), 10**9)
+            point.time_from_start = Duration(sec=sec, nanosec=nanosec)
+            trajectory_msg.points.append(point)
+            poses_msg.poses.append(to_pose(pose))
+        return trajectory_msg, poses_msg
+
+    def motion_primitive_message(self, df_reduced):
+        msg = MotionPrimitiveSequence()
+        for values in df_reduced.to_numpy():
+            primitive = MotionPrimitive()
+            if self.primitive == "PTP":
+                primitive.type = PRIMITIVE_TYPE_LINEAR_JOINT
+                primitive.joint_positions = values.tolist()
+            else:
+                primitive.type = PRIMITIVE_TYPE_LINEAR_CARTESIAN
+                pose = PoseStamped()
+                pose.header.frame_id = "base"
+                pose.pose = to_pose(values)
+                primitive.poses = [pose]
+            msg.motions.append(primitive)
+        return msg
+
+    def wait_for_subscribers(self, timeout=SUBSCRIBER_TIMEOUT):
+        publishers = [
+            self.trajectory_pub,
+            self.poses_pub,
+            self.motion_primitive_pub,
+            self.joint_state_pub,
+        ]
+        deadline = time.monotonic() + timeout
+        while any(pub.get_subscription_count() == 0 for pub in publishers):
+            if time.monotonic() > deadline:
+                self.get_logger().warn("Not all topics have subscribers, publishing anyway.")
+                return
+            time.sleep(0.1)
+
+    def replay(self):
+        """Publish the planned messages and then the joint states with the recorded timing."""
+        self.wait_for_subscribers()
+        self.trajectory_pub.publish(self.trajectory_msg)
+        self.poses_pub.publish(self.poses_msg)
+        self.motion_primitive_pub.publish(self.motion_primitives_msg)
+        time.sleep(START_DELAY)
+
+        msg = JointState()
+        msg.name = self.joint_names
+        offsets = self.timestamps - self.timestamps[0]
+        if self.speed > 0:
+            offsets = offsets / self.speed
+        max_lateness = 0.0
+        t_start = time.perf_counter()
+        for offset, positions, velocities in zip(offsets, self.positions, self.velocities):
+            if not rclpy.ok():
+                break
+            if self.speed > 0:
+                delay = t_start + offset - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lateness = max(max_lateness, -delay)
+            msg.header.stamp = self.get_clock().now().to_msg()
+            msg.position = positions
+            msg.velocity = velocities
+            self.joint_state_pub.publish(msg)
+        duration = time.perf_counter() - t_start
+
+        n_messages = len(self.positions)
+        recorded_duration = self.timestamps[-1] - self.timestamps[0]
+        self.get_logger().info(
+            f"Published {n_messages} joint states in {duration:.2f} s "
+            f"({n_messages / max(duration, 1e-9):.0f} msg/s, recorded with "
+            f"{n_messages / max(recorded_duration, 1e-9):.0f} msg/s), "
+            f"max lateness {max_lateness * 1e3:.1f} ms."
+        )
+        self.done.set()
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = RunReplayer()
+    # Publishing runs in its own thread so sleeping does not block the executor
+    threading.Thread(target=node.replay, daemon=True).start()
+    try:
+        while rclpy.ok() and not node.done.is_set():
+            rclpy.spin_once(node, timeout_sec=0.1)
+    except KeyboardInterrupt:
+        node.get_logger().info("Node interrupted by user.")
+    finally:
+        if rclpy.ok():
+            node.destroy_node()
+            rclpy.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+r"""
+Catalog of the recorded runs in an SQLite file.
+
+Every run has one entry with robot, joint names, primitive mode, number of planned,
+reduced and executed points, duration and the paths of its files, plus the metrics
+computed by batch_evaluate. A scan only reads runs that are new or whose files changed
+(size or modification time), so keeping the catalog up to date is cheap.
+
+Example, all KUKA LIN runs from July with a Cartesian RMSE above 5 mm:
+    run_catalog query --robot kuka --mode LIN --since 2025-07-01 --until 2025-08-01 \
+        --where "cartesian_rmse>0.005"
+"""
+
+import argparse
+from datetime import datetime
+import json
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+# Used by the scripts (python3) and by the recorder node (ros2 run), so both imports are tried
+try:
+    from local_fk import detect_robot
+    from run_format import find_runs, read_table
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.local_fk import detect_robot
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+        find_runs,
+        read_table,
+    )
+
+data_dir = "src/evaluate_motion_primitives_from_trajectory_controller/data"
+
+CATALOG_NAME = "catalog.sqlite"
+
+# Columns of the runs table that can be filtered like metrics
+RUN_COLUMNS = [
+    "timestamp",
+    "recorded",
+    "directory",
+    "robot",
+    "joint_names",
+    "mode",
+    "n_planned",
+    "n_reduced",
+    "n_executed",
+    "duration",
+    "files",
+]
+
+# Run columns compared as numbers in conditions, the others as text
+NUMERIC_RUN_COLUMNS = {"n_planned", "n_reduced", "n_executed", "duration"}
+
+# Bumped when the tables change, catalogs of an older schema are rebuilt on open
+SCHEMA_VERSION = 2
+
+CONDITION_PATTERN = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(\S+)\s*$")
+
+
+def _signature(files):
+    """Size and modification time of the run files, changes trigger a re-read."""
+    return json.dumps(
+        sorted(
+            (path, os.stat(path).st_size, os.stat(path).st_mtime_ns)
+            for path in set(files.values())
+        )
+    )
+
+
+def describe_run(timestamp, files):
+    """Read the properties of one run (only the timestamp column of the executed table)."""
+    reduced_kind = next((kind for kind in files if kind.startswith("reduced_")), None)
+    info = {
+        "timestamp": timestamp,
+        "recorded": datetime.strptime(timestamp, "%Y%m%d_%H%M%S").isoformat(),
+        "mode": reduced_kind.split("_")[1] if reduced_kind else None,
+        "files": json.dumps(files),
+    }
+    if "planned" in files:
+        df_planned = read_table(files["planned"], "planned")
+        joint_names = [c[: -len("_pos")] for c in df_planned.columns if c.endswith("_pos")]
+        info["joint_names"] = json.dumps(joint_names)
+        info["n_planned"] = len(df_planned)
+        try:
+            info["robot"] = detect_robot(joint_names)
+        except ValueError:
+            info["robot"] = None
+    if reduced_kind:
+        info["n_reduced"] = len(read_table(files[reduced_kind], "reduced"))
+    if "executed" in files:
+        if files["executed"].endswith(".csv"):
+            timestamps = pd.read_csv(files["executed"], usecols=["timestamp"])["timestamp"]
+        else:
+            timestamps = read_table(files["executed"], "executed")["timestamp"]
+        info["n_executed"] = len(timestamps)
+        if len(timestamps):
+            info["duration"] = float(timestamps.iloc[-1] - timestamps.iloc[0])
+    return info
+
+
+class RunCatalog:
+    """
+    SQLite catalog of recorded runs and their metrics.
+
+    Runs are keyed by (directory, timestamp), so runs with the same timestamp in different
+    data directories are kept apart.
+    """
+
+    def __init__(self, catalog_path):
+        folder = os.path.dirname(catalog_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.db = sqlite3.connect(catalog_path)
+        # The catalog is an index of the files, an outdated one is dropped and filled again
+        # by the next scan (the metrics by the next batch_evaluate)
+        (version,) = self.db.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS runs")
+            self.db.execute("DROP TABLE IF EXISTS metrics")
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "timestamp TEXT, recorded TEXT, directory TEXT, robot TEXT, "
+            "joint_names TEXT, mode TEXT, n_planned INTEGER, n_reduced INTEGER, "
+            "n_executed INTEGER, duration REAL, files TEXT, signature TEXT, "
+            "PRIMARY KEY (directory, timestamp))"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS metrics (directory TEXT, timestamp TEXT, name TEXT, "
+            "value REAL, PRIMARY KEY (directory, timestamp, name))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name, value)")
+        self.db.commit()
+
+    def scan(self, directory):
+        """Add new and changed runs of a directory, remove runs whose files are gone."""
+        directory = os.path.abspath(directory)
+        known = dict(
+            self.db.execute(
+                "SELECT timestamp, signature FROM runs WHERE directory = ?", (directory,)
+            ).fetchall()
+        )
+        runs = find_runs(directory)
+        n_added = 0
+        for timestamp, files in runs.items():
+            signature = _signature(files)
+            if known.get(timestamp) == signature:
+                continue
+            info = describe_run(timestamp, files)
+            info.update({"directory": directory, "signature": signature})
+            columns = list(info)
+            self.db.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                [info[c] for c in columns],
+            )
+            n_added += 1
+
+        removed = [(directory, timestamp) for timestamp in known if timestamp not in runs]
+        self.db.executemany("DELETE FROM runs WHERE directory = ? AND timestamp = ?", removed)
+        self.db.executemany(
+            "DELETE FROM metrics WHERE directory = ? AND timestamp = ?", removed
+        )
+        self.db.commit()
+        return n_added, len(removed)
+
+    def set_metrics(self, directory, timestamp, metrics):
+        """Store numeric metrics of a run (dict name -> value), non-numeric values are ignored."""
+        directory = os.path.abspath(directory)
+        rows = [
+            (directory, timestamp, name, float(value))
+            for name, value in metrics.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+            and value == value
+        ]
+        self.db.executemany(
+            "INSERT OR REPLACE INTO metrics (directory, timestamp, name, value) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self.db.commit()
+
+    def query(self, robot=None, mode=None, since=None, until=None, where=()):
+        """
+        Return the matching runs with their metrics as DataFrame.
+
+        `since`/`until` are ISO dates or datetimes (until is exclusive), `where` is a list
+        of conditions like "cartesian_rmse>0.005" or "robot=ur" on metrics or run columns.
+        """
+        clauses, params = [], []
+        if robot:
+            clauses.append("robot = ?")
+            params.append(robot)
+        if mode:
+            clauses.append("mode = ?")
+            params.append(mode)
+        if since:
+            clauses.append("recorded >= ?")
+            params.append(since)
+        if until:
+            clauses.append("recorded < ?")
+            params.append(until)
+        for condition in where:
+            match = CONDITION_PATTERN.match(condition)
+            if match is None:
+                raise ValueError(f"Invalid condition '{condition}', use e.g. 'joint_rmse>0.01'")
+            name, operator, value = match.groups()
+            if name in RUN_COLUMNS:
+                clauses.append(f"{name} {operator} ?")
+                params.append(float(value) if name in NUMERIC_RUN_COLUMNS else value)
+            else:
+                clauses.append(
+                    "(directory, timestamp) IN (SELECT directory, timestamp FROM metrics "
+                    f"WHERE name = ? AND value {operator} ?)"
+                )
+                params.extend([name, float(value)])
+
+        where_sql = " WHERE " + " AND ".join(clauses) if clauses else ""
+        runs = pd.read_sql_query(
+            f"SELECT {', '.join(RUN_COLUMNS)} FROM runs{where_sql} "
+            "ORDER BY timestamp, directory",
+            self.db,
+            params=params,
+        )
+        metrics = pd.read_sql_query(
+            "SELECT directory, timestamp, name, value FROM metrics "
+            f"WHERE (directory, timestamp) IN (SELECT directory, timestamp FROM runs{where_sql})",
+            self.db,
+            params=params,
+        )
+        if len(metrics):
+            runs = runs.merge(
+                metrics.pivot(
+                    index=["directory", "timestamp"], columns="name", values="value"
+                ),
+                left_on=["directory", "timestamp"], right_index=True, how="left",
+            )
+        return runs
+
+    def close(self):
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog of the recorded runs.")
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--catalog", default=None, help=f"SQLite file (<data-dir>/{CATALOG_NAME})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("scan", help="add new and changed runs of the data directory")
+    query = commands.add_parser("query", help="list runs matching all given filters")
+    query.add_argument("--robot", choices=["ur", "kuka"])
+    query.add_argument("--mode", choices=["PTP", "LIN"])
+    query.add_argument("--since", help="recorded at or after, e.g. 2025-07-01")
+    query.add_argument("--until", help="recorded before, e.g. 2025-08-01")
+    query.add_argument(
+        "--where", action="append", default=[],
+        help="condition on a metric or run column, e.g. 'cartesian_rmse>0.005' (repeatable)",
+    )
+    query.add_argument("--columns", nargs="+", default=None, help="columns to print")
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.catalog or os.path.join(args.data_dir, CATALOG_NAME))
+    if args.command == "scan":
+        n_added, n_removed = catalog.scan(args.data_dir)
+        print(f"Catalog updated: {n_added} runs added or changed, {n_removed} removed")
+    else:
+        runs = catalog.query(args.robot, args.mode, args.since, args.until, args.where)
+        columns = args.columns or [
+            c for c in runs.columns if c not in ("directory", "joint_names", "files")
+            and not c.startswith(("rmse_", "time_", "cache_"))
+        ]
+        if len(runs):
+            with pd.option_context("display.max_columns", None, "display.width", 200):
+                print(runs.reindex(columns=columns).to_string(index=False))
+        print(f"{len(runs)} runs")
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
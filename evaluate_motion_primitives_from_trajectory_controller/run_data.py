@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import os
+import weakref
+
+import numpy as np
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from metrics import cumulative_arc_length, moving_range
+    from run_format import iter_table_chunks, read_table
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.metrics import (
+        cumulative_arc_length,
+        moving_range,
+    )
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+        iter_table_chunks,
+        read_table,
+    )
+
+TABLES = ("planned", "executed", "reduced")
+
+# Time columns stay float64 in float32 mode (float32 would round timestamps to minutes)
+TIME_COLUMNS = ("timestamp", "time_from_start")
+
+
+class Run:
+    """
+    Planned, executed and reduced data of one recorded run, every table loaded at most once.
+
+    Tables are read on first access (CSV files or run file) and kept as one compact float
+    array per column, only the given `columns` if set. With dtype=np.float32 the memory is
+    halved (time columns stay float64). Derived products, the trimmed window of the
+    executed rows and the arc lengths, are computed once per parameter set. The file paths
+    are kept for the artifact cache keys and the figure paths, cache_params() adds what
+    the files do not cover (dtype, columns computed in memory).
+    """
+
+    def __init__(
+        self, filepath_planned, filepath_executed=None, filepath_reduced=None, columns=None,
+        dtype=np.float64,
+    ):
+        self.filepath_planned = filepath_planned
+        self.filepath_executed = filepath_executed
+        self.filepath_reduced = filepath_reduced
+        self.keep_columns = None if columns is None else set(columns)
+        self.dtype = np.dtype(dtype)
+        self._tables = {}
+        self._derived = {}
+        self._sources = {}
+        self._column_files = {}
+
+    def filepath(self, table):
+        return {
+            "planned": self.filepath_planned,
+            "executed": self.filepath_executed,
+            "reduced": self.filepath_reduced,
+        }[table]
+
+    def _table(self, table):
+        if table not in self._tables:
+            filepath = self.filepath(table)
+            if filepath is None:
+                raise ValueError(f"The run has no {table} file.")
+            # Only the needed columns are parsed; the reduced points are always kept whole,
+            # their columns depend on the mode
+            df = read_table(
+                filepath, table, None if table == "reduced" else self.keep_columns
+            )
+            self._tables[table] = {
+                column: np.ascontiguousarray(
+                    df[column].to_numpy(),
+                    dtype=np.float64 if column in TIME_COLUMNS else self.dtype,
+                )
+                for column in df.columns
+            }
+        return self._tables[table]
+
+    def columns(self, table):
+        return list(self._table(table))
+
+    def get(self, table, names=None, vel_threshold=None):
+        """
+        Return columns of a table as (n_rows, n_columns) array, all if names is None.
+
+        With vel_threshold, only the trimmed window of the executed rows (see moving_range).
+        """
+        data = self._table(table)
+        names = list(data) if names is None else names
+        values = np.column_stack([data[name] for name in names])
+        if vel_threshold is None:
+            return values
+        start, end = self.moving_range(vel_threshold)
+        return values[start:end + 1]
+
+    def planned(self, names=None):
+        return self.get("planned", names)
+
+    def executed(self, names=None, vel_threshold=None):
+        return self.get("executed", names, vel_threshold)
+
+    def reduced(self, names=None):
+        return self.get("reduced", names)
+
+    def n_rows(self, table):
+        return len(next(iter(self._table(table).values())))
+
+    def add_columns(self, table, names, values, source=None):
+        """
+        Add computed columns to a loaded table, e.g. the FK poses of the executed rows.
+
+        `source` describes how they were computed (e.g. the FK backend) for the cache keys.
+        """
+        data = self._table(table)
+        values = np.asarray(values)
+        for i, name in enumerate(names):
+            data[name] = np.ascontiguousarray(values[:, i], dtype=self.dtype)
+            self._sources[f"{table}.{name}"] = source
+        # Products derived from the replaced columns are recomputed
+        self._derived = {key: value for key, value in self._derived.items() if key[1] != table}
+
+    def add_column_file(self, table, names, filepath, source=None):
+        """
+        Add columns that are stored in a separate run file, e.g. FK poses computed out-of-core.
+
+        The file holds the columns as table `table` with the rows of the table, it is only
+        read by iter_chunks() and removed together with the run.
+        """
+        for name in names:
+            self._column_files[f"{table}.{name}"] = filepath
+            self._sources[f"{table}.{name}"] = source
+        weakref.finalize(self, os.remove, filepath)
+
+    def iter_chunks(self, table, names, chunk_size):
+        """
+        Yield the given columns of a table from the files in row chunks (out-of-core).
+
+        Like iter_table_chunks, with the columns of add_column_file() read from their file.
+        """
+        files = {}
+        for name in names:
+            filepath = self._column_files.get(f"{table}.{name}", self.filepath(table))
+            files.setdefault(filepath, []).append(name)
+        readers = [
+            iter_table_chunks(filepath, table, columns, chunk_size)
+            for filepath, columns in files.items()
+        ]
+        order = [name for columns in files.values() for name in columns]
+        indices = [order.index(name) for name in names]
+        for parts in zip(*readers):
+            yield np.hstack(parts)[:, indices]
+
+    def cache_params(self, names):
+        """
+        Return the stage cache parameters of the loaded data that the file digests miss.
+
+        These are the dtype and the sources of the given columns if they were computed in
+        memory.
+        """
+        params = {"dtype": self.dtype.name}
+        sources = {
+            column: source for column, source in self._sources.items()
+            if column.split(".", 1)[1] in names
+        }
+        if sources:
+            params["computed_columns"] = sources
+        return params
+
+    def _cached(self, key, compute):
+        if key not in self._derived:
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def moving_range(self, vel_threshold):
+        """(start, end) of the executed rows between the first and last motion (cached)."""
+        return self._cached(
+            ("moving_range", "executed", vel_threshold),
+            lambda: moving_range(
+                self.executed([c for c in self.columns("executed") if "vel" in c]),
+                vel_threshold,
+            ),
+        )
+
+    def arc_length(self, table, names, vel_threshold=None):
+        """Cumulative arc length of the path of the given columns (cached)."""
+        return self._cached(
+            ("arc_length", table, tuple(names), vel_threshold),
+            lambda: cumulative_arc_length(self.get(table, names, vel_threshold)),
+        )
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for data in self._tables.values() for a in data.values())
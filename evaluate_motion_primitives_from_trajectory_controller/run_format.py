@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+"""
+Binary run format: one `trajectory_<timestamp>.npz` file per recorded run.
+
+The file is a zip archive of .npy members:
+- `<table>.npy`: float64 table in column-major order (planned, executed, reduced, ...)
+- `<table>/<chunk>.npy`: alternatively, consecutive row chunks of a table that was written
+  incrementally (executed joint states streamed by the recorder)
+- `<table>.columns.npy`: column names of the table
+- `metadata.npy`: JSON string with robot, mode, joint names, ...
+Members are stored uncompressed by default, so every table can be memory-mapped
+directly from the archive without copying. Compressed files still allow loading a
+single table without reading the others.
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    import profiling
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller import profiling
+
+RUN_EXTENSION = ".npz"
+RUN_PATTERN = re.compile(
+    r"trajectory_(\d{8}_\d{6})_(planned|executed|reduced_PTP|reduced_LIN)\.csv$"
+)
+
+data_dir = "src/evaluate_motion_primitives_from_trajectory_controller/data"
+
+
+def _write_member(zf, name, array):
+    with zf.open(name + ".npy", "w", force_zip64=True) as f:
+        np.lib.format.write_array(f, array, allow_pickle=False)
+
+
+def _write_table(zf, name, df):
+    _write_member(zf, name, np.asfortranarray(df.to_numpy(dtype=np.float64)))
+    _write_member(zf, name + ".columns", np.array(df.columns, dtype=str))
+
+
+class RunWriter:
+    """
+    Run file that is written incrementally to `<filepath>.part`.
+
+    Tables are added whole (add_table) or as consecutive row chunks (add_chunk), every
+    member is compressed separately if `compress` is set. close() writes the metadata and
+    atomically moves the file into place, so readers never see a partial run file.
+    """
+
+    def __init__(self, filepath, compress=False):
+        self.filepath = filepath
+        self.part_filepath = filepath + ".part"
+        self._chunks = {}
+        self._zf = zipfile.ZipFile(
+            self.part_filepath, "w", zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        )
+
+    def add_table(self, name, df):
+        _write_table(self._zf, name, df)
+
+    def add_chunk(self, name, columns, values):
+        """Append rows to a chunked table, the columns are stored with the first chunk."""
+        if name not in self._chunks:
+            _write_member(self._zf, name + ".columns", np.array(columns, dtype=str))
+            self._chunks[name] = 0
+        _write_member(
+            self._zf, f"{name}/{self._chunks[name]:06d}",
+            np.asfortranarray(values, dtype=np.float64),
+        )
+        self._chunks[name] += 1
+
+    def close(self, metadata):
+        _write_member(self._zf, "metadata", np.array(json.dumps(metadata, default=str)))
+        self._zf.close()
+        os.replace(self.part_filepath, self.filepath)
+
+
+def write_run(filepath, tables, metadata, compress=False):
+    """Write all tables (dict name -> DataFrame) and the metadata atomically to filepath."""
+    writer = RunWriter(filepath, compress)
+    for name, df in tables.items():
+        writer.add_table(name, df)
+    writer.close(metadata)
+
+
+def append_run_table(filepath, name, df):
+    """Add a table to an existing run file without rewriting the other tables."""
+    if name in list_run_tables(filepath):
+        raise ValueError(f"Table '{name}' already exists in {filepath}")
+    with zipfile.ZipFile(filepath, "a", zipfile.ZIP_STORED) as zf:
+        _write_table(zf, name, df)
+
+
+def append_run_chunks(filepath, name, columns, chunks):
+    """Add a table to an existing run file chunk by chunk, e.g. poses computed out-of-core."""
+    if name in list_run_tables(filepath):
+        raise ValueError(f"Table '{name}' already exists in {filepath}")
+    # The chunks can be computed from other tables of the same file: the first chunk is read
+    # before the file is opened for appending, the members it reads are not changed then
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    with zipfile.ZipFile(filepath, "a", zipfile.ZIP_STORED) as zf:
+        _write_member(zf, name + ".columns", np.array(columns, dtype=str))
+        for i, values in enumerate([] if first is None else itertools.chain([first], chunks)):
+            _write_member(zf, f"{name}/{i:06d}", np.asfortranarray(values, dtype=np.float64))
+
+
+def list_run_tables(filepath):
+    with zipfile.ZipFile(filepath) as zf:
+        names = [
+            n[: -len(".npy")].split("/")[0]
+            for n in zf.namelist()
+            if n.endswith(".npy") and not n.endswith(".columns.npy") and n != "metadata.npy"
+        ]
+    # Chunked tables consist of several members
+    return list(dict.fromkeys(names))
+
+
+def _load_member(filepath, zf, name, mmap):
+    info = zf.getinfo(name + ".npy")
+    if not mmap or info.compress_type != zipfile.ZIP_STORED:
+        with zf.open(info) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+
+    # Stored members are contiguous in the file: skip the zip local header and the
+    # .npy header and map the array data directly
+    with open(filepath, "rb") as f:
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject or 0 in shape:
+        with zf.open(info) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+    return np.memmap(
+        filepath, dtype=dtype, mode="r", offset=offset, shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+def load_run_table(filepath, name, mmap=True, columns=None):
+    """
+    Load a single table of a run file as DataFrame (zero-copy for uncompressed files).
+
+    With `columns`, only those of the table's columns are kept (missing ones are ignored),
+    the others are never copied out of the file.
+    """
+    with zipfile.ZipFile(filepath) as zf:
+        table_columns = _load_member(filepath, zf, name + ".columns", mmap=False).tolist()
+        indices = None
+        if columns is not None:
+            indices = [i for i, column in enumerate(table_columns) if column in columns]
+            table_columns = [table_columns[i] for i in indices]
+        if name + ".npy" in zf.NameToInfo:
+            values = _load_member(filepath, zf, name, mmap)
+            if indices is not None:
+                values = np.asarray(values[:, indices])
+        else:
+            # Chunked table: only the chunks of this table are read and concatenated
+            chunks = sorted(
+                n[: -len(".npy")] for n in zf.namelist() if n.startswith(name + "/")
+            )
+            values = np.concatenate(
+                [
+                    _load_member(filepath, zf, chunk, mmap=False)[
+                        :, slice(None) if indices is None else indices
+                    ]
+                    for chunk in chunks
+                ]
+                or [np.empty((0, len(table_columns)))]
+            )
+    return pd.DataFrame(values, columns=table_columns, copy=False)
+
+
+def load_run_metadata(filepath):
+    with zipfile.ZipFile(filepath) as zf:
+        return json.loads(str(_load_member(filepath, zf, "metadata", mmap=False)))
+
+
+def read_table(filepath, table, columns=None):
+    """
+    Load a trajectory table from a CSV file or from a run file.
+
+    For CSV files `table` is ignored. For run files the executed table is joined with
+    the FK poses (executed_poses) if they were stored separately. With `columns`, only
+    those columns are parsed (missing ones are ignored).
+    """
+    with profiling.stage("read_table"):
+        if not filepath.endswith(RUN_EXTENSION):
+            if columns is None:
+                df = pd.read_csv(filepath)
+            else:
+                columns = set(columns)
+                df = pd.read_csv(filepath, usecols=lambda column: column in columns)
+        else:
+            df = load_run_table(filepath, table, columns=columns)
+            if table == "executed" and "executed_poses" in list_run_tables(filepath):
+                df = pd.concat(
+                    [df, load_run_table(filepath, "executed_poses", columns=columns)], axis=1
+                )
+        profiling.add_rows(len(df))
+    return df
+
+
+def _iter_run_table(filepath, name, columns, chunk_size):
+    """Yield row chunks of the given columns of one table of a run file."""
+    with zipfile.ZipFile(filepath) as zf:
+        table_columns = _load_member(filepath, zf, name + ".columns", mmap=False).tolist()
+        indices = [table_columns.index(c) for c in columns]
+        if name + ".npy" in zf.NameToInfo:
+            # Memory-mapped, only the pages of the current chunk are read
+            values = _load_member(filepath, zf, name, mmap=True)
+            for start in range(0, len(values), chunk_size):
+                yield np.asarray(values[start:start + chunk_size, indices])
+        else:
+            chunks = sorted(
+                n[: -len(".npy")] for n in zf.namelist() if n.startswith(name + "/")
+            )
+            for chunk in chunks:
+                yield _load_member(filepath, zf, chunk, mmap=False)[:, indices]
+
+
+def _rechunk(chunks, chunk_size):
+    """Yield the rows of an iterable of chunks in chunks of exactly chunk_size rows."""
+    pending, n_pending = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        n_pending += len(chunk)
+        while n_pending >= chunk_size:
+            rows = np.concatenate(pending)
+            yield rows[:chunk_size]
+            pending, n_pending = [rows[chunk_size:]], n_pending - chunk_size
+    if n_pending:
+        yield np.concatenate(pending)
+
+
+def table_columns(filepath, table):
+    """Column names of a trajectory table (like read_table) without loading its rows."""
+    if not filepath.endswith(RUN_EXTENSION):
+        return pd.read_csv(filepath, nrows=0).columns.tolist()
+    tables = list_run_tables(filepath)
+    names = [table, "executed_poses"] if table == "executed" else [table]
+    with zipfile.ZipFile(filepath) as zf:
+        return [
+            column
+            for name in names if name in tables
+            for column in _load_member(filepath, zf, name + ".columns", mmap=False).tolist()
+        ]
+
+
+def iter_table_chunks(filepath, table, columns, chunk_size=100000):
+    """
+    Yield the given columns of a trajectory table in chunks of at most chunk_size rows.
+
+    The table is read from a CSV or run file like read_table, as float arrays, so tables
+    larger than memory can be evaluated.
+    """
+    if not filepath.endswith(RUN_EXTENSION):
+        for df in pd.read_csv(filepath, usecols=columns, chunksize=chunk_size):
+            profiling.add_rows(len(df))
+            yield df[columns].to_numpy(dtype=np.float64)
+        return
+
+    # Columns of the executed table can also be in the separately stored FK poses
+    sources = {}
+    tables = list_run_tables(filepath)
+    for name in [table, "executed_poses"] if table == "executed" else [table]:
+        if name not in tables:
+            continue
+        with zipfile.ZipFile(filepath) as zf:
+            table_columns = _load_member(filepath, zf, name + ".columns", mmap=False)
+        for column in columns:
+            if column in table_columns and column not in sources:
+                sources[column] = name
+    missing = [c for c in columns if c not in sources]
+    if missing:
+        raise KeyError(f"Columns {missing} not in table '{table}' of {filepath}")
+
+    names = list(dict.fromkeys(sources.values()))
+    readers = [
+        _rechunk(
+            _iter_run_table(
+                filepath, name, [c for c in columns if sources[c] == name], chunk_size
+            ),
+            chunk_size,
+        )
+        for name in names
+    ]
+    # Position of every requested column in the concatenated chunks
+    order = [c for name in names for c in columns if sources[c] == name]
+    indices = [order.index(c) for c in columns]
+    for parts in zip(*readers):
+        profiling.add_rows(len(parts[0]))
+        yield np.hstack(parts)[:, indices]
+
+
+def figure_path(filepath_planned, suffix):
+    """Path of a figure next to the planned CSV or run file, e.g. suffix '_compare_x.png'."""
+    base_name = os.path.basename(filepath_planned)
+    for extension in ("_planned.csv", RUN_EXTENSION):
+        if base_name.endswith(extension):
+            base_name = base_name[: -len(extension)]
+            break
+    return os.path.join(os.path.dirname(filepath_planned), base_name + suffix)
+
+
+def find_runs(directory):
+    """
+    Group the CSV files of a data directory by timestamp -> {kind: filepath}.
+
+    Runs that only exist as run file (recorded directly as archive) map every kind to the
+    run file.
+    """
+    runs = {}
+    for filepath in sorted(glob.glob(os.path.join(directory, "trajectory_*.csv"))):
+        match = RUN_PATTERN.search(os.path.basename(filepath))
+        if match:
+            timestamp, kind = match.groups()
+            runs.setdefault(timestamp, {})[kind] = filepath
+    for filepath in sorted(glob.glob(os.path.join(directory, f"trajectory_*{RUN_EXTENSION}"))):
+        timestamp = os.path.basename(filepath)[len("trajectory_"):-len(RUN_EXTENSION)]
+        if timestamp in runs:
+            continue
+        tables = list_run_tables(filepath)
+        runs[timestamp] = {kind: filepath for kind in ("planned", "executed") if kind in tables}
+        if "reduced" in tables:
+            runs[timestamp][f"reduced_{load_run_metadata(filepath)['mode']}"] = filepath
+    return runs
+
+
+def convert_csv_run(directory, timestamp, files, compress=False):
+    """Convert the CSV files of one run to `trajectory_<timestamp>.npz`."""
+    try:
+        from local_fk import detect_robot
+    except ImportError:
+        from evaluate_motion_primitives_from_trajectory_controller.local_fk import detect_robot
+
+    tables = {}
+    metadata = {"timestamp": timestamp}
+    for kind, filepath in files.items():
+        df = pd.read_csv(filepath)
+        if kind.startswith("reduced_"):
+            kind, metadata["mode"] = kind.split("_")
+        tables[kind] = df
+
+    if "planned" in tables:
+        joint_names = [c[: -len("_pos")] for c in tables["planned"].columns if c.endswith("_pos")]
+        metadata["joint_names"] = joint_names
+        try:
+            metadata["robot"] = detect_robot(joint_names)
+        except ValueError:
+            metadata["robot"] = None
+
+    filepath_run = os.path.join(directory, f"trajectory_{timestamp}{RUN_EXTENSION}")
+    write_run(filepath_run, tables, metadata, compress)
+    return filepath_run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert recorded CSV runs to run files.")
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--compress", action="store_true", help="deflate (disables mmap)")
+    parser.add_argument("--force", action="store_true", help="overwrite existing run files")
+    args = parser.parse_args()
+
+    for timestamp, files in find_runs(args.data_dir).items():
+        filepath_run = os.path.join(args.data_dir, f"trajectory_{timestamp}{RUN_EXTENSION}")
+        if filepath_run in files.values():
+            # Recorded as run file, there are no CSV files to convert
+            continue
+        if os.path.exists(filepath_run) and not args.force:
+            print(f"Skipping {timestamp}, run file already exists.")
+            continue
+        convert_csv_run(args.data_dir, timestamp, files, args.compress)
+        csv_size = sum(os.path.getsize(f) for f in files.values())
+        print(
+            f"Converted {timestamp}: {csv_size / 1e3:.0f} kB CSV -> "
+            f"{os.path.getsize(filepath_run) / 1e3:.0f} kB"
+        )
+
+
+if __name__ == "__main__":
+    main()
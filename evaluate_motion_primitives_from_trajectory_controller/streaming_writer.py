@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import csv
+import os
+import threading
+
+import pandas as pd
+
+# Used by the scripts (python3) and by the ROS nodes (ros2 run), so both imports are tried
+try:
+    from run_format import RUN_EXTENSION, RunWriter
+except ImportError:
+    from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+        RUN_EXTENSION,
+        RunWriter,
+    )
+
+RUN_CHUNK_ROWS = 100_000
+
+
+class ExecutedJointStatesWriter:
+    """
+    Background thread that streams a JointStateBuffer to a CSV file while recording.
+
+    Every `flush_interval` seconds the buffer is drained and the samples are appended to
+    `<filename>.part` and synced to disk, so the buffer only ever holds the samples of one
+    interval and a crash loses at most that interval. close() writes the remaining
+    samples and atomically renames the part file to `filename`.
+    """
+
+    def __init__(self, buffer, filename, flush_interval=0.5):
+        self.buffer = buffer
+        self.filename = filename
+        self.part_filename = filename + ".part"
+        self.flush_interval = flush_interval
+        self.n_written = 0
+        self._header_written = False
+        self._closed = False
+        self._stop = threading.Event()
+
+        folder = os.path.dirname(filename)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self._open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _open(self):
+        self._file = open(self.part_filename, mode="w", newline="")
+        self._writer = csv.writer(self._file)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush()
+
+    def _flush(self):
+        samples = self.buffer.drain()
+        if len(samples) == 0:
+            return
+        self._write(samples)
+        self.n_written += len(samples)
+
+    def _write(self, samples):
+        if not self._header_written:
+            self._writer.writerow(self.buffer.header())
+            self._header_written = True
+        self._writer.writerows(samples.tolist())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _finish(self):
+        self._file.close()
+        os.replace(self.part_filename, self.filename)
+
+    def close(self):
+        """Stop the thread, write the remaining samples and move the file into place."""
+        if self._closed:
+            return self.n_written
+        self._closed = True
+        self.buffer.close()
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._flush()
+        self._finish()
+        return self.n_written
+
+
+class ExecutedJointStatesRunWriter(ExecutedJointStatesWriter):
+    """
+    Streams a JointStateBuffer into a run file instead of a CSV file.
+
+    While recording, the samples are streamed like by ExecutedJointStatesWriter to
+    `trajectory_<timestamp>_executed.csv.part`, which is readable after a crash. The other
+    tables of the run (add_table) and the `metadata` dict are kept until close(), which
+    stops the flush thread, writes everything into the run file (the executed table in
+    compressed chunks of RUN_CHUNK_ROWS rows) and atomically moves it into place.
+    """
+
+    def __init__(self, buffer, filename, flush_interval=0.5):
+        self.metadata = {}
+        self._tables = {}
+        super().__init__(buffer, filename, flush_interval)
+
+    def _open(self):
+        self.part_filename = self.filename[: -len(RUN_EXTENSION)] + "_executed.csv.part"
+        super()._open()
+
+    def add_table(self, name, df):
+        self._tables[name] = df
+
+    def _finish(self):
+        self._file.close()
+        run_writer = RunWriter(self.filename, compress=True)
+        for name, df in self._tables.items():
+            run_writer.add_table(name, df)
+        if self._header_written:
+            chunks = pd.read_csv(
+                self.part_filename, chunksize=RUN_CHUNK_ROWS, float_precision="round_trip"
+            )
+            for df in chunks:
+                run_writer.add_chunk("executed", df.columns, df.to_numpy())
+        run_writer.close(self.metadata)
+        os.remove(self.part_filename)
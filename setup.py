@@ -27,6 +27,12 @@ setup(
         'console_scripts': [
             'record_moprim_from_traj_data = evaluate_motion_primitives_from_trajectory_controller.record_moprim_from_traj_data:main',
             'compare = evaluate_motion_primitives_from_trajectory_controller.compare:main',
+            'convert_runs = evaluate_motion_primitives_from_trajectory_controller.run_format:main',
+            'batch_evaluate = evaluate_motion_primitives_from_trajectory_controller.batch_evaluate:main',
+            'online_evaluation = evaluate_motion_primitives_from_trajectory_controller.online_evaluation:main',
+            'benchmark = evaluate_motion_primitives_from_trajectory_controller.benchmark:main',
+            'replay_run = evaluate_motion_primitives_from_trajectory_controller.replay_run:main',
+            'run_catalog = evaluate_motion_primitives_from_trajectory_controller.run_catalog:main',
         ],
     },
 )
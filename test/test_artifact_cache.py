@@ -0,0 +1,114 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import os
+
+from evaluate_motion_primitives_from_trajectory_controller.artifact_cache import (
+    ArtifactCache,
+    cached_stage,
+)
+from evaluate_motion_primitives_from_trajectory_controller.run_data import Run
+import numpy as np
+import pandas as pd
+
+POSE_NAMES = ["pose_x", "pose_y", "pose_z"]
+
+
+class CountingStage:
+
+    def __init__(self, outputs=()):
+        self.outputs = outputs
+        self.n_calls = 0
+
+    def __call__(self):
+        self.n_calls += 1
+        for filepath in self.outputs:
+            with open(filepath, "wb") as f:
+                f.write(b"figure %d" % self.n_calls)
+        return self.n_calls
+
+
+def write_csv(filepath, n_rows, seed=0):
+    values = np.random.default_rng(seed).normal(size=(n_rows, 2))
+    pd.DataFrame(values, columns=["timestamp", "joint_1_pos"]).to_csv(filepath, index=False)
+    return str(filepath)
+
+
+def test_key_changes_with_file_content_and_params(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    filepath = write_csv(tmp_path / "executed.csv", 10)
+    key = cache.key("stage", [filepath], {"n_points": 100})
+    assert cache.key("stage", [filepath], {"n_points": 100}) == key
+    assert cache.key("stage", [filepath], {"n_points": 200}) != key
+    assert cache.key("other_stage", [filepath], {"n_points": 100}) != key
+
+    write_csv(filepath, 11)
+    assert cache.key("stage", [filepath], {"n_points": 100}) != key
+
+
+def test_key_changes_with_dtype_and_fk_tolerance(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    filepath_planned = write_csv(tmp_path / "planned.csv", 10)
+    filepath_executed = write_csv(tmp_path / "executed.csv", 20, seed=1)
+    files = [filepath_planned, filepath_executed]
+
+    def key(dtype=np.float64, fk_tolerance=None):
+        # Stage parameters like the Cartesian comparison builds them
+        run = Run(filepath_planned, filepath_executed, dtype=dtype)
+        run.add_columns(
+            "executed", POSE_NAMES, np.zeros((20, 3)),
+            source={"fk_backend": "local", "fk_tolerance": fk_tolerance},
+        )
+        return cache.key("cartesian_comparison", files, run.cache_params(POSE_NAMES))
+
+    keys = [key(), key(dtype=np.float32), key(fk_tolerance=1e-4), key(fk_tolerance=1e-3)]
+    assert len(set(keys)) == len(keys)
+    assert key() == keys[0]
+
+
+def test_cached_stage_restores_figure(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"))
+    filepath = write_csv(tmp_path / "executed.csv", 10)
+    figure = str(tmp_path / "figure.png")
+    stage = CountingStage([figure])
+
+    assert cached_stage(cache, "plot", [filepath], {}, stage, [figure]) == 1
+    os.remove(figure)
+    assert cached_stage(cache, "plot", [filepath], {}, stage, [figure]) == 1
+    assert stage.n_calls == 1
+    with open(figure, "rb") as f:
+        assert f.read() == b"figure 1"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    # Without cache the stage always runs
+    assert cached_stage(None, "plot", [filepath], {}, stage, [figure]) == 2
+
+
+def test_eviction_removes_least_recently_used_entries(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache = ArtifactCache(cache_dir, max_bytes=30000)
+    value = np.zeros(1000)  # about 8 kB per entry, three entries fit
+    for i, key in enumerate(["a", "b"]):
+        cache.store(key, value)
+        os.utime(os.path.join(cache_dir, key + ".pkl"), (i, i))
+    # Loading "a" makes "b" the least recently used entry
+    assert cache.load("a")[0]
+    cache.store("c", value)
+    cache.store("d", value)
+
+    assert cache.load("a")[0] and not cache.load("b")[0]
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)]
+    assert sum(os.path.getsize(path) for path in entries) <= 30000
@@ -0,0 +1,152 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import os
+
+from evaluate_motion_primitives_from_trajectory_controller.fk_cache import FKCache
+from evaluate_motion_primitives_from_trajectory_controller.fk_sampling import FKSampler
+from evaluate_motion_primitives_from_trajectory_controller.local_fk import (
+    detect_robot,
+    LocalFK,
+    ROBOT_CHAINS,
+)
+import numpy as np
+import pandas as pd
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+POSE_NAMES = ["pose_x", "pose_y", "pose_z", "pose_qx", "pose_qy", "pose_qz", "pose_qw"]
+
+
+def recorded_run(timestamp, n_rows=500):
+    df = pd.read_csv(
+        os.path.join(DATA_DIR, f"trajectory_{timestamp}_executed.csv"), nrows=n_rows
+    )
+    joint_pos_names = [c for c in df.columns if c.endswith("_pos")]
+    return [c[: -len("_pos")] for c in joint_pos_names], df[joint_pos_names].to_numpy(), df
+
+
+# The recorded poses were computed with the MoveIt /compute_fk service
+@pytest.mark.parametrize("timestamp", ["20250715_114057", "20250722_103002"])
+def test_local_fk_matches_recorded_poses(timestamp):
+    joint_names, positions, df = recorded_run(timestamp)
+    poses = LocalFK(detect_robot(joint_names)).compute_fk_batch(joint_names, positions)
+    reference = df[POSE_NAMES].to_numpy()
+    np.testing.assert_allclose(poses[:, :3], reference[:, :3], atol=1e-9)
+    # q and -q are the same orientation
+    dots = np.abs(np.einsum("ij,ij->i", poses[:, 3:], reference[:, 3:]))
+    np.testing.assert_allclose(dots, 1.0, atol=1e-9)
+
+
+def test_local_fk_column_order():
+    joint_names, positions, _ = recorded_run("20250715_114057", 50)
+    fk = LocalFK("ur")
+    order = np.random.default_rng(0).permutation(len(joint_names))
+    np.testing.assert_array_equal(
+        fk.compute_fk_batch(joint_names, positions),
+        fk.compute_fk_batch([joint_names[i] for i in order], positions[:, order]),
+    )
+
+
+def test_detect_robot():
+    assert detect_robot([f"joint_a{i}" for i in range(1, 7)]) == "kuka"
+    with pytest.raises(ValueError):
+        detect_robot(["joint_1"])
+
+
+class CountingFK:
+    """FK backend stub that counts the rows it computes."""
+
+    def __init__(self, robot="ur"):
+        self.fk = LocalFK(robot)
+        self.n_rows = 0
+
+    def compute_fk_batch(self, joint_names, positions, from_frame="base", to_link="tool0"):
+        self.n_rows += len(positions)
+        return self.fk.compute_fk_batch(joint_names, positions, from_frame, to_link)
+
+    def shutdown(self):
+        pass
+
+
+def test_fk_cache_hits_and_quantization(tmp_path):
+    joint_names, positions, _ = recorded_run("20250715_114057", 200)
+    positions = np.round(positions / 1e-6) * 1e-6
+    backend = CountingFK()
+    cache = FKCache(backend, "ur", str(tmp_path / "fk.sqlite"), resolution=1e-6)
+    first = cache.compute_fk_batch(joint_names, positions)
+    n_unique = len(np.unique(positions, axis=0))
+    assert backend.n_rows == n_unique
+
+    # Offsets below half the resolution map to the same entries
+    second = cache.compute_fk_batch(joint_names, positions + 2e-7)
+    assert backend.n_rows == n_unique
+    assert cache.stats()["hits"] == n_unique
+    np.testing.assert_array_equal(first, second)
+    cache.shutdown()
+
+
+def test_fk_cache_evicts_least_recently_used(tmp_path):
+    joint_names = [name for name, *_ in ROBOT_CHAINS["ur"]["joints"]]
+    rows = np.arange(3)[:, None] * 0.1 + np.zeros((3, 6))
+    backend = CountingFK()
+    cache = FKCache(backend, "ur", str(tmp_path / "fk.sqlite"), max_entries=2)
+    cache.compute_fk_batch(joint_names, rows[:1])
+    cache.compute_fk_batch(joint_names, rows[1:2])
+    cache.compute_fk_batch(joint_names, rows[:1])
+    # Evicts row 1, which was used least recently
+    cache.compute_fk_batch(joint_names, rows[2:3])
+    backend.n_rows = 0
+    cache.compute_fk_batch(joint_names, rows[:1])
+    assert backend.n_rows == 0
+    cache.compute_fk_batch(joint_names, rows[1:2])
+    assert backend.n_rows == 1
+    cache.shutdown()
+
+
+def test_fk_cache_separates_backends(tmp_path):
+    joint_names = [name for name, *_ in ROBOT_CHAINS["ur"]["joints"]]
+    rows = np.zeros((1, 6))
+    cache_path = str(tmp_path / "fk.sqlite")
+    first = CountingFK()
+    FKCache(first, "ur", cache_path, backend_name="moveit").compute_fk_batch(joint_names, rows)
+    # Another backend does not get the poses of the first one
+    second = CountingFK()
+    cache = FKCache(second, "ur", cache_path, backend_name="local")
+    cache.compute_fk_batch(joint_names, rows)
+    assert second.n_rows == 1
+    cache.shutdown()
+
+
+def test_fk_sampler_duplicates_are_exact():
+    joint_names, positions, _ = recorded_run("20250715_114057", 1000)
+    positions = np.repeat(positions, 3, axis=0)
+    backend = CountingFK()
+    poses = FKSampler(backend).compute_fk_batch(joint_names, positions)
+    np.testing.assert_array_equal(poses, LocalFK("ur").compute_fk_batch(joint_names, positions))
+    assert backend.n_rows <= len(positions) // 3
+
+
+def test_fk_sampler_decimation_within_tolerance():
+    joint_names, positions, _ = recorded_run("20250715_114057", 3000)
+    backend = CountingFK()
+    sampler = FKSampler(backend, tolerance=1e-4)
+    poses = sampler.compute_fk_batch(joint_names, positions)
+    reference = LocalFK("ur").compute_fk_batch(joint_names, positions)
+    assert backend.n_rows < len(positions) / 5
+    assert np.linalg.norm(poses[:, :3] - reference[:, :3], axis=1).max() < 5e-4
+    dots = np.abs(np.einsum("ij,ij->i", poses[:, 3:], reference[:, 3:]))
+    assert np.all(2 * np.arccos(np.minimum(dots, 1.0)) < 1e-3)
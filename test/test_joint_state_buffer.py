@@ -0,0 +1,60 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from evaluate_motion_primitives_from_trajectory_controller.joint_state_buffer import (
+    JointStateBuffer,
+)
+import numpy as np
+import pytest
+
+JOINTS = ["joint_1", "joint_2"]
+
+
+def test_joint_state_buffer_grows():
+    buffer = JointStateBuffer(capacity=4)
+    for i in range(10):
+        assert buffer.append(float(i), JOINTS, [i, -i], [0.5, 0.5])
+    samples = buffer.to_array()
+    assert samples.shape == (10, 5)
+    np.testing.assert_array_equal(samples[:, 0], np.arange(10))
+    assert buffer.header() == [
+        "timestamp", "joint_1_pos", "joint_2_pos", "joint_1_vel", "joint_2_vel"
+    ]
+
+
+@pytest.mark.parametrize(
+    "overflow, timestamps", [("overwrite_oldest", [6, 7, 8, 9]), ("drop_newest", [0, 1, 2, 3])]
+)
+def test_joint_state_buffer_fixed_size(overflow, timestamps):
+    buffer = JointStateBuffer(capacity=4, overflow=overflow)
+    for i in range(10):
+        buffer.append(float(i), JOINTS, [i, i], [])
+    assert buffer.n_dropped == 6
+    assert len(buffer) == 4
+    samples = buffer.to_array()
+    np.testing.assert_array_equal(samples[:, 0], timestamps)
+    # Missing velocities are stored as NaN
+    assert np.isnan(samples[:, 3:]).all()
+
+
+def test_joint_state_buffer_remaps_joints_by_name():
+    buffer = JointStateBuffer(capacity=4)
+    buffer.append(0.0, JOINTS, [1.0, 2.0], [3.0, 4.0])
+    assert buffer.append(1.0, ["joint_2", "gripper", "joint_1"], [2.0, 9.0, 1.0], [4.0, 9.0, 3.0])
+    assert not buffer.append(2.0, ["joint_1"], [1.0], [3.0])
+    assert buffer.n_mismatched == 1
+    samples = buffer.to_array()
+    np.testing.assert_array_equal(samples[1], samples[0] + [1.0, 0.0, 0.0, 0.0, 0.0])
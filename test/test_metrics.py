@@ -0,0 +1,219 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from evaluate_motion_primitives_from_trajectory_controller.metrics import (
+    compare_cartesian_trajectories,
+    compare_joint_trajectories,
+    compare_joint_trajectories_chunked,
+    compare_joint_trajectories_dtw,
+    compare_joint_trajectories_in_time,
+    cumulative_arc_length,
+    densify_polyline,
+    discrete_frechet_distance,
+    dtw_path,
+    estimate_time_offset,
+    hausdorff_distance,
+    make_quaternions_continuous,
+    match_points,
+    moving_range,
+    polyline_distance,
+    resample_in_time,
+)
+import numpy as np
+import pytest
+from scipy.spatial.transform import Rotation
+
+
+def test_moving_range():
+    velocities = np.zeros((10, 2))
+    velocities[3:7, 1] = 0.5
+    assert tuple(moving_range(velocities, 0.1)) == (3, 6)
+
+
+def random_walk(n, d=3, seed=0):
+    return np.cumsum(np.random.default_rng(seed).normal(size=(n, d)), axis=0)
+
+
+def test_match_points():
+    reference = random_walk(20, seed=12)
+    matches = match_points(reference, reference[[4, 9]] + [[0.0, 0.0, 1e-9], [0.0, 0.0, 0.5]])
+    np.testing.assert_array_equal(matches.indices, [4, 9])
+    np.testing.assert_array_equal(matches.exact, [True, False])
+
+
+def brute_force_dtw(a, b):
+    cost = np.full((len(a) + 1, len(b) + 1), np.inf)
+    cost[0, 0] = 0.0
+    for i in range(len(a)):
+        for j in range(len(b)):
+            cost[i + 1, j + 1] = np.linalg.norm(a[i] - b[j]) + min(
+                cost[i, j], cost[i, j + 1], cost[i + 1, j]
+            )
+    return cost[-1, -1]
+
+
+@pytest.mark.parametrize("n, m", [(30, 30), (25, 40), (40, 17)])
+def test_dtw_full_band_matches_brute_force(n, m):
+    a, b = random_walk(n, seed=1), random_walk(m, seed=2)
+    path, cost = dtw_path(a, b, max(n, m))
+    assert cost == pytest.approx(brute_force_dtw(a, b))
+    # The path is connected and monotonic from (0, 0) to (n - 1, m - 1)
+    assert tuple(path[0]) == (0, 0) and tuple(path[-1]) == (n - 1, m - 1)
+    steps = np.diff(path, axis=0)
+    assert np.all((steps >= 0) & (steps <= 1)) and np.all(steps.sum(axis=1) >= 1)
+    assert np.linalg.norm(a[path[:, 0]] - b[path[:, 1]], axis=1).sum() == pytest.approx(cost)
+
+
+def test_dtw_band_only_restricts_the_path():
+    a, b = random_walk(60, seed=3), random_walk(60, seed=4)
+    path, cost = dtw_path(a, b, 3)
+    assert np.abs(path[:, 0] - path[:, 1]).max() <= 3
+    assert cost >= brute_force_dtw(a, b) - 1e-9
+
+
+def test_dtw_comparison_of_identical_trajectories():
+    a = random_walk(200, d=6)
+    result = compare_joint_trajectories_dtw(a, a)
+    assert result.total_rmse == 0.0
+    np.testing.assert_array_equal(result.path[:, 0], result.path[:, 1])
+
+
+def brute_force_frechet(a, b):
+    dist = np.linalg.norm(a[:, None] - b[None], axis=2)
+    ca = np.full(dist.shape, np.inf)
+    for i in range(len(a)):
+        for j in range(len(b)):
+            if i == 0 and j == 0:
+                best = 0.0
+            else:
+                best = min(
+                    ca[i - 1, j] if i else np.inf,
+                    ca[i, j - 1] if j else np.inf,
+                    ca[i - 1, j - 1] if i and j else np.inf,
+                )
+            ca[i, j] = max(dist[i, j], best)
+    return ca[-1, -1]
+
+
+def brute_force_polyline_distance(polyline, points):
+    starts, segments = polyline[:-1], np.diff(polyline, axis=0)
+    distances = []
+    for point in points:
+        t = np.clip(
+            np.einsum("ij,ij->i", point - starts, segments)
+            / np.einsum("ij,ij->i", segments, segments),
+            0.0, 1.0,
+        )
+        distances.append(np.linalg.norm(point - starts - t[:, None] * segments, axis=1).min())
+    return np.array(distances)
+
+
+def test_polyline_distance_matches_brute_force():
+    polyline = random_walk(50, seed=5)
+    points = polyline[::3] + np.random.default_rng(6).normal(scale=0.5, size=(17, 3))
+    np.testing.assert_allclose(
+        polyline_distance(polyline, points),
+        brute_force_polyline_distance(polyline, points),
+        atol=1e-12,
+    )
+
+
+def test_hausdorff_matches_brute_force():
+    a, b = random_walk(40, seed=7), random_walk(30, seed=8)
+    expected = max(
+        brute_force_polyline_distance(b, a).max(), brute_force_polyline_distance(a, b).max()
+    )
+    assert hausdorff_distance(a, b) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("n, m", [(1, 1), (1, 9), (12, 12), (20, 33), (33, 20)])
+def test_discrete_frechet_matches_brute_force(n, m):
+    a, b = random_walk(n, seed=9), random_walk(m, seed=10)
+    assert discrete_frechet_distance(a, b) == pytest.approx(brute_force_frechet(a, b))
+
+
+def test_densify_polyline_keeps_the_path():
+    polyline = random_walk(10, seed=11)
+    dense = densify_polyline(polyline, 0.1)
+    steps = np.linalg.norm(np.diff(dense, axis=0), axis=1)
+    assert steps.max() <= 0.1 + 1e-12
+    assert steps.sum() == pytest.approx(np.linalg.norm(np.diff(polyline, axis=0), axis=1).sum())
+    assert np.abs(polyline_distance(polyline, dense)).max() < 1e-9
+
+
+def test_chunked_joint_comparison_matches_in_memory():
+    planned, executed = random_walk(40, d=6, seed=13), random_walk(1000, d=6, seed=14)
+    expected = compare_joint_trajectories(planned, executed, 100)
+    result = compare_joint_trajectories_chunked(
+        planned, iter(np.array_split(executed, 7)), len(executed), 100
+    )
+    np.testing.assert_allclose(result.rmse, expected.rmse, rtol=1e-12)
+    np.testing.assert_allclose(result.executed_resampled, expected.executed_resampled)
+
+
+def test_cumulative_arc_length():
+    positions = np.array([[0.0, 0.0], [3.0, 4.0], [3.0, 4.0], [3.0, 5.0]])
+    np.testing.assert_allclose(cumulative_arc_length(positions), [0.0, 5.0, 5.0, 6.0])
+
+
+def test_time_offset_is_recovered():
+    # Sparse planned waypoints over 2 s, executed at 500 Hz with standstill before and after
+    planned_time = np.linspace(0.0, 2.0, 21)
+    planned = random_walk(21, d=6, seed=15)
+    dt, start, lag = 0.002, 100.0, 0.7
+    executed_time = start + np.arange(0, 3.5, dt)
+    executed = resample_in_time(planned_time, planned, executed_time - start - lag)
+
+    offset = estimate_time_offset(planned_time, planned, executed_time, executed, dt)
+    assert offset == pytest.approx(start + lag, abs=dt)
+
+    result = compare_joint_trajectories_in_time(planned_time, planned, executed_time, executed)
+    assert result.time_offset == pytest.approx(start + lag, abs=dt)
+    assert result.total_rmse < 1e-6
+    # Without the lag the same trajectories differ
+    unaligned = compare_joint_trajectories_in_time(
+        planned_time, planned, executed_time, executed, time_offset=start
+    )
+    assert unaligned.total_rmse > 0.1
+
+
+def test_make_quaternions_continuous():
+    quats = Rotation.from_rotvec(np.linspace(0.0, 3.0, 50)[:, None] * [0.0, 0.6, 0.8]).as_quat()
+    flipped = quats * np.where(np.arange(50) % 3 == 1, -1.0, 1.0)[:, None]
+    continuous = make_quaternions_continuous(flipped)
+    np.testing.assert_allclose(continuous, quats)
+    assert np.all(np.einsum("ij,ij->i", continuous[1:], continuous[:-1]) > 0)
+
+
+def test_orientation_error_of_cartesian_comparison():
+    positions = random_walk(100, seed=16)
+    rotations = Rotation.from_rotvec(np.linspace(0.0, 2.5, 100)[:, None] * [1.0, 0.0, 0.0])
+    quats = rotations.as_quat()
+
+    # Sign-flipped quaternions describe the same orientations
+    flipped = quats * np.where(np.arange(100) % 2, -1.0, 1.0)[:, None]
+    result = compare_cartesian_trajectories(positions, positions, 50, quats, flipped)
+    assert result.max_angle < 1e-9
+    np.testing.assert_allclose(result.executed_quat_resampled, result.planned_quat_resampled)
+
+    # Constant rotation offset of 0.1 rad about the tool z axis
+    offset = Rotation.from_rotvec([0.0, 0.0, 0.1])
+    result = compare_cartesian_trajectories(
+        positions, positions, 50, quats, (rotations * offset).as_quat()
+    )
+    np.testing.assert_allclose(result.angle_error, 0.1, atol=1e-9)
+    assert result.rms_angle == pytest.approx(0.1)
+    assert result.max_angle == pytest.approx(0.1)
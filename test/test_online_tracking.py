@@ -0,0 +1,60 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from evaluate_motion_primitives_from_trajectory_controller.metrics import polyline_distance
+from evaluate_motion_primitives_from_trajectory_controller.online_tracking import (
+    OnlineTrackingError,
+)
+import numpy as np
+import pytest
+
+
+def helix(s):
+    # Winding path in 4 joints that never comes close to itself
+    return np.column_stack([np.cos(s), np.sin(s), 0.5 * s, 0.2 * s])
+
+
+def test_online_tracking_matches_offline_cross_track():
+    planned = helix(np.linspace(0.0, 12.0, 60))
+    rng = np.random.default_rng(0)
+    executed = helix(np.linspace(0.0, 12.0, 2000)) + rng.normal(scale=0.01, size=(2000, 4))
+
+    tracker = OnlineTrackingError(planned, search_window=5)
+    deviations = np.array([tracker.update(position) for position in executed])
+
+    expected = polyline_distance(planned, executed)
+    np.testing.assert_allclose(deviations, expected, atol=1e-12)
+    assert tracker.n_samples == len(executed)
+    assert tracker.rmse == pytest.approx(np.sqrt(np.mean(expected**2)))
+    assert tracker.max_deviation == pytest.approx(expected.max())
+    assert tracker.progress == 1.0
+
+
+def test_online_tracking_only_moves_forward():
+    planned = helix(np.linspace(0.0, 12.0, 60))
+    tracker = OnlineTrackingError(planned, search_window=5)
+    # A jump beyond the window is matched to the end of the window
+    tracker.update(planned[30])
+    assert tracker.nearest_index == 5
+    for position in planned[5:31]:
+        assert tracker.update(position) == pytest.approx(0.0, abs=1e-12)
+    assert tracker.nearest_index == 30
+    # The start of the path is behind the window (one segment before the match)
+    assert tracker.update(planned[0]) > 1.0
+    assert tracker.nearest_index >= 28
+
+    tracker.reset()
+    assert tracker.update(planned[0]) == 0.0 and tracker.n_samples == 1
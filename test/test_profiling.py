@@ -0,0 +1,67 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import json
+import os
+
+from evaluate_motion_primitives_from_trajectory_controller import profiling
+import numpy as np
+
+
+def test_profiled_stages_are_saved_as_json(tmp_path):
+    profiler = profiling.StageProfiler()
+    cprofile_path = str(tmp_path / "profile.prof")
+    with profiling.profile(profiler, cprofile_path):
+        with profiling.stage("load"):
+            profiling.add_rows(100)
+            with profiling.stage("fk"):
+                # About 8 MB traced in the nested stage
+                poses = np.ones((1_000_000, 1))
+                profiling.add_rows(len(poses))
+                profiling.record_fk_call(0.002, n_rows=len(poses))
+                profiling.record_cache(3, 1, kind="fk")
+                del poses
+        with profiling.stage("load"):
+            pass
+    # Outside profile() the instrumentation is a no-op
+    with profiling.stage("ignored"):
+        profiling.add_rows(1)
+
+    filepath = str(tmp_path / "profile.json")
+    profiler.save(filepath)
+    with open(filepath) as f:
+        report = json.load(f)
+
+    stages = {record["name"]: record for record in report["stages"]}
+    assert sorted(stages) == ["load", "load/fk"]
+    for record in stages.values():
+        assert set(record) == {
+            "name", "calls", "wall", "cpu", "peak_memory", "rows", "cache_hits", "cache_misses"
+        }
+        assert record["wall"] >= 0.0 and record["cpu"] >= 0.0
+    assert stages["load"]["calls"] == 2
+    # Rows and memory of a stage include its nested stages
+    assert stages["load/fk"]["rows"] == 1_000_000
+    assert stages["load"]["rows"] == 1_000_100
+    assert stages["load/fk"]["peak_memory"] >= 8_000_000
+    assert stages["load"]["peak_memory"] >= stages["load/fk"]["peak_memory"]
+    assert stages["load/fk"]["cache_hits"] == 3 and stages["load"]["cache_misses"] == 1
+
+    assert report["fk"]["calls"] == 1 and report["fk"]["rows"] == 1_000_000
+    assert sum(report["fk"]["histogram"]["counts"]) == 1
+    assert report["cache"] == {"fk": {"hits": 3, "misses": 1, "hit_rate": 0.75}}
+    assert report["memory_traced"] and report["max_rss"] > 0
+    assert os.path.getsize(cprofile_path) > 0
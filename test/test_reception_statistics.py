@@ -0,0 +1,84 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+from types import SimpleNamespace
+
+from evaluate_motion_primitives_from_trajectory_controller.reception_statistics import (
+    ReceptionStatistics,
+)
+
+PERIOD = 0.002
+
+
+def receive(statistics, sequences, arrival_delays=None):
+    """Report messages with stamps at the nominal period, delayed by arrival_delays."""
+    for i, sequence in enumerate(sequences):
+        stamp = i * PERIOD
+        delay = (arrival_delays or {}).get(i, 0.0)
+        statistics.update(stamp + 1e-4 + delay, stamp, sequence)
+
+
+def test_reception_statistics_without_drops():
+    statistics = ReceptionStatistics()
+    receive(statistics, range(1, 101))
+    report = statistics.report()
+    assert report["received"] == 100
+    assert all(
+        report[key] == 0
+        for key in ("sequence_gaps", "out_of_order", "lost", "stamp_gaps", "late")
+    )
+    assert abs(report["period"] - PERIOD) < 1e-9
+
+
+def test_reception_statistics_sequence_gap():
+    statistics = ReceptionStatistics()
+    receive(statistics, [1, 2, 3, 7, 8])
+    report = statistics.report()
+    assert report["sequence_gaps"] == 1
+    assert report["sequence_missing"] == 3
+
+
+def test_reception_statistics_out_of_order():
+    statistics = ReceptionStatistics()
+    receive(statistics, [1, 2, 4, 3, 5])
+    report = statistics.report()
+    assert report["out_of_order"] == 1
+    # The late message does not count as second gap, 5 follows 4
+    assert report["sequence_gaps"] == 1
+    assert report["sequence_missing"] == 1
+
+
+def test_reception_statistics_stamp_gap_and_late_arrival():
+    statistics = ReceptionStatistics()
+    for i in [0, 1, 2, 4, 5, 6, 7, 8, 9]:
+        # Sequence number 0: the RMW does not provide it, only the stamps are evaluated
+        statistics.update(i * PERIOD + (0.01 if i == 8 else 0.0), i * PERIOD, 0)
+    report = statistics.report()
+    assert report["sequence_gaps"] == 0
+    assert report["stamp_gaps"] == 1
+    assert report["stamp_missing"] == 1
+    # Message 8 arrives more than 3 periods after message 7, the stamp gap is not late
+    assert report["late"] == 1
+
+
+def test_reception_statistics_message_lost():
+    statistics = ReceptionStatistics()
+    receive(statistics, range(1, 11))
+    statistics.message_lost(SimpleNamespace(total_count_change=3))
+    statistics.message_lost(SimpleNamespace(total_count_change=2))
+    report = statistics.report()
+    assert report["lost"] == 5
+    assert "5 lost" in statistics.summary(report)
@@ -0,0 +1,48 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import os
+import shutil
+
+from evaluate_motion_primitives_from_trajectory_controller.run_catalog import RunCatalog
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+TIMESTAMP = "20250715_114057"
+
+
+def copy_csv_run(directory):
+    directory.mkdir()
+    for kind in ("planned", "executed", "reduced_LIN"):
+        shutil.copy(os.path.join(DATA_DIR, f"trajectory_{TIMESTAMP}_{kind}.csv"), directory)
+    return str(directory)
+
+
+def test_catalog_keeps_same_timestamp_of_two_directories(tmp_path):
+    first = copy_csv_run(tmp_path / "first")
+    second = copy_csv_run(tmp_path / "second")
+    catalog = RunCatalog(str(tmp_path / "catalog.sqlite"))
+    catalog.scan(first)
+    catalog.scan(second)
+    catalog.set_metrics(first, TIMESTAMP, {"joint_rmse": 0.1})
+    catalog.set_metrics(second, TIMESTAMP, {"joint_rmse": 0.2})
+
+    runs = catalog.query(where=["robot=ur"])
+    assert sorted(runs["directory"]) == [first, second]
+    assert sorted(runs["joint_rmse"]) == [0.1, 0.2]
+
+    runs = catalog.query(where=["joint_rmse>0.15", "n_executed>0"])
+    assert list(runs["directory"]) == [second]
+    catalog.close()
@@ -0,0 +1,141 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import os
+import shutil
+
+from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+    append_run_chunks,
+    append_run_table,
+    convert_csv_run,
+    find_runs,
+    iter_table_chunks,
+    load_run_metadata,
+    read_table,
+    RUN_EXTENSION,
+    table_columns,
+    write_run,
+)
+import numpy as np
+import pandas as pd
+import pytest
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+TIMESTAMP = "20250715_114057"
+
+
+def table(n_rows, columns, seed=0):
+    values = np.random.default_rng(seed).normal(size=(n_rows, len(columns)))
+    return pd.DataFrame(values, columns=columns)
+
+
+def copy_csv_run(directory):
+    for kind in ("planned", "executed", "reduced_LIN"):
+        shutil.copy(os.path.join(DATA_DIR, f"trajectory_{TIMESTAMP}_{kind}.csv"), directory)
+    return find_runs(str(directory))[TIMESTAMP]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_write_and_read_run(tmp_path, compress):
+    filepath = str(tmp_path / f"trajectory_20250101_000000{RUN_EXTENSION}")
+    planned = table(10, ["time_from_start", "joint_1_pos"])
+    executed = table(500, ["timestamp", "joint_1_pos", "joint_1_vel"], seed=1)
+    metadata = {"timestamp": "20250101_000000", "joint_names": ["joint_1"]}
+    write_run(filepath, {"planned": planned, "executed": executed}, metadata, compress)
+
+    assert load_run_metadata(filepath) == metadata
+    pd.testing.assert_frame_equal(read_table(filepath, "planned"), planned)
+    pd.testing.assert_frame_equal(read_table(filepath, "executed"), executed)
+
+
+def test_appended_poses_are_joined_with_executed(tmp_path):
+    filepath = str(tmp_path / f"trajectory_20250101_000000{RUN_EXTENSION}")
+    executed = table(300, ["timestamp", "joint_1_pos"])
+    write_run(filepath, {"executed": executed}, {})
+    poses = table(300, ["pose_x", "pose_y"], seed=1)
+    append_run_table(filepath, "executed_poses", poses)
+
+    pd.testing.assert_frame_equal(
+        read_table(filepath, "executed"), pd.concat([executed, poses], axis=1)
+    )
+    with pytest.raises(ValueError):
+        append_run_table(filepath, "executed_poses", poses)
+
+
+def test_find_runs_of_run_files(tmp_path):
+    files = copy_csv_run(tmp_path)
+    filepath = str(tmp_path / f"trajectory_{TIMESTAMP}{RUN_EXTENSION}")
+    tables = {"planned": table(10, ["joint_1_pos"]), "reduced": table(3, ["joint_1_pos"])}
+    write_run(filepath, tables, {"mode": "LIN"})
+    # The CSV files take precedence, runs that only exist as run file are found by their tables
+    assert find_runs(str(tmp_path)) == {TIMESTAMP: files}
+    for filepath_csv in files.values():
+        os.remove(filepath_csv)
+    assert find_runs(str(tmp_path)) == {TIMESTAMP: {"planned": filepath, "reduced_LIN": filepath}}
+
+
+def test_chunked_tables_and_chunk_iteration(tmp_path):
+    filepath = str(tmp_path / f"trajectory_20250101_000000{RUN_EXTENSION}")
+    executed = table(1000, ["timestamp", "joint_1_pos"])
+    write_run(filepath, {"executed": executed}, {})
+    poses = table(1000, ["pose_x", "pose_y"], seed=1)
+    # Chunk sizes that do not line up with the chunks that are read
+    append_run_chunks(
+        filepath, "executed_poses", poses.columns,
+        (poses.to_numpy()[i:i + 170] for i in range(0, 1000, 170)),
+    )
+
+    assert table_columns(filepath, "executed") == ["timestamp", "joint_1_pos", "pose_x", "pose_y"]
+    columns = ["pose_y", "timestamp", "pose_x"]
+    chunks = list(iter_table_chunks(filepath, "executed", columns, chunk_size=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    np.testing.assert_array_equal(
+        np.concatenate(chunks), pd.concat([executed, poses], axis=1)[columns].to_numpy()
+    )
+    with pytest.raises(KeyError):
+        next(iter_table_chunks(filepath, "executed", ["pose_z"]))
+
+
+def test_read_table_selects_columns(tmp_path):
+    filepath = str(tmp_path / f"trajectory_20250101_000000{RUN_EXTENSION}")
+    executed = table(500, ["timestamp", "joint_1_pos", "joint_1_vel"])
+    write_run(filepath, {"executed": executed}, {})
+    poses = table(500, ["pose_x", "pose_y"], seed=1)
+    append_run_chunks(
+        filepath, "executed_poses", poses.columns,
+        (poses.to_numpy()[i:i + 200] for i in range(0, 500, 200)),
+    )
+    filepath_csv = str(tmp_path / "executed.csv")
+    pd.concat([executed, poses], axis=1).to_csv(filepath_csv, index=False)
+
+    # Columns that are not in the table are ignored
+    columns = ["timestamp", "pose_y", "pose_z"]
+    expected = pd.concat([executed, poses], axis=1)[["timestamp", "pose_y"]]
+    pd.testing.assert_frame_equal(read_table(filepath, "executed", columns), expected)
+    pd.testing.assert_frame_equal(read_table(filepath_csv, "executed", columns), expected)
+
+
+def test_convert_csv_run(tmp_path):
+    files = copy_csv_run(tmp_path)
+    assert sorted(files) == ["executed", "planned", "reduced_LIN"]
+    filepath = convert_csv_run(str(tmp_path), TIMESTAMP, files)
+    metadata = load_run_metadata(filepath)
+    assert metadata["mode"] == "LIN" and metadata["robot"] == "ur"
+    tables = {"planned": "planned", "executed": "executed", "reduced_LIN": "reduced"}
+    for kind, name in tables.items():
+        pd.testing.assert_frame_equal(
+            read_table(filepath, name), pd.read_csv(files[kind]), check_dtype=False
+        )
@@ -0,0 +1,115 @@
+# Copyright (c) 2025, Mathias Fuhrer
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors: Mathias Fuhrer
+
+import os
+import threading
+import time
+
+from evaluate_motion_primitives_from_trajectory_controller.joint_state_buffer import (
+    JointStateBuffer,
+)
+from evaluate_motion_primitives_from_trajectory_controller.run_format import (
+    list_run_tables,
+    load_run_metadata,
+    read_table,
+    RUN_EXTENSION,
+)
+from evaluate_motion_primitives_from_trajectory_controller.streaming_writer import (
+    ExecutedJointStatesRunWriter,
+    ExecutedJointStatesWriter,
+)
+import numpy as np
+import pandas as pd
+
+JOINTS = ["joint_1", "joint_2"]
+
+
+def record(buffer, n_samples):
+    for i in range(n_samples):
+        buffer.append(i * 0.002, JOINTS, [i, -i], [1.0, 2.0])
+        if i % 100 == 0:
+            time.sleep(0.001)
+
+
+def wait_for_written(writer, n_samples):
+    deadline = time.monotonic() + 5.0
+    while writer.n_written < n_samples and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_csv_writer_flushes_part_file_and_renames_on_close(tmp_path):
+    filename = str(tmp_path / "trajectory_20250101_000000_executed.csv")
+    buffer = JointStateBuffer(capacity=16)
+    writer = ExecutedJointStatesWriter(buffer, filename, flush_interval=0.001).start()
+    record(buffer, 500)
+    wait_for_written(writer, 500)
+
+    # The streamed samples are on disk in the part file before close()
+    assert not os.path.exists(filename)
+    executed = pd.read_csv(writer.part_filename)
+    assert executed.columns.tolist() == buffer.header()
+    np.testing.assert_array_equal(executed["joint_1_pos"], np.arange(500))
+
+    # Samples after the last flush are written by close(), which renames the part file
+    record(buffer, 10)
+    assert writer.close() == 510
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(filename)]
+    executed = pd.read_csv(filename)
+    assert len(executed) == 510
+    np.testing.assert_array_equal(executed["joint_2_pos"][500:], -np.arange(10))
+
+    # A second close() changes nothing
+    assert writer.close() == 510
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(filename)]
+    pd.testing.assert_frame_equal(pd.read_csv(filename), executed)
+
+
+def test_run_writer_adds_tables_while_streaming(tmp_path):
+    filename = str(tmp_path / f"trajectory_20250101_000000{RUN_EXTENSION}")
+    buffer = JointStateBuffer(capacity=16)
+    writer = ExecutedJointStatesRunWriter(buffer, filename, flush_interval=0.001).start()
+    recorder = threading.Thread(target=record, args=(buffer, 20000))
+    recorder.start()
+    # The recorder adds the other tables while the flush thread is still writing
+    planned = pd.DataFrame({"joint_1_pos": np.arange(10.0), "joint_2_pos": -np.arange(10.0)})
+    time.sleep(0.02)
+    writer.add_table("planned", planned)
+    recorder.join()
+    writer.metadata["mode"] = "PTP"
+
+    assert writer.close() == 20000
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(filename)]
+    assert sorted(list_run_tables(filename)) == ["executed", "planned"]
+    assert load_run_metadata(filename) == {"mode": "PTP"}
+    pd.testing.assert_frame_equal(read_table(filename, "planned"), planned)
+    executed = read_table(filename, "executed")
+    assert executed.columns.tolist() == buffer.header()
+    np.testing.assert_array_equal(executed["joint_1_pos"], np.arange(20000))
+    np.testing.assert_array_equal(executed["timestamp"], np.arange(20000) * 0.002)
+
+
+def test_run_writer_streamed_samples_survive_a_crash(tmp_path):
+    filename = str(tmp_path / f"trajectory_20250101_000000{RUN_EXTENSION}")
+    buffer = JointStateBuffer(capacity=16)
+    writer = ExecutedJointStatesRunWriter(buffer, filename, flush_interval=0.001).start()
+    record(buffer, 500)
+    wait_for_written(writer, 500)
+
+    # Before close() only the streamed samples are on disk, readable like the CSV files
+    assert not os.path.exists(filename)
+    executed = pd.read_csv(str(tmp_path / "trajectory_20250101_000000_executed.csv.part"))
+    np.testing.assert_array_equal(executed["joint_2_pos"], -np.arange(500))
+    writer.close()